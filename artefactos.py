@@ -0,0 +1,302 @@
+"""
+MÓDULO: Artefactos de test y de validación en formato binario (sin CSV)
+
+¿Para qué sirve?
+- train_model.py / ols_streaming.py dejan el set de test (X_test, y_test) y validate_model.py deja el
+  resultado por fila (validation_results). Antes eran CSV: texto que se vuelve a interpretar número por número
+  en cada lectura, ocupa más y pierde los tipos (todo vuelve como float / object).
+- Aquí se guardan en formatos binarios con tipo:
+  - X_test (matriz dispersa CSR): sus tres arrays (data / indices / indptr) como .npy
+  - y_test_real / y_test_log: un .npy cada uno
+  - validation_results: parquet (columnar, comprimido; se abre también en Power BI / DuckDB / Excel con plugin)
+- Los .npy se abren con np.load(mmap_mode="r"): el sistema operativo mapea el archivo y las páginas se leen
+  cuando se usan (sin copiar ni interpretar nada al cargar).
+- Un manifest (manifest_v2.json) describe cada artefacto: archivo, formato, tipo, forma, bytes y fecha.
+- Cada función recibe la CARPETA donde escribir / leer: las del registro de corridas (artifacts/objetos/...,
+  ver registro.py) o artifacts/ (donde quedaban los artefactos antes del registro).
+
+Uso:
+- Lo usan train_model.py, ols_streaming.py, validate_model.py, plot_results.py y sweep_model.py.
+- python artefactos.py [--run-id ID]              -> muestra los manifest de una corrida (por defecto la última)
+- python artefactos.py [--run-id ID] --comparar   -> tamaño y tiempo de carga: CSV vs binario
+
+Compatibilidad:
+- Si no existen los binarios (artefactos de versiones anteriores), se leen los .npz / .csv de antes.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from scipy import sparse
+
+# ============================================================
+# 1) CONFIGURACIÓN
+# ============================================================
+
+ARTIFACTS = Path("artifacts")
+
+# Nombres de los archivos dentro de una carpeta de artefactos: artifacts/ (formato de antes del registro)
+# o una carpeta del registro de corridas (artifacts/objetos/..., ver registro.py)
+MANIFEST = "manifest_v2.json"
+MODELO = "linreg_trips_count_v2.joblib"
+
+# Set de test (lo escriben train_model.py / ols_streaming.py)
+X_TEST = "X_test_v2"                       # carpeta: data.npy / indices.npy / indptr.npy
+X_TEST_COLUMNAS = "X_test_v2_columns.json"
+Y_TEST_REAL = "y_test_real_v2.npy"
+Y_TEST_LOG = "y_test_log_v2.npy"
+
+# Resultado por fila (lo escribe validate_model.py, lo lee plot_results.py)
+RESULTADOS = "validation_results.parquet"
+
+# Formatos de antes (solo lectura, si no hay binarios)
+X_TEST_NPZ = "X_test_v2.npz"
+X_TEST_CSV = "X_test_v2.csv"
+Y_TEST_REAL_CSV = "y_test_real_v2.csv"
+RESULTADOS_CSV = "validation_results.csv"
+
+PARTES_CSR = ["data", "indices", "indptr"]
+
+
+# ============================================================
+# 2) MANIFEST
+# ============================================================
+
+def leer_manifest(carpeta=ARTIFACTS) -> dict:
+    path = Path(carpeta) / MANIFEST
+    if not path.exists():
+        return {"artefactos": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def actualizar_manifest(entradas: dict, carpeta=ARTIFACTS):
+    """Agrega / reemplaza entradas del manifest (.tmp + os.replace: nunca queda a medio escribir)."""
+    manifest = leer_manifest(carpeta)
+    ahora = datetime.now().isoformat(timespec="seconds")
+    for nombre, entrada in entradas.items():
+        manifest["artefactos"][nombre] = {**entrada, "creado": ahora}
+    path = Path(carpeta) / MANIFEST
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _bytes(*paths) -> int:
+    return sum(Path(p).stat().st_size for p in paths)
+
+
+# ============================================================
+# 3) ESCRIBIR / LEER
+# ============================================================
+# Las rutas del manifest son relativas a la carpeta: la carpeta se puede mover (ej: al registro) sin romperlo.
+
+def guardar_csr(X, carpeta: Path) -> dict:
+    """Matriz CSR como tres .npy (data / indices / indptr) + su forma. Retorna la entrada del manifest."""
+    carpeta = Path(carpeta)
+    carpeta.mkdir(parents=True, exist_ok=True)
+    for parte in PARTES_CSR:
+        np.save(carpeta / f"{parte}.npy", getattr(X, parte))
+    with open(carpeta / "shape.json", "w", encoding="utf-8") as f:
+        json.dump(list(X.shape), f)
+    return {"archivo": carpeta.name, "formato": "csr-npy", "dtype": str(X.dtype), "shape": list(X.shape),
+            "nnz": int(X.nnz), "bytes": _bytes(*(carpeta / f"{p}.npy" for p in PARTES_CSR))}
+
+
+def cargar_csr(carpeta: Path, mmap=True):
+    """Abre la matriz sin copiarla (mmap): los arrays de la CSR apuntan al archivo."""
+    carpeta = Path(carpeta)
+    with open(carpeta / "shape.json", encoding="utf-8") as f:
+        shape = tuple(json.load(f))
+    modo = "r" if mmap else None
+    partes = [np.load(carpeta / f"{p}.npy", mmap_mode=modo) for p in PARTES_CSR]
+    return sparse.csr_matrix(tuple(partes), shape=shape, copy=False)
+
+
+def guardar_array(array, path: Path) -> dict:
+    array = np.asarray(array)
+    np.save(path, array)
+    return {"archivo": Path(path).name, "formato": "npy", "dtype": str(array.dtype), "shape": list(array.shape),
+            "bytes": _bytes(path)}
+
+
+def guardar_modelo(model, carpeta=ARTIFACTS):
+    carpeta = Path(carpeta)
+    carpeta.mkdir(parents=True, exist_ok=True)
+    joblib.dump(model, carpeta / MODELO)
+    actualizar_manifest({"modelo": {"archivo": MODELO, "formato": "joblib", "tipo": type(model).__name__,
+                                    "columnas": int(model.n_features_in_), "bytes": _bytes(carpeta / MODELO)}},
+                        carpeta)
+
+
+def cargar_modelo(carpeta=ARTIFACTS):
+    return joblib.load(Path(carpeta) / MODELO)
+
+
+def guardar_test(X_test, columnas, y_test_real, y_test_log, carpeta=ARTIFACTS):
+    """X_test, nombres de columnas e y_test (real y log) + sus entradas en el manifest."""
+    carpeta = Path(carpeta)
+    carpeta.mkdir(parents=True, exist_ok=True)
+    entradas = {"X_test": guardar_csr(X_test, carpeta / X_TEST)}
+    # Los nombres de columnas van aparte (la matriz no los tiene)
+    with open(carpeta / X_TEST_COLUMNAS, "w", encoding="utf-8") as f:
+        json.dump(columnas, f)
+    entradas["X_test"]["columnas"] = X_TEST_COLUMNAS
+    entradas["y_test_real"] = guardar_array(y_test_real, carpeta / Y_TEST_REAL)
+    entradas["y_test_log"] = guardar_array(y_test_log, carpeta / Y_TEST_LOG)
+    actualizar_manifest(entradas, carpeta)
+
+
+def cargar_test(carpeta=ARTIFACTS):
+    """
+    Retorna (X_test, columnas, y_test_real) sin copiar los .npy (mmap).
+    Si no existen (artefactos de antes): X_test_v2.npz / X_test_v2.csv e y_test_real_v2.csv.
+    `columnas` es None si X_test viene del CSV (el DataFrame ya trae los nombres).
+    """
+    carpeta = Path(carpeta)
+    columnas = None
+    if (carpeta / X_TEST).exists():
+        X_test = cargar_csr(carpeta / X_TEST)
+    elif (carpeta / X_TEST_NPZ).exists():
+        X_test = sparse.load_npz(carpeta / X_TEST_NPZ).tocsr()
+    else:
+        X_test = pd.read_csv(carpeta / X_TEST_CSV)
+    if (carpeta / X_TEST_COLUMNAS).exists() and not isinstance(X_test, pd.DataFrame):
+        with open(carpeta / X_TEST_COLUMNAS, encoding="utf-8") as f:
+            columnas = json.load(f)
+
+    if (carpeta / Y_TEST_REAL).exists():
+        y_test = np.load(carpeta / Y_TEST_REAL, mmap_mode="r")
+    else:
+        y_test = pd.read_csv(carpeta / Y_TEST_REAL_CSV).squeeze("columns").to_numpy(np.float64)
+    return X_test, columnas, y_test
+
+
+def guardar_resultados(lotes, carpeta=ARTIFACTS):
+    """
+    Resultado por fila de validate_model.py (parquet comprimido, con tipos).
+    `lotes`: un DataFrame, o varios (ej: un generador): se escriben de a uno, sin juntarlos en memoria.
+    """
+    carpeta = Path(carpeta)
+    carpeta.mkdir(parents=True, exist_ok=True)
+    if isinstance(lotes, pd.DataFrame):
+        lotes = [lotes]
+    escritor, filas, tipos = None, 0, {}
+    try:
+        for df in lotes:
+            tabla = pa.Table.from_pandas(df, preserve_index=False)
+            if escritor is None:
+                escritor = pq.ParquetWriter(carpeta / RESULTADOS, tabla.schema, compression="zstd")
+                tipos = {c: str(t) for c, t in df.dtypes.items()}
+            escritor.write_table(tabla)
+            filas += len(df)
+    finally:
+        if escritor is not None:
+            escritor.close()
+    actualizar_manifest({"validation_results": {
+        "archivo": RESULTADOS, "formato": "parquet", "filas": filas,
+        "columnas": tipos, "bytes": _bytes(carpeta / RESULTADOS),
+    }}, carpeta)
+
+
+def cargar_resultados(columnas=None, carpeta=ARTIFACTS) -> pd.DataFrame:
+    carpeta = Path(carpeta)
+    if (carpeta / RESULTADOS).exists():
+        return pd.read_parquet(carpeta / RESULTADOS, columns=columnas)
+    return pd.read_csv(carpeta / RESULTADOS_CSV, usecols=columnas)
+
+
+# ============================================================
+# 4) COMPARAR CON CSV
+# ============================================================
+
+def _medir(cargar, repeticiones=3) -> float:
+    """Segundos de la mejor de `repeticiones` cargas. Se recorren todos los valores (suma): con mmap, la
+    lectura real del disco pasa al usarlos, no al abrir el archivo."""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        obj = cargar()
+        valores = [obj.data, obj.indices] if sparse.issparse(obj) else [np.asarray(obj, dtype=np.float64)]
+        sum(float(v.sum()) for v in valores)
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor
+
+
+def comparar_formatos(test=ARTIFACTS, resultados=ARTIFACTS):
+    """Tamaño y tiempo de carga de cada artefacto: CSV (como antes) vs binario (como ahora)."""
+    X_test, columnas, y_test = cargar_test(test)
+    filas = []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+
+        # X_test: CSV denso (como lo escribía train_model.py antes del one-hot disperso), npz y npy (mmap)
+        x_csv = tmp / "X_test.csv"
+        pd.DataFrame.sparse.from_spmatrix(X_test, columns=columnas).sparse.to_dense().to_csv(x_csv, index=False)
+        x_npz = tmp / "X_test.npz"
+        sparse.save_npz(x_npz, sparse.csr_matrix(X_test))
+        x_npy = tmp / "X_test"
+        guardar_csr(X_test, x_npy)
+        filas += [
+            ("X_test", "csv", _bytes(x_csv), _medir(lambda: pd.read_csv(x_csv).to_numpy())),
+            ("X_test", "npz", _bytes(x_npz), _medir(lambda: sparse.load_npz(x_npz))),
+            ("X_test", "npy (mmap)", _bytes(*(x_npy / f"{p}.npy" for p in PARTES_CSR)), _medir(lambda: cargar_csr(x_npy))),
+        ]
+
+        # y_test_real
+        y_csv, y_npy = tmp / "y.csv", tmp / "y.npy"
+        pd.Series(np.asarray(y_test), name="trips_count").to_csv(y_csv, index=False)
+        np.save(y_npy, np.asarray(y_test))
+        filas += [
+            ("y_test_real", "csv", _bytes(y_csv), _medir(lambda: pd.read_csv(y_csv).squeeze("columns"))),
+            ("y_test_real", "npy (mmap)", _bytes(y_npy), _medir(lambda: np.load(y_npy, mmap_mode="r"))),
+        ]
+
+        # validation_results (si ya se corrió validate_model.py)
+        if resultados and ((Path(resultados) / RESULTADOS).exists() or (Path(resultados) / RESULTADOS_CSV).exists()):
+            res = cargar_resultados(carpeta=resultados)
+            r_csv, r_parquet = tmp / "r.csv", tmp / "r.parquet"
+            res.to_csv(r_csv, index=False)
+            res.to_parquet(r_parquet, index=False, compression="zstd")
+            filas += [
+                ("validation_results", "csv", _bytes(r_csv), _medir(lambda: pd.read_csv(r_csv).to_numpy())),
+                ("validation_results", "parquet", _bytes(r_parquet),
+                 _medir(lambda: pd.read_parquet(r_parquet).to_numpy())),
+            ]
+
+    print(f"{'artefacto':<20} {'formato':<11} {'MB':>8} {'carga seg':>10}")
+    for nombre, formato, tam, seg in filas:
+        print(f"{nombre:<20} {formato:<11} {tam / 1e6:>8.2f} {seg:>10.4f}")
+
+
+def main():
+    import registro
+
+    parser = argparse.ArgumentParser(description="Artefactos de test / validación (manifest y comparación con CSV).")
+    parser.add_argument("--run-id", default=None, help="Corrida del registro (por defecto: la última)")
+    parser.add_argument("--comparar", action="store_true", help="Tamaño y tiempo de carga: CSV vs binario")
+    args = parser.parse_args()
+    carpetas = registro.carpetas(args.run_id)
+    if args.comparar:
+        comparar_formatos(carpetas["test"], carpetas["resultados"])
+    else:
+        for nombre in ["modelo", "test", "resultados"]:
+            carpeta = carpetas[nombre]
+            if carpeta:
+                print(f"--- {nombre}: {carpeta}")
+                print(json.dumps(leer_manifest(carpeta), indent=2))
+
+
+if __name__ == "__main__":
+    main()
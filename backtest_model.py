@@ -0,0 +1,257 @@
+"""
+SCRIPT: Backtest por fechas (rolling origin) del modelo de trips_count
+
+¿Para qué sirve?
+- train_model.py separa train / test con train_test_split (random_state=42): mezcla filas de hora / zona
+  al azar, así que el modelo entrena con días POSTERIORES a muchos de los que evalúa. En producción
+  siempre se predice el futuro: ese MAE sale optimista.
+- Este script evalúa como se usaría el modelo: entrena con los meses <= T y mide en el mes siguiente (T+1),
+  moviendo T mes a mes ("rolling origin"). Cada (meses de train, mes de test) es un "fold".
+- Deja MAE / RMSE / R² (escala real, igual que validate_model.py) y los tiempos de cada fold en una tabla.
+
+¿Cómo lo hace rápido?
+- Reusa las estadísticas por mes de ols_streaming.py (artifacts/linreg_trips_count_v2_stats): entrenar un fold
+  es sumar las estadísticas de sus meses y resolver un sistema de ~270 x 270. No se vuelven a leer los meses
+  de train. Si falta un mes (o cambió en la fuente), se lee solo ese mes y se guarda, igual que --incremental.
+- Del mes de test sí se leen las filas (hacen falta las predicciones para el MAE en escala real): un mes por fold.
+- Los folds se calculan en paralelo (joblib, --workers).
+- Cada fold guarda una firma (meses de train, mes de test, sus versiones en la fuente y la configuración).
+  En la siguiente corrida, los folds con la misma firma no se recalculan: al llegar un mes nuevo solo se
+  calcula el fold nuevo (y los que cambiaron).
+
+Requisitos:
+- Python con pandas, numpy, scipy, scikit-learn, joblib (+ pyodbc para leer de SQL Server)
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+import ols_streaming as ols
+import train_model as tm
+import validate_model as vm
+
+# ============================================================
+# 1) CONFIGURACIÓN
+# ============================================================
+
+BACKTEST_DIR = Path("artifacts") / "backtest"
+RESULTADOS = BACKTEST_DIR / "backtest_folds.csv"
+
+# Meses mínimos de historia para el primer fold (con menos, el modelo no vio todas las estaciones / zonas)
+MIN_MESES = 3
+
+# Columnas de la tabla de resultados (en este orden)
+COLUMNAS_TABLA = [
+    "mes_test", "train_desde", "train_hasta", "meses_train", "filas_train", "filas_test",
+    "mae", "rmse", "r2", "baseline_mae", "improve_mae_pct", "p90",
+    "seg_resolver", "seg_test", "seg_total", "firma",
+]
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(levelname)s | %(message)s",
+)
+logger = logging.getLogger("backtest")
+
+
+# ============================================================
+# 2) FOLDS
+# ============================================================
+
+def armar_folds(meses: list, min_meses=MIN_MESES, ventana=None, desde=None, hasta=None) -> list:
+    """
+    Un fold por mes de test: train = los meses anteriores (todos, o los últimos `ventana`).
+    `meses` son los meses con datos, ordenados: si falta un mes en la fuente, el "siguiente" es el próximo que hay.
+    `desde` / `hasta` (YYYY-MM) limitan los meses de TEST.
+    """
+    folds = []
+    for i, mes in enumerate(meses):
+        if i < min_meses or (desde and mes < desde) or (hasta and mes > hasta):
+            continue
+        meses_train = meses[:i] if not ventana else meses[max(0, i - ventana):i]
+        folds.append({"mes_test": mes, "meses_train": meses_train})
+    return folds
+
+
+def firma_fold(fold: dict, versiones: dict) -> str:
+    """Huella de lo que define el resultado de un fold: si no cambia, no hace falta recalcularlo."""
+    contenido = {
+        "config": ols.configuracion(),
+        "train": [[m, versiones.get(m)] for m in fold["meses_train"]],
+        "test": [fold["mes_test"], versiones.get(fold["mes_test"])],
+    }
+    return hashlib.sha256(json.dumps(contenido, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def estadisticas_fold(fold: dict, por_mes: dict):
+    """
+    Estadísticas de train del fold: TODAS las filas de sus meses (train + test del hash de ols_streaming;
+    aquí el test es el mes siguiente). Y las zonas del modelo: las de los meses de train + el de test
+    (una zona que solo aparece en el mes de test queda con coeficiente 0, como en ols_streaming.py).
+    """
+    train = ols.Estadisticas()
+    for mes in fold["meses_train"]:
+        for est in por_mes[mes]:
+            train.sumar(est)
+    test = ols.Estadisticas()
+    for est in por_mes[fold["mes_test"]]:
+        test.sumar(est)
+    return train, ols.zonas_del_modelo(train, test)
+
+
+# ============================================================
+# 3) UN FOLD (corre en un proceso del backtest)
+# ============================================================
+
+def leer_mes(mes: str, features_parquet=None, chunk_rows=tm.CHUNK_ROWS) -> pd.DataFrame:
+    """Las filas de un mes (el de test de un fold): un mes cabe en memoria aunque la historia no."""
+    desde, hasta = ols.rango_mes(mes)
+    if features_parquet:
+        lotes = list(tm.iterar_lotes_parquet(features_parquet, desde, hasta, chunk_rows))
+    else:
+        # Cada proceso abre su propia conexión (una conexión no se puede pasar entre procesos)
+        engine = tm.crear_engine()
+        try:
+            lotes = list(tm.iterar_lotes_sql(engine, desde, hasta, chunk_rows))
+        finally:
+            engine.dispose()
+    return tm.agregar_calendario(pd.concat(lotes, ignore_index=True))
+
+
+def evaluar_fold(fold: dict, train: "ols.Estadisticas", categorias: np.ndarray,
+                 features_parquet=None, chunk_rows=tm.CHUNK_ROWS) -> dict:
+    """Resuelve el modelo del fold (sin leer filas de train) y lo evalúa en las filas del mes de test."""
+    t0 = time.perf_counter()
+    model = ols.resolver(train, categorias)
+    seg_resolver = time.perf_counter() - t0
+
+    df = leer_mes(fold["mes_test"], features_parquet, chunk_rows)
+    X_test, _, _, y_test = tm.preparar_xy(df, categorias)
+    pred = vm.predecir(model, X_test)
+    m = vm.calcular_metricas(y_test, pred)
+    seg_total = time.perf_counter() - t0
+
+    return {
+        "mes_test": fold["mes_test"],
+        "train_desde": fold["meses_train"][0],
+        "train_hasta": fold["meses_train"][-1],
+        "meses_train": len(fold["meses_train"]),
+        "filas_train": int(train.filas),
+        "filas_test": len(y_test),
+        **{k: m[k] for k in ["mae", "rmse", "r2", "baseline_mae", "improve_mae_pct", "p90"]},
+        "seg_resolver": seg_resolver,
+        "seg_test": seg_total - seg_resolver,
+        "seg_total": seg_total,
+    }
+
+
+# ============================================================
+# 4) PROGRAMA PRINCIPAL
+# ============================================================
+
+def actualizar_stats(args) -> dict:
+    """
+    Deja al día las estadísticas por mes (como ols_streaming.py --incremental): lee solo los meses nuevos
+    o cambiados. Retorna la versión de cada mes en la fuente.
+    """
+    engine = None if args.features_parquet else tm.crear_engine()
+    if args.features_parquet:
+        versiones = ols.versiones_parquet(args.features_parquet)
+    else:
+        versiones = ols.versiones_sql(engine)
+
+    a_leer, quitados = ols.meses_a_actualizar(versiones, args.stats_dir)
+    logger.info(f"Estadísticas por mes: {len(versiones)} mes(es) en la fuente | a leer (nuevos o cambiados): "
+                f"{', '.join(a_leer) or 'ninguno'} | quitados: {', '.join(quitados) or 'ninguno'}")
+    if a_leer:
+        def lotes():
+            for mes in a_leer:
+                if args.features_parquet:
+                    yield from tm.iterar_lotes_parquet(args.features_parquet, *ols.rango_mes(mes), args.chunk_rows)
+                else:
+                    yield from tm.iterar_lotes_sql(engine, *ols.rango_mes(mes), args.chunk_rows)
+
+        por_mes, _ = ols.acumular(lotes(), guardar_test=False)
+        ols.guardar_meses(por_mes, args.stats_dir, versiones)
+    ols.quitar_meses(quitados, args.stats_dir)
+    return versiones
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Backtest por fechas (train: meses <= T, test: mes T+1).")
+    parser.add_argument("--features-parquet", nargs="?", const=tm.FEATURES_PARQUET, default=None,
+                        help=f"Leer del dataset parquet de build_features_parquet.py (sin ruta: {tm.FEATURES_PARQUET})")
+    parser.add_argument("--desde", default=None, help="Primer mes de TEST (YYYY-MM)")
+    parser.add_argument("--hasta", default=None, help="Último mes de TEST (YYYY-MM)")
+    parser.add_argument("--min-meses", type=int, default=MIN_MESES, help="Meses de historia del primer fold")
+    parser.add_argument("--ventana", type=int, default=None,
+                        help="Entrenar solo con los últimos N meses (por defecto: toda la historia anterior)")
+    parser.add_argument("--chunk-rows", type=int, default=tm.CHUNK_ROWS, help="Filas por lote")
+    parser.add_argument("--stats-dir", type=Path, default=ols.STATS_DIR, help="Carpeta de estadísticas por mes")
+    parser.add_argument("--recalcular", action="store_true",
+                        help="Recalcular todos los folds (no reusar los de la corrida anterior)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Procesos en paralelo")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    t0 = time.perf_counter()
+
+    versiones = actualizar_stats(args)
+    por_mes, _ = ols.cargar_meses(args.stats_dir)
+    meses = sorted(m for m in por_mes if m in versiones)
+    folds = armar_folds(meses, args.min_meses, args.ventana,
+                        args.desde and args.desde[:7], args.hasta and args.hasta[:7])
+    if not folds:
+        raise SystemExit(f"No hay folds: {len(meses)} mes(es) con datos y --min-meses={args.min_meses}")
+    for fold in folds:
+        fold["firma"] = firma_fold(fold, versiones)
+
+    # Folds de la corrida anterior con la misma firma: se reusan tal cual
+    anteriores = {}
+    if RESULTADOS.exists() and not args.recalcular:
+        texto = {c: str for c in ["mes_test", "train_desde", "train_hasta", "firma"]}
+        anteriores = {f["firma"]: f for f in pd.read_csv(RESULTADOS, dtype=texto).to_dict("records")}
+    pendientes = [f for f in folds if f["firma"] not in anteriores]
+    logger.info(f"{len(folds)} fold(s) | reusados: {len(folds) - len(pendientes)} | a calcular: {len(pendientes)} | "
+                f"{args.workers} proceso(s)")
+
+    t1 = time.perf_counter()
+    nuevos = Parallel(n_jobs=args.workers)(
+        delayed(evaluar_fold)(f, *estadisticas_fold(f, por_mes), args.features_parquet, args.chunk_rows)
+        for f in pendientes
+    )
+    t_folds = time.perf_counter() - t1
+    for fold, fila in zip(pendientes, nuevos):
+        fila["firma"] = fold["firma"]
+
+    filas = [anteriores[f["firma"]] for f in folds if f["firma"] in anteriores] + nuevos
+    tabla = pd.DataFrame(filas, columns=COLUMNAS_TABLA).sort_values("mes_test", ignore_index=True)
+    BACKTEST_DIR.mkdir(parents=True, exist_ok=True)
+    tabla.to_csv(RESULTADOS, index=False)
+
+    vista = tabla.drop(columns=["train_desde", "firma"])
+    with pd.option_context("display.width", 200, "display.max_rows", None, "display.float_format", "{:.3f}".format):
+        print(vista.to_string(index=False))
+
+    # Promedio ponderado por filas de test (un mes con más filas pesa más, como si fuera un solo test)
+    w = tabla["filas_test"]
+    logger.info(f"Backtest: MAE={np.average(tabla['mae'], weights=w):.3f} | "
+                f"RMSE={np.sqrt(np.average(tabla['rmse'] ** 2, weights=w)):.3f} | "
+                f"R2 (promedio)={tabla['r2'].mean():.4f} | folds: {t_folds:.1f}s "
+                f"({sum(f['seg_total'] for f in nuevos):.1f}s sumados) | total: {time.perf_counter() - t0:.1f}s "
+                f"-> {RESULTADOS}")
+
+
+if __name__ == "__main__":
+    main()
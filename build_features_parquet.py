@@ -0,0 +1,371 @@
+"""
+SCRIPT: Motor local de features (PARQUET -> features_hour_zone en PARQUET particionado, sin SQL Server)
+
+¿Para qué sirve?
+- Para tener feat.features_hour_zone hoy hay que: cargar TODOS los viajes a raw (load_parquet_to_sqlserver.py),
+  correr las secciones 02 (curated) y 03 (feat) del .sql, y luego train_model.py vuelve a sacar los
+  agregados con pd.read_sql. Son millones de filas que viajan a SQL Server solo para terminar resumidas.
+- Este script calcula EXACTAMENTE la misma tabla directo desde los .parquet:
+  1) mismos filtros que la sección 02 (curated):
+     - fechas no nulas y tpep_dropoff_datetime > tpep_pickup_datetime
+     - trip_distance > 0
+     - total_amount > 0
+  2) mismos agregados que la sección 03 (feat), por (trip_date, pickup_hour, PULocationID):
+     trips_count, avg_trip_distance, avg_trip_duration_min, avg_total_amount
+  3) guarda el resultado como un dataset parquet particionado por mes (trip_month=YYYY-MM),
+     que train_model.py puede leer con --features-parquet (sin base de datos).
+
+¿Cómo lo hace rápido?
+- Solo lee las 5 columnas que necesita (parquet es columnar: las demás ni se tocan en disco).
+- Recorre cada archivo por lotes (memoria acotada) y resume cada lote con un group-by vectorizado.
+- Cada archivo se procesa en un proceso aparte (--workers), así se usan todos los núcleos.
+- Cada proceso devuelve SUMAS parciales (no promedios): las sumas se pueden combinar entre lotes y archivos,
+  los promedios no. Los promedios se calculan una sola vez al final.
+
+¿Por qué el resultado es idéntico al de SQL?
+- Los tipos se convierten igual que en el cargue a raw (ESQUEMA y _castear de load_parquet_to_sqlserver.py).
+- La duración replica DATEDIFF(SECOND, inicio, fin) / 60.0:
+  DATEDIFF cuenta "cambios de segundo" (se truncan los microsegundos de cada fecha antes de restar)
+  y la división por 60.0 da un DECIMAL con 6 decimales (truncado). Aquí se hace con enteros
+  (millonésimas de minuto), así que no hay error de redondeo.
+- Un viaje cuenta en el día/hora de su pickup aunque venga en el archivo de otro mes
+  (igual que en SQL, donde el GROUP BY no mira source_file). Por eso las sumas se combinan entre archivos.
+
+Requisitos:
+- Python con pandas y pyarrow
+"""
+
+import argparse
+import logging
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import load_parquet_to_sqlserver as cargador
+
+# ============================================================
+# 1) CONFIGURACIÓN
+# ============================================================
+
+# Carpetas de entrada: la de descargas y la de backup (archive_parquets.py mueve ahí los ya cargados)
+BACKUP_DIR = Path(r"data\raw\yellow-backup")
+ENTRADAS = [cargador.PARQUET_DIR, BACKUP_DIR]
+
+# Salida: dataset particionado (una carpeta por mes: trip_month=2024-01/...)
+FEATURES_DIR = Path(r"data\feat\features_hour_zone")
+
+# Filas por lote al leer cada parquet (más grande = menos overhead, más memoria por proceso)
+BATCH_ROWS = 1_000_000
+
+# Columnas que se leen de cada parquet (con el tipo que tienen en raw)
+COLUMNAS = ["tpep_pickup_datetime", "tpep_dropoff_datetime", "PULocationID", "trip_distance", "total_amount"]
+TIPOS = {c: t for c, _, t in cargador.ESQUEMA if c in COLUMNAS}
+
+# avg_trip_duration_min en SQL es DECIMAL con 6 decimales -> trabajamos en millonésimas de minuto
+ESCALA_DURACION = 1_000_000
+
+US_POR_SEG = 1_000_000
+US_POR_HORA = 3600 * US_POR_SEG
+
+# Tolerancias de --verificar (la suma de FLOAT en SQL Server puede ir en otro orden que la de numpy)
+TOLERANCIA = 1e-9
+TOLERANCIA_DURACION = 1.0 / ESCALA_DURACION
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(levelname)s | %(message)s"
+)
+logger = logging.getLogger("features-parquet")
+
+
+# =====================================
+# 2) ¿QUÉ ARCHIVOS LEER?
+# =====================================
+
+def listar_archivos(carpetas: list) -> list:
+    """
+    Lista los .parquet de las carpetas, una versión por mes (source_file).
+
+    - Si el mismo nombre está en varias carpetas, gana la primera (la de descargas va antes que backup).
+    - En backup, archive_parquets.py renombra las versiones repetidas como archivo__1.parquet,
+      archivo__2.parquet...: la de sufijo más alto es la última que se movió (la vigente en raw).
+    """
+    elegidos = {}
+    for carpeta in carpetas:
+        carpeta = Path(carpeta)
+        if not carpeta.exists():
+            continue
+        versiones = {}
+        for f in carpeta.glob("*.parquet"):
+            m = re.fullmatch(r"(.+?)(?:__(\d+))?\.parquet", f.name)
+            nombre, n = f"{m.group(1)}.parquet", int(m.group(2) or 0)
+            if nombre not in versiones or n > versiones[nombre][0]:
+                versiones[nombre] = (n, f)
+        for nombre, (_, f) in versiones.items():
+            elegidos.setdefault(nombre, f)
+    return [elegidos[n] for n in sorted(elegidos)]
+
+
+# =====================================
+# 3) AGREGAR UN ARCHIVO (corre en un proceso aparte)
+# =====================================
+
+def _columna(lote, nombre: str):
+    """Columna con el mismo tipo que tendría en raw (o NULLs si el archivo no la trae)."""
+    if nombre not in lote.schema.names:
+        return pa.nulls(lote.num_rows, type=TIPOS[nombre])
+    col = lote.column(nombre)
+    return col if col.type == TIPOS[nombre] else cargador._castear(col, TIPOS[nombre])
+
+
+def sumas_lote(lote) -> pd.DataFrame:
+    """
+    Aplica los filtros de curated a un lote y lo resume por (hora, zona).
+
+    Retorna SUMAS (no promedios) con índice (hora_abs, PULocationID):
+    - hora_abs: horas desde 1970-01-01 00:00 (de ahí salen trip_date y pickup_hour al final)
+    - trips_count, sum_distance, sum_duration (millonésimas de minuto, entero), sum_total
+    """
+    inicio = _columna(lote, "tpep_pickup_datetime").to_numpy(zero_copy_only=False)
+    fin = _columna(lote, "tpep_dropoff_datetime").to_numpy(zero_copy_only=False)
+    zona = _columna(lote, "PULocationID").to_pandas()
+    distancia = _columna(lote, "trip_distance").to_numpy(zero_copy_only=False)
+    total = _columna(lote, "total_amount").to_numpy(zero_copy_only=False)
+
+    # NULL en fechas llega como NaT; NULL en números llega como NaN (y NaN > 0 es False)
+    inicio_us = inicio.astype("datetime64[us]").astype(np.int64)
+    fin_us = fin.astype("datetime64[us]").astype(np.int64)
+    ok = (
+        ~np.isnat(inicio) & ~np.isnat(fin)
+        & (fin_us > inicio_us)
+        & (distancia > 0)
+        & (total > 0)
+        & zona.notna().to_numpy()          # WHERE PULocationID IS NOT NULL (sección 03)
+    )
+
+    inicio_us, fin_us = inicio_us[ok], fin_us[ok]
+    # DATEDIFF(SECOND, ...): diferencia de los segundos truncados (floor) de cada fecha
+    segundos = fin_us // US_POR_SEG - inicio_us // US_POR_SEG
+    # / 60.0 -> DECIMAL(.., 6) truncado: en millonésimas de minuto es una división entera
+    duracion = segundos * ESCALA_DURACION // 60
+
+    df = pd.DataFrame({
+        "hora_abs": inicio_us // US_POR_HORA,
+        "PULocationID": zona.to_numpy()[ok].astype(np.int32),
+        "sum_distance": distancia[ok],
+        "sum_duration": duracion,
+        "sum_total": total[ok],
+    })
+    g = df.groupby(["hora_abs", "PULocationID"], sort=False)
+    sumas = g.sum()
+    sumas.insert(0, "trips_count", g.size())
+    return sumas
+
+
+def combinar(partes: list) -> pd.DataFrame:
+    """Suma resúmenes parciales (de lotes o de archivos) que comparten grupos."""
+    partes = [p for p in partes if len(p)]
+    if not partes:
+        vacio = pd.MultiIndex.from_arrays([[], []], names=["hora_abs", "PULocationID"])
+        return pd.DataFrame({"trips_count": [], "sum_distance": [], "sum_duration": [], "sum_total": []},
+                            index=vacio).astype({"trips_count": np.int64, "sum_duration": np.int64})
+    if len(partes) == 1:
+        return partes[0]
+    return pd.concat(partes).groupby(level=["hora_abs", "PULocationID"], sort=False).sum()
+
+
+def agregar_archivo(path: Path, batch_rows=BATCH_ROWS) -> dict:
+    """
+    Lee un parquet por lotes (solo COLUMNAS) y devuelve sus sumas por (hora, zona).
+    Es una función de nivel superior para que ProcessPoolExecutor la pueda mandar a otro proceso.
+    """
+    t0 = time.perf_counter()
+    pf = pq.ParquetFile(path)
+    columnas = [c for c in COLUMNAS if c in pf.schema_arrow.names]
+
+    partes, filas = [], 0
+    for lote in pf.iter_batches(batch_size=batch_rows, columns=columnas):
+        filas += lote.num_rows
+        partes.append(sumas_lote(lote))
+        # Cada cierto número de lotes compactamos, así la memoria no crece con el archivo
+        if len(partes) >= 8:
+            partes = [combinar(partes)]
+
+    sumas = combinar(partes)
+    return {"archivo": path.name, "filas": filas, "validas": int(sumas["trips_count"].sum()) if len(sumas) else 0,
+            "sumas": sumas, "segundos": time.perf_counter() - t0}
+
+
+# =====================================
+# 4) DE SUMAS A FEATURES
+# =====================================
+
+def sumas_a_features(sumas: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convierte las sumas en las mismas columnas que feat.features_hour_zone.
+
+    - AVG(FLOAT) = suma / conteo
+    - AVG(DECIMAL(.., 6)) = suma / conteo truncado a 6 decimales (se hace con enteros)
+    """
+    s = sumas.reset_index().sort_values(["hora_abs", "PULocationID"], ignore_index=True)
+    n = s["trips_count"].to_numpy(np.int64)
+
+    df = pd.DataFrame({
+        "trip_date": (s["hora_abs"].to_numpy(np.int64) // 24).astype("datetime64[D]"),
+        "pickup_hour": (s["hora_abs"].to_numpy(np.int64) % 24).astype(np.int32),
+        "PULocationID": s["PULocationID"].to_numpy(np.int32),
+        "trips_count": n.astype(np.int32),
+        "avg_trip_distance": s["sum_distance"].to_numpy(np.float64) / n,
+        "avg_trip_duration_min": (s["sum_duration"].to_numpy(np.int64) // n) / ESCALA_DURACION,
+        "avg_total_amount": s["sum_total"].to_numpy(np.float64) / n,
+    })
+    df["trip_date"] = df["trip_date"].dt.date
+    return df
+
+
+def escribir_dataset(features: pd.DataFrame, salida: Path):
+    """
+    Escribe el dataset particionado por mes (trip_month=YYYY-MM/).
+
+    Se escribe primero en una carpeta temporal y luego se cambia por la anterior, así quien lea
+    (ej: train_model.py) nunca ve una mezcla de la versión vieja y la nueva.
+    """
+    salida = Path(salida)
+    temporal = salida.with_name(salida.name + ".tmp")
+    vieja = salida.with_name(salida.name + ".old")
+    for carpeta in (temporal, vieja):
+        if carpeta.exists():
+            shutil.rmtree(carpeta)
+
+    tabla = pa.Table.from_pandas(features, preserve_index=False)
+    mes = pa.array(pd.to_datetime(features["trip_date"]).dt.strftime("%Y-%m"), type=pa.string())
+    pq.write_to_dataset(tabla.append_column("trip_month", mes), temporal, partition_cols=["trip_month"])
+
+    if salida.exists():
+        os.replace(salida, vieja)
+    os.replace(temporal, salida)
+    if vieja.exists():
+        shutil.rmtree(vieja)
+
+
+def construir_features(archivos: list, salida: Path, workers=None, batch_rows=BATCH_ROWS) -> pd.DataFrame:
+    """Agrega los archivos en paralelo (un proceso por archivo), combina y escribe el dataset."""
+    t0 = time.perf_counter()
+    partes, filas, validas = [], 0, 0
+    with ProcessPoolExecutor(max_workers=workers) as ejecutor:
+        futuros = [ejecutor.submit(agregar_archivo, f, batch_rows) for f in archivos]
+        for futuro in as_completed(futuros):
+            r = futuro.result()
+            partes.append(r["sumas"])
+            filas += r["filas"]
+            validas += r["validas"]
+            logger.info(f"OK -> {r['archivo']}: {r['filas']:,} filas | {r['validas']:,} válidas | "
+                        f"{len(r['sumas']):,} grupos | {r['segundos']:.1f}s")
+
+    features = sumas_a_features(combinar(partes))
+    escribir_dataset(features, salida)
+    logger.info(f"Listo: {len(archivos)} archivo(s) | {filas:,} filas leídas | {validas:,} viajes válidos | "
+                f"{len(features):,} filas de features -> {salida} | {time.perf_counter() - t0:.1f}s")
+    return features
+
+
+# =====================================
+# 5) VERIFICAR CONTRA SQL SERVER
+# =====================================
+
+def verificar_contra_sql(features: pd.DataFrame, conn_str=None) -> bool:
+    """
+    Compara el resultado con feat.features_hour_zone (lo que dejó la sección 03).
+
+    - Mismos grupos (trip_date, pickup_hour, PULocationID) y mismo trips_count: exacto.
+    - Promedios FLOAT: diferencia relativa <= TOLERANCIA (el orden de la suma puede cambiar el último bit).
+    - avg_trip_duration_min: diferencia <= 1 millonésima (es DECIMAL con 6 decimales).
+    """
+    conn = cargador.conectar(conn_str)
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+        SELECT trip_date, pickup_hour, PULocationID, trips_count,
+               avg_trip_distance, avg_trip_duration_min, avg_total_amount
+        FROM feat.features_hour_zone
+        """)
+        sql = pd.DataFrame.from_records([tuple(f) for f in cur.fetchall()],
+                                        columns=[d[0] for d in cur.description])
+    finally:
+        conn.close()
+
+    llaves = ["trip_date", "pickup_hour", "PULocationID"]
+    sql["trip_date"] = pd.to_datetime(sql["trip_date"]).dt.date
+    for c in ["avg_trip_distance", "avg_trip_duration_min", "avg_total_amount"]:
+        sql[c] = sql[c].astype(float)
+    m = features.merge(sql, on=llaves, how="outer", suffixes=("_pq", "_sql"), indicator=True)
+
+    solo_pq = int((m["_merge"] == "left_only").sum())
+    solo_sql = int((m["_merge"] == "right_only").sum())
+    m = m[m["_merge"] == "both"]
+    conteo_distinto = int((m["trips_count_pq"] != m["trips_count_sql"]).sum())
+
+    ok = solo_pq == 0 and solo_sql == 0 and conteo_distinto == 0
+    logger.info(f"Grupos: {len(features):,} (parquet) vs {len(sql):,} (SQL) | solo parquet: {solo_pq:,} | "
+                f"solo SQL: {solo_sql:,} | trips_count distinto: {conteo_distinto:,}")
+
+    for c, tol, relativa in [("avg_trip_distance", TOLERANCIA, True),
+                             ("avg_trip_duration_min", TOLERANCIA_DURACION, False),
+                             ("avg_total_amount", TOLERANCIA, True)]:
+        a, b = m[f"{c}_pq"].to_numpy(), m[f"{c}_sql"].to_numpy()
+        dif = np.abs(a - b) / np.maximum(np.abs(b), 1.0) if relativa else np.abs(a - b)
+        peor = float(dif.max()) if len(dif) else 0.0
+        # + un pelito: las millonésimas pasan por float al leerlas
+        bien = peor <= tol * (1 + 1e-6)
+        ok = ok and bien
+        logger.info(f"{'OK' if bien else 'DIFERENTE'} -> {c}: diferencia máxima {peor:.3g} (tolerancia {tol:g})")
+
+    if ok:
+        logger.info("✅ Las features de parquet coinciden con feat.features_hour_zone.")
+    else:
+        logger.error("❌ Las features de parquet NO coinciden con feat.features_hour_zone.")
+    return ok
+
+
+# =========================
+# 6) PROGRAMA PRINCIPAL
+# =========================
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Calcula features_hour_zone directo desde los parquet (sin SQL Server).")
+    parser.add_argument("--entrada", action="append", type=Path, default=None,
+                        help=f"Carpeta con .parquet (se puede repetir). Por defecto: {cargador.PARQUET_DIR} y {BACKUP_DIR}")
+    parser.add_argument("--salida", type=Path, default=FEATURES_DIR, help=f"Dataset de salida (por defecto: {FEATURES_DIR})")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos en paralelo (por defecto: núcleos del equipo)")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS, help=f"Filas por lote (por defecto: {BATCH_ROWS:,})")
+    parser.add_argument("--verificar", action="store_true",
+                        help="Comparar el resultado con feat.features_hour_zone en SQL Server")
+    parser.add_argument("--conn-str", default=None,
+                        help="Cadena de conexión ODBC completa para --verificar (por defecto se arma con SERVER/DB/USER/PWD)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    archivos = listar_archivos(args.entrada or ENTRADAS)
+    if not archivos:
+        logger.info("No encontré archivos .parquet. Nada que hacer.")
+        return
+
+    logger.info(f"{len(archivos)} archivo(s) -> {args.salida} (workers: {args.workers or os.cpu_count()})")
+    features = construir_features(archivos, args.salida, args.workers, args.batch_rows)
+
+    if args.verificar and not verificar_contra_sql(features, args.conn_str):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,10 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 import requests
@@ -73,96 +80,368 @@ def construir_url(base: str, periodo: str):
 # 3) ESCRIBIMOS EN EL ARCHIVO DE LOG
 # ==================================
 
+# Con descargas en paralelo, varios hilos escriben el log a la vez:
+# el candado (lock) hace que cada línea se escriba completa, sin mezclarse.
+_lock_log = threading.Lock()
+
+
 def escribir_log(ruta_log: Path, mensaje: str):
     """
     Escribimos una línea en el log (como un diario de lo que pasó).
     """
-    ruta_log.parent.mkdir(parents=True, exist_ok=True)
-    with open(ruta_log, "a", encoding="utf-8") as f:
-        f.write(mensaje + "\n")
-        
-        
+    with _lock_log:
+        ruta_log.parent.mkdir(parents=True, exist_ok=True)
+        with open(ruta_log, "a", encoding="utf-8") as f:
+            f.write(mensaje + "\n")
+
+
+# ==================================
+# 4) VALIDAMOS QUE EL PARQUET ESTÉ COMPLETO
+# ==================================
+
+def parquet_valido(ruta: Path) -> bool:
+    """
+    Revisa que el archivo sea un parquet COMPLETO (no una descarga cortada).
+
+    Un parquet empieza con "PAR1" y termina con:
+      [metadata (footer)] [4 bytes: largo del footer] ["PAR1"]
+    Si la descarga se cortó, el final no es "PAR1" o el largo del footer no cuadra.
+    Si pyarrow está instalado, además intentamos leer el footer de verdad.
+    """
+    try:
+        tam = ruta.stat().st_size
+        if tam < 12:
+            return False
+        with open(ruta, "rb") as f:
+            inicio = f.read(4)
+            f.seek(-8, os.SEEK_END)
+            largo_footer = int.from_bytes(f.read(4), "little")
+            fin = f.read(4)
+        if inicio != b"PAR1" or fin != b"PAR1" or largo_footer <= 0 or largo_footer > tam - 12:
+            return False
+    except OSError:
+        return False
+
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        return True  # sin pyarrow nos quedamos con la revisión de bytes
+
+    try:
+        pq.read_metadata(ruta)
+        return True
+    except Exception:
+        return False
+
+
+# ==================================
+# 5) MANIFIESTO DE DESCARGAS (JSON)
+# ==================================
+
+# El log es texto libre (para leerlo una persona). El manifiesto es lo mismo pero ESTRUCTURADO:
+# un JSON con una entrada por archivo, que el script usa para decidir si un mes cambió en el servidor
+# y que el cargador a SQL Server puede leer (trae el SHA-256 ya calculado).
+#
+# {
+#   "yellow_tripdata_2024-01.parquet": {
+#     "periodo": "2024-01", "url": "...", "etag": "\"abc...\"", "last_modified": "Tue, 05 Mar 2024 ...",
+#     "size": 49961641, "sha256": "9f2c...", "mtime_ns": 1709...,
+#     "downloaded_at": "2026-02-10 10:00:00", "checked_at": "2026-03-10 09:00:00"
+#   },
+#   ...
+# }
+NOMBRE_MANIFIESTO = "manifest_descargas.json"
+
+# Varios hilos actualizan el manifiesto: un candado para que no se pisen
+_lock_manifiesto = threading.Lock()
+
+
+def leer_manifiesto(ruta: Path) -> dict:
+    """Lee el manifiesto JSON (si no existe, arrancamos con uno vacío)."""
+    if not ruta.exists():
+        return {}
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def guardar_manifiesto(ruta: Path, manifiesto: dict):
+    """
+    Guarda el manifiesto de forma atómica: se escribe a un .tmp y luego se renombra.
+    Así, si el proceso se corta a mitad de escritura, el JSON anterior sigue sano.
+    """
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    tmp = ruta.with_name(ruta.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, indent=2, ensure_ascii=False, sort_keys=True)
+    os.replace(tmp, ruta)
+
+
+def actualizar_manifiesto(manifiesto: dict, ruta: Path, nombre: str, **campos):
+    """
+    Actualiza (o crea) la entrada de un archivo y guarda el JSON. Es seguro usarla desde varios hilos.
+    Los campos que llegan en None se quitan de la entrada (ej: el servidor no manda ETag).
+    """
+    if manifiesto is None:
+        return
+    with _lock_manifiesto:
+        entrada = manifiesto.setdefault(nombre, {})
+        for campo, valor in campos.items():
+            if valor is None:
+                entrada.pop(campo, None)
+            else:
+                entrada[campo] = valor
+        guardar_manifiesto(ruta, manifiesto)
+
+
+def sha256_archivo(ruta: Path, chunk_size=1024 * 1024) -> str:
+    """SHA-256 del archivo (leído por pedazos de 1 MB, sin cargarlo entero en memoria)."""
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def headers_condicionales(validadores: dict) -> dict:
+    """
+    Arma los encabezados de un GET condicional:
+    - If-None-Match: "¿sigue siendo esta versión (ETag)?"
+    - If-Modified-Since: "¿cambió desde esta fecha?"
+    Si el archivo no cambió, el servidor responde 304 (sin cuerpo): solo viajan los encabezados.
+    """
+    headers = {}
+    if validadores.get("etag"):
+        headers["If-None-Match"] = validadores["etag"]
+    if validadores.get("last_modified"):
+        headers["If-Modified-Since"] = validadores["last_modified"]
+    return headers
+
+
 # ==================================
-# 4) DESCARGAMOS UN ARCHIVO
+# 6) DESCARGAMOS UN ARCHIVO
 # ==================================
 
-def descargar(url: str, salida: Path, ruta_log: Path, periodo: str):
+def descargar(url: str, salida: Path, ruta_log: Path, periodo: str, posicion=0,
+              manifiesto=None, ruta_manifiesto=None) -> dict:
     """
     Descarga el archivo de 'url' y lo guarda en 'salida'.
-    También registra lo que pasó en el log.
+    También registra lo que pasó en el log y en el manifiesto.
+
+    Cómo evita bajar lo que no cambió:
+    - Si el archivo ya está y el manifiesto tiene su ETag / Last-Modified, hace un GET CONDICIONAL.
+      Si el servidor responde 304 (no cambió) -> SKIP sin bajar nada.
+      Si responde 200 (el mes fue republicado) -> se baja la versión nueva.
+    - Si el archivo ya está pero no aparece en el manifiesto (bajado por una versión vieja del script),
+      se pregunta con un HEAD: si el tamaño coincide, se "adopta" (se registra) sin bajarlo.
+
+    Cómo evita dejar archivos corruptos:
+    - Baja a un archivo temporal "<nombre>.part", nunca directo a 'salida'.
+    - Si ya existe un ".part" (descarga cortada antes), pide SOLO lo que falta
+      con el encabezado HTTP "Range: bytes=<ya_bajado>-" (reanudar).
+      Con "If-Range" el servidor solo acepta reanudar si sigue siendo la MISMA versión;
+      si cambió, manda el archivo completo (200) y se empieza de cero.
+    - Al terminar, valida el footer del parquet y recién ahí lo renombra a 'salida'
+      (os.replace es atómico: o queda el archivo completo, o no queda nada).
+
+    Retorna {"periodo", "estado" (OK/SKIP/FAIL), "bytes" (bajados en esta corrida), "segundos"}.
     """
     nombre = salida.name
     ahora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    parcial = salida.with_name(nombre + ".part")
+    previo = (manifiesto or {}).get(nombre, {})
+    t0 = time.perf_counter()
+    bajados = 0
 
-    # Si ya existe, no lo bajamos otra vez
-    if salida.exists() and salida.stat().st_size > 0:
-        escribir_log(ruta_log, f"[{ahora}] {periodo} | {nombre} | SKIP | Ya existía")
-        print(f"Ya existe: {nombre}")
-        return
+    def saltar(motivo):
+        escribir_log(ruta_log, f"[{ahora}] {periodo} | {nombre} | SKIP | {motivo}")
+        print(f"SKIP: {nombre} ({motivo})")
+        return {"periodo": periodo, "estado": "SKIP", "bytes": 0, "segundos": time.perf_counter() - t0}
 
-    # Bajamos en modo "stream" (por pedacitos)
     try:
-        with requests.get(url, stream=True, timeout=120) as r:
-            r.raise_for_status()  # Si hay error (ej 404), aquí explota
-
-            total = int(r.headers.get("content-length", 0))
-
-            # Creamos carpeta si no existe
-            salida.parent.mkdir(parents=True, exist_ok=True)
-
-            # Guardamos con barra de progreso
-            with open(salida, "wb") as f, tqdm(
-                total=total if total > 0 else None,
-                unit="B",
-                unit_scale=True,
-                desc=nombre
-            ) as pbar:
-                for chunk in r.iter_content(chunk_size=1024 * 1024):
-                    if chunk:
-                        f.write(chunk)
-                        pbar.update(len(chunk))
+        headers = {}
+
+        # Si existe pero está corrupto (descarga cortada de una versión vieja del script), lo bajamos de nuevo.
+        if salida.exists() and salida.stat().st_size > 0 and not parquet_valido(salida):
+            escribir_log(ruta_log, f"[{ahora}] {periodo} | {nombre} | WARN | Existía pero estaba incompleto; se descarga de nuevo")
+            salida.unlink()
+
+        if parcial.exists() and parcial.stat().st_size > 0:
+            # Hay una descarga a medias: la reanudamos (aunque exista una versión vieja completa)
+            headers["Range"] = f"bytes={parcial.stat().st_size}-"
+            validador = previo.get("parcial_etag") or previo.get("parcial_last_modified")
+            if validador:
+                headers["If-Range"] = validador
+
+        elif salida.exists() and salida.stat().st_size > 0:
+            if manifiesto is None:
+                return saltar("Ya existía")  # sin manifiesto: comportamiento de siempre
+
+            if previo.get("size") == salida.stat().st_size and (previo.get("etag") or previo.get("last_modified")):
+                # Lo conocemos: GET condicional (si no cambió, el servidor responde 304 sin cuerpo)
+                headers = headers_condicionales(previo)
+            else:
+                # No está en el manifiesto: preguntamos con HEAD (solo encabezados) y lo adoptamos si cuadra
+                h = requests.head(url, timeout=60, allow_redirects=True)
+                h.raise_for_status()
+                tam_servidor = int(h.headers.get("content-length", -1))
+                if tam_servidor == salida.stat().st_size:
+                    actualizar_manifiesto(
+                        manifiesto, ruta_manifiesto, nombre,
+                        periodo=periodo, url=url, etag=h.headers.get("ETag"),
+                        last_modified=h.headers.get("Last-Modified"), size=tam_servidor,
+                        sha256=sha256_archivo(salida), mtime_ns=salida.stat().st_mtime_ns,
+                        downloaded_at=previo.get("downloaded_at"), checked_at=ahora,
+                    )
+                    return saltar("Ya existía; mismo tamaño que el servidor, registrado en el manifiesto")
+                escribir_log(ruta_log, f"[{ahora}] {periodo} | {nombre} | WARN | "
+                                       f"Tamaño local {salida.stat().st_size:,} != servidor {tam_servidor:,}; se descarga de nuevo")
+
+        salida.parent.mkdir(parents=True, exist_ok=True)
+        ya_bajado = parcial.stat().st_size if "Range" in headers else 0
+
+        # Bajamos en modo "stream" (por pedacitos)
+        with requests.get(url, stream=True, timeout=120, headers=headers) as r:
+            if r.status_code == 304:
+                # "Not Modified": el servidor confirma que es la misma versión
+                actualizar_manifiesto(manifiesto, ruta_manifiesto, nombre, checked_at=ahora)
+                return saltar("Sin cambios en el servidor (304)")
+
+            if r.status_code == 416:
+                # "Range Not Satisfiable": el .part ya tenía todo el archivo
+                pass
+            else:
+                r.raise_for_status()  # Si hay error (ej 404), aquí explota
+
+                if ya_bajado > 0 and r.status_code == 206:
+                    modo = "ab"   # el servidor aceptó el Range: seguimos donde quedamos
+                else:
+                    modo = "wb"   # descarga nueva (o cambió la versión / no acepta Range): desde cero
+                    ya_bajado = 0
+                    # Guardamos la versión que estamos bajando, para reanudar con If-Range si se corta
+                    actualizar_manifiesto(manifiesto, ruta_manifiesto, nombre,
+                                          parcial_etag=r.headers.get("ETag"),
+                                          parcial_last_modified=r.headers.get("Last-Modified"))
+
+                total = int(r.headers.get("content-length", 0)) + ya_bajado
+
+                # Guardamos con barra de progreso
+                with open(parcial, modo) as f, tqdm(
+                    total=total if total > 0 else None,
+                    initial=ya_bajado,
+                    unit="B",
+                    unit_scale=True,
+                    desc=nombre,
+                    position=posicion,
+                    leave=False
+                ) as pbar:
+                    for chunk in r.iter_content(chunk_size=1024 * 1024):
+                        if chunk:
+                            f.write(chunk)
+                            bajados += len(chunk)
+                            pbar.update(len(chunk))
+
+        if not parquet_valido(parcial):
+            # El .part no sirve (ej: el servidor cambió el archivo a mitad): lo borramos
+            # para que la próxima corrida empiece limpio.
+            parcial.unlink(missing_ok=True)
+            raise ValueError("El parquet descargado no es válido (footer incompleto o dañado)")
+
+        os.replace(parcial, salida)
 
         ahora_ok = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        escribir_log(ruta_log, f"[{ahora_ok}] {periodo} | {nombre} | OK | Descargado")
+        previo = (manifiesto or {}).get(nombre, {})
+        actualizar_manifiesto(
+            manifiesto, ruta_manifiesto, nombre,
+            periodo=periodo, url=url,
+            etag=previo.get("parcial_etag"), last_modified=previo.get("parcial_last_modified"),
+            parcial_etag=None, parcial_last_modified=None,
+            size=salida.stat().st_size, sha256=sha256_archivo(salida), mtime_ns=salida.stat().st_mtime_ns,
+            downloaded_at=ahora_ok, checked_at=ahora_ok,
+        )
+
+        detalle = f"Reanudado desde {ya_bajado:,} bytes" if ya_bajado > 0 else "Descargado"
+        escribir_log(ruta_log, f"[{ahora_ok}] {periodo} | {nombre} | OK | {detalle}")
         print(f"OK: {nombre}")
+        estado = "OK"
 
     except Exception as e:
         ahora_fail = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         escribir_log(ruta_log, f"[{ahora_fail}] {periodo} | {nombre} | FAIL | {e}")
         print(f"FAIL: {nombre} -> {e}")
+        estado = "FAIL"
+
+    return {"periodo": periodo, "estado": estado, "bytes": bajados, "segundos": time.perf_counter() - t0}
 
 
 # =========================
-# 5) PROGRAMA PRINCIPAL
+# 7) PROGRAMA PRINCIPAL
 # =========================
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Descarga los parquet de yellow trips indicados en entrada.txt.")
+    parser.add_argument("--entrada", default="entrada.txt", help="Archivo con BASE=... y los meses (por defecto: entrada.txt)")
+    parser.add_argument("--salida", default="data/raw/yellow", help="Carpeta de descargas (por defecto: data/raw/yellow)")
+    parser.add_argument("--log", default="logs/log_descargas.txt", help="Archivo de log (por defecto: logs/log_descargas.txt)")
+    parser.add_argument("--paralelo", type=int, default=4, help="Descargas simultáneas (por defecto: 4; 1 = una por una)")
+    parser.add_argument("--manifiesto", default=None,
+                        help=f"Manifiesto JSON de descargas (por defecto: <salida>/{NOMBRE_MANIFIESTO})")
+    parser.add_argument("--sin-manifiesto", action="store_true",
+                        help="No usar manifiesto: salta todo archivo que ya exista, sin consultar al servidor")
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
+
     # 1) Archivo que tú editas
-    archivo_entrada = "entrada.txt"
+    archivo_entrada = args.entrada
 
     # 2) Carpeta donde se guardan los archivos
-    carpeta_salida = Path("data/raw/yellow")
+    carpeta_salida = Path(args.salida)
 
     # 3) Archivo log (el diario)
-    archivo_log = Path("logs/log_descargas.txt")
+    archivo_log = Path(args.log)
+
+    # 4) Manifiesto de descargas (JSON): ETag, tamaño, SHA-256... de cada archivo
+    ruta_manifiesto = Path(args.manifiesto) if args.manifiesto else carpeta_salida / NOMBRE_MANIFIESTO
+    manifiesto = None if args.sin_manifiesto else leer_manifiesto(ruta_manifiesto)
 
     # Leemos BASE y meses desde el txt
     base, periodos = leer_config(archivo_entrada)
 
     # Escribimos que empezamos
     inicio = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    escribir_log(archivo_log, f"\n=== INICIO {inicio} | BASE={base} | N={len(periodos)} ===")
+    escribir_log(archivo_log, f"\n=== INICIO {inicio} | BASE={base} | N={len(periodos)} | PARALELO={args.paralelo} ===")
+
+    # Descargamos los meses: varios a la vez (cada uno en su hilo; la red es el cuello de botella, no la CPU)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.paralelo)) as pool:
+        futuros = [
+            pool.submit(descargar, construir_url(base, periodo),
+                        carpeta_salida / f"yellow_tripdata_{periodo}.parquet",
+                        archivo_log, periodo, i % max(1, args.paralelo), manifiesto, ruta_manifiesto)
+            for i, periodo in enumerate(periodos)
+        ]
+        resultados = [f.result() for f in futuros]
+    segundos = time.perf_counter() - t0
+
+    # Resumen: throughput total (todos los bytes bajados / tiempo de pared)
+    total_bytes = sum(r["bytes"] for r in resultados)
+    conteo = {e: sum(1 for r in resultados if r["estado"] == e) for e in ("OK", "SKIP", "FAIL")}
+    mb_s = total_bytes / (1024 * 1024) / segundos if segundos > 0 else 0
+    resumen = (f"OK={conteo['OK']} SKIP={conteo['SKIP']} FAIL={conteo['FAIL']} | "
+               f"{total_bytes / (1024 * 1024):.1f} MB en {segundos:.1f}s | {mb_s:.2f} MB/s")
+    print(resumen)
 
-    # Descargamos cada mes
-    for periodo in periodos:
-        url = construir_url(base, periodo)
-        salida = carpeta_salida / f"yellow_tripdata_{periodo}.parquet"
-        descargar(url, salida, archivo_log, periodo)
+    # Lista de archivos nuevos o republicados en esta corrida (los que el cargador tiene que procesar)
+    nuevos = [f"yellow_tripdata_{r['periodo']}.parquet" for r in resultados if r["estado"] == "OK"]
+    if nuevos:
+        print("Nuevos o actualizados: " + ", ".join(nuevos))
 
     # Escribimos que terminamos
     fin = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    escribir_log(archivo_log, f"=== FIN {fin} ===\n")
+    escribir_log(archivo_log, f"=== FIN {fin} | {resumen} ===\n")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
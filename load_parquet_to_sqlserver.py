@@ -3,9 +3,9 @@ SCRIPT: Cargar archivos .parquet a SQL Server (tabla raw.yellow_trips)
 
 ¿Para qué sirve?
 - Lee muchos archivos .parquet desde una carpeta (PARQUET_DIR).
-- Por cada archivo:
-  1) lo carga a un DataFrame (tabla en memoria con pandas)
-  2) asegura que tenga las columnas esperadas y tipos correctos
+- Por cada archivo (en lotes, para que la memoria no dependa del tamaño del archivo):
+  1) lee un lote con pyarrow
+  2) asegura que tenga las columnas esperadas y tipos correctos (coerción en Arrow, ver ESQUEMA)
   3) agrega una columna para saber de qué archivo salió cada fila (source_file)
   4) inserta los datos en SQL Server en la tabla definida por TABLE
 
@@ -14,16 +14,36 @@ SCRIPT: Cargar archivos .parquet a SQL Server (tabla raw.yellow_trips)
   para luego hacer consultas, limpieza, features, modelos, etc.
 
 Requisitos:
-- Python con: pandas, numpy, pyodbc
+- Python con: pandas, numpy, pyarrow, pyodbc (psutil opcional, para reportar memoria)
 - SQL Server accesible y un driver ODBC instalado (ej: ODBC Driver 17 for SQL Server)
 - Que exista la carpeta con los .parquet
 """
 
+import argparse
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 from pathlib import Path
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 import pyodbc
 
+# psutil es opcional: solo se usa para reportar la memoria (RSS) en el log
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
 # ============================================================
 # 1) CONFIGURACIÓN (ajusta esto según tu PC / servidor / rutas)
 # ============================================================
@@ -40,29 +60,102 @@ PARQUET_DIR = Path(r"C:\Users\Keiver\Downloads\Proyecto_RegresionLineal\data\raw
 # Tabla destino (schema.tabla) en SQL Server
 TABLE = "raw.yellow_trips"
 
+# Esquema destino de raw.yellow_trips, declarado UNA sola vez:
+# (columna, tipo en SQL Server, tipo Arrow al que se convierte antes de insertar)
+# Lo usan ensure_table (CREATE TABLE), el INSERT, prep_df y la coerción en Arrow.
+ESQUEMA = [
+    ("VendorID", "INT", pa.int32()),
+    ("tpep_pickup_datetime", "DATETIME2", pa.timestamp("us")),
+    ("tpep_dropoff_datetime", "DATETIME2", pa.timestamp("us")),
+    ("passenger_count", "FLOAT", pa.float64()),
+    ("trip_distance", "FLOAT", pa.float64()),
+    ("RatecodeID", "FLOAT", pa.float64()),
+    ("store_and_fwd_flag", "VARCHAR(5)", pa.string()),
+    ("PULocationID", "INT", pa.int32()),
+    ("DOLocationID", "INT", pa.int32()),
+    ("payment_type", "FLOAT", pa.float64()),
+    ("fare_amount", "FLOAT", pa.float64()),
+    ("extra", "FLOAT", pa.float64()),
+    ("mta_tax", "FLOAT", pa.float64()),
+    ("tip_amount", "FLOAT", pa.float64()),
+    ("tolls_amount", "FLOAT", pa.float64()),
+    ("improvement_surcharge", "FLOAT", pa.float64()),
+    ("total_amount", "FLOAT", pa.float64()),
+    ("congestion_surcharge", "FLOAT", pa.float64()),
+    ("Airport_fee", "FLOAT", pa.float64()),
+    ("cbd_congestion_fee", "FLOAT", pa.float64()),
+]
+COLUMNAS = [c for c, _, _ in ESQUEMA]
+
+# Tabla "memoria" del cargue: qué archivos ya se cargaron (y cómo terminó cada uno)
+MANIFEST_TABLE = "raw.load_manifest"
+
+# Manifiesto JSON que deja import_data_vf.py en la carpeta de descargas (trae el SHA-256 de cada archivo).
+# Si existe, se reutiliza ese hash en vez de volver a leer el archivo completo para calcularlo.
+DOWNLOAD_MANIFEST = "manifest_descargas.json"
+
+# Filas por lote al leer cada parquet en modo streaming (0 = usar los row groups del archivo)
+BATCH_ROWS = 250_000
+
+# Motor de inserción por defecto: "executemany" (INSERT parametrizado) o "bulk" (BULK INSERT)
+ENGINE = "executemany"
+
+# Carpeta para los archivos temporales del motor "bulk".
+# OJO: BULK INSERT lo lee el SERVIDOR, no Python. La ruta debe ser visible para el servicio
+# de SQL Server (en local sirve una carpeta normal; en un servidor remoto, una ruta UNC compartida).
+STAGING_DIR = Path(r"C:\Users\Keiver\Downloads\Proyecto_RegresionLineal\data\staging")
+
+# Checkpoint: commit cada cuántos lotes dentro de un archivo (0 = un solo commit al final del archivo)
+CHECKPOINT_EVERY = 4
+
+# Lotes que pueden esperar entre etapas en modo pipeline (back-pressure: si la cola se llena,
+# la etapa anterior espera en vez de seguir acumulando memoria)
+QUEUE_SIZE = 2
+
+# =========================
+# CONFIGURACIÓN DE LOGS
+# =========================
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(levelname)s | %(message)s"
+)
+logger = logging.getLogger("parquet-loader")
+
 # ==================================
 # 2) CONEXIÓN A LA BASE DE DATOS SQL
 # ==================================
 
-# Creamos la conexión con pyodbc usando el driver ODBC
-# Encrypt=yes + TrustServerCertificate=yes:
-# - cifra la conexión (Encrypt)
-# - permite confiar en el certificado sin validarlo (útil en local/lab; en prod se revisa bien)
-conn = pyodbc.connect(
-    "DRIVER={ODBC Driver 17 for SQL Server};"
-    f"SERVER={SERVER};"
-    f"DATABASE={DB};"
-    f"UID={USER};"
-    f"PWD={PWD};"
-    "Encrypt=yes;"
-    "TrustServerCertificate=yes;"
-)
+def conectar(conn_str=None):
+    """
+    Abre una conexión nueva a SQL Server.
 
-# autocommit=False significa:
-# - Los INSERT no se “guardan” automáticamente.
-# - Necesitas llamar conn.commit() para confirmar los cambios.
-# Esto es útil para tener control: si algo falla, puedes evitar que queden datos “a medias”.
-conn.autocommit = False
+    Antes la conexión se abría al importar el módulo; ahora vive en una función
+    para que el benchmark (y cualquier otro script que importe este archivo)
+    pueda usar las funciones sin necesitar la base de datos.
+
+    conn_str (opcional): cadena ODBC completa. Sirve para apuntar a otra base
+    (ej: una instancia local de pruebas) sin tocar SERVER/DB/USER/PWD.
+    """
+    # Creamos la conexión con pyodbc usando el driver ODBC
+    # Encrypt=yes + TrustServerCertificate=yes:
+    # - cifra la conexión (Encrypt)
+    # - permite confiar en el certificado sin validarlo (útil en local/lab; en prod se revisa bien)
+    conn = pyodbc.connect(conn_str or (
+        "DRIVER={ODBC Driver 17 for SQL Server};"
+        f"SERVER={SERVER};"
+        f"DATABASE={DB};"
+        f"UID={USER};"
+        f"PWD={PWD};"
+        "Encrypt=yes;"
+        "TrustServerCertificate=yes;"
+    ))
+
+    # autocommit=False significa:
+    # - Los INSERT no se “guardan” automáticamente.
+    # - Necesitas llamar conn.commit() para confirmar los cambios.
+    # Esto es útil para tener control: si algo falla, puedes evitar que queden datos “a medias”.
+    conn.autocommit = False
+    return conn
 
 
 def ensure_table(cursor):
@@ -76,30 +169,12 @@ def ensure_table(cursor):
     Nota:
     - Si la tabla ya existe, no hace nada (no la borra ni la modifica).
     """
+    columnas_sql = ",\n            ".join(f"{c} {tipo} NULL" for c, tipo, _ in ESQUEMA)
     cursor.execute(f"""
     IF OBJECT_ID('{TABLE}', 'U') IS NULL
     BEGIN
         CREATE TABLE {TABLE} (
-            VendorID INT NULL,
-            tpep_pickup_datetime DATETIME2 NULL,
-            tpep_dropoff_datetime DATETIME2 NULL,
-            passenger_count FLOAT NULL,
-            trip_distance FLOAT NULL,
-            RatecodeID FLOAT NULL,
-            store_and_fwd_flag VARCHAR(5) NULL,
-            PULocationID INT NULL,
-            DOLocationID INT NULL,
-            payment_type FLOAT NULL,
-            fare_amount FLOAT NULL,
-            extra FLOAT NULL,
-            mta_tax FLOAT NULL,
-            tip_amount FLOAT NULL,
-            tolls_amount FLOAT NULL,
-            improvement_surcharge FLOAT NULL,
-            total_amount FLOAT NULL,
-            congestion_surcharge FLOAT NULL,
-            Airport_fee FLOAT NULL,
-            cbd_congestion_fee FLOAT NULL,
+            {columnas_sql},
             source_file VARCHAR(260) NULL
         );
     END
@@ -121,13 +196,8 @@ def prep_df(df: pd.DataFrame, source_file: str) -> pd.DataFrame:
     4) Agregar "source_file" para trazabilidad (saber de cuál parquet salió cada fila).
     """
 
-    # Lista oficial de columnas que queremos guardar (en este orden)
-    cols = [
-        "VendorID", "tpep_pickup_datetime", "tpep_dropoff_datetime", "passenger_count", "trip_distance",
-        "RatecodeID", "store_and_fwd_flag", "PULocationID", "DOLocationID", "payment_type", "fare_amount",
-        "extra", "mta_tax", "tip_amount", "tolls_amount", "improvement_surcharge", "total_amount",
-        "congestion_surcharge", "Airport_fee", "cbd_congestion_fee"
-    ]
+    # Lista oficial de columnas que queremos guardar (en este orden, la de ESQUEMA)
+    cols = COLUMNAS
 
     # -----------------------------
     # (1) Garantizar columnas
@@ -210,6 +280,158 @@ def to_py(x):
     return x
 
 
+def columnas_a_py(df: pd.DataFrame) -> list:
+    """
+    Convierte cada columna del DataFrame (salida de prep_df) a un arreglo de objetos
+    nativos de Python, listo para pyodbc.
+
+    ¿Por qué por columnas y no celda por celda?
+    - to_py() se llama una vez por CELDA: un mes (~3M filas x 21 columnas) son ~60M llamadas
+      de Python, cada una con varios isinstance/pd.isna.
+    - Aquí hacemos UNA conversión vectorizada por COLUMNA (numpy/pandas por dentro),
+      así que el costo en Python puro casi desaparece.
+
+    Reglas (las mismas que to_py):
+    - enteros nullable (Int64) -> int o None
+    - floats -> float, NaN -> None
+    - fechas (Timestamp) -> datetime de Python, NaT -> None
+    - strings de pandas -> str, NA -> None
+    """
+    columnas = []
+    for c in df.columns:
+        s = df[c]
+
+        if pd.api.types.is_datetime64_any_dtype(s.dtype):
+            # datetime64[us] -> object da datetime.datetime (y NaT -> None) directamente
+            arr = s.to_numpy(dtype="datetime64[us]").astype(object)
+
+        elif pd.api.types.is_float_dtype(s.dtype) and not isinstance(s.dtype, pd.api.extensions.ExtensionDtype):
+            # float64 -> object da floats de Python; luego ponemos None donde hay NaN
+            vals = s.to_numpy()
+            arr = vals.astype(object)
+            arr[np.isnan(vals)] = None
+
+        else:
+            # Int64 (nullable), string y object: pandas ya sabe devolver objetos nativos
+            # y reemplazar pd.NA/NaN por None en un solo paso
+            arr = s.to_numpy(dtype=object, na_value=None)
+
+        columnas.append(arr)
+
+    return columnas
+
+
+def iter_lotes(columnas: list, batch_size=5000):
+    """
+    Arma los lotes de parámetros (lista de tuplas) de forma "perezosa" (lazy):
+    solo se construye el lote que se va a insertar, no todas las filas a la vez.
+    """
+    n = len(columnas[0]) if columnas else 0
+    for i in range(0, n, batch_size):
+        yield list(zip(*(col[i:i + batch_size] for col in columnas)))
+
+
+# Unidad de un timestamp de Arrow -> unidad de pc.floor_temporal
+UNIDADES_TIEMPO = {"s": "second", "ms": "millisecond", "us": "microsecond", "ns": "nanosecond"}
+
+
+def _castear(arr, destino: pa.DataType):
+    """
+    Convierte una columna Arrow al tipo destino con la misma idea que errors="coerce":
+    lo que no se puede convertir queda en NULL en vez de romper el cargue.
+    Fechas con más precisión que el destino (ej: timestamp[ns] -> [us]) se truncan: DATETIME2 solo guarda µs.
+    """
+    if pa.types.is_floating(arr.type) and pa.types.is_integer(destino):
+        # NaN no existe en enteros: primero lo pasamos a NULL
+        arr = pc.if_else(pc.is_nan(arr), pa.scalar(None, arr.type), arr)
+    if pa.types.is_timestamp(arr.type) and pa.types.is_timestamp(destino):
+        # Los nanosegundos no son un error del dato: se cortan a la unidad destino antes del cast estricto
+        arr = pc.floor_temporal(arr, unit=UNIDADES_TIEMPO[destino.unit])
+    try:
+        # safe=True: si algún valor no cabe tal cual (ej: 1.5 -> entero, un int64 que no entra en int32)
+        # Arrow da error en vez de truncarlo o darle la vuelta, y se va al camino "coerce" de abajo
+        return pc.cast(arr, destino, safe=True)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        # Ej: números/fechas guardados como texto con basura adentro -> pandas con errors="coerce"
+        s = arr.to_pandas()
+        if pa.types.is_timestamp(destino):
+            s = pd.to_datetime(s, errors="coerce").dt.floor(destino.unit)
+        elif not pa.types.is_string(destino):
+            s = pd.to_numeric(s, errors="coerce")
+            if pa.types.is_integer(destino):
+                # Con decimales o fuera del rango del entero destino: NULL (no se trunca)
+                limites = np.iinfo(destino.to_pandas_dtype())
+                s = s.astype("float64").where((s % 1 == 0) & s.between(limites.min, limites.max))
+        return pa.array(s, type=destino, from_pandas=True)
+
+
+def _mismo_tipo(actual: pa.DataType, destino: pa.DataType) -> bool:
+    """True si la columna ya viene con el tipo destino (string y large_string cuentan como iguales)."""
+    if pa.types.is_string(destino):
+        return pa.types.is_string(actual) or pa.types.is_large_string(actual)
+    return actual == destino
+
+
+# Cómo pasar de Arrow a pandas: mismos dtypes que deja prep_df (enteros y texto "nullable")
+_TIPOS_PANDAS = {
+    pa.int32(): pd.Int32Dtype(),
+    pa.string(): pd.StringDtype(),
+    pa.large_string(): pd.StringDtype(),
+}
+
+
+def coercionar_arrow(tabla, source_file: str, reporte=None) -> pd.DataFrame:
+    """
+    Reemplazo de prep_df que trabaja directo sobre Arrow (lo que devuelve el lector de parquet).
+
+    En vez de convertir columna por columna con pandas (to_datetime, to_numeric, astype...),
+    compara cada columna con ESQUEMA y:
+    - si ya tiene el tipo destino -> se usa tal cual (zero-copy, no se materializa nada nuevo)
+    - si tiene otro tipo -> un solo cast en Arrow (ej: payment_type int64 -> float64)
+    - si falta -> columna de NULLs del tipo destino
+
+    reporte (dict opcional): acumula por archivo qué columnas fueron zero-copy y cuánto costó cada cast,
+    con la forma {"zero_copy": set, "casts": {col: segundos}, "faltantes": set}.
+
+    Retorna un DataFrame con las mismas columnas/orden/tipos que prep_df (incluye source_file).
+    """
+    if reporte is None:
+        reporte = {"zero_copy": set(), "casts": {}, "faltantes": set()}
+
+    n = tabla.num_rows
+    nombres = set(tabla.schema.names)
+    arrays = {}
+
+    for c, _, destino in ESQUEMA:
+        if c not in nombres:
+            arrays[c] = pa.nulls(n, type=destino)
+            reporte["faltantes"].add(c)
+            continue
+
+        col = tabla.column(c)
+        if _mismo_tipo(col.type, destino):
+            arrays[c] = col
+            reporte["zero_copy"].add(c)
+        else:
+            t = time.perf_counter()
+            arrays[c] = _castear(col, destino)
+            reporte["casts"][c] = reporte["casts"].get(c, 0.0) + time.perf_counter() - t
+
+    df = pa.table(arrays).to_pandas(types_mapper=_TIPOS_PANDAS.get)
+
+    # Trazabilidad
+    df["source_file"] = source_file
+    return df
+
+
+def resumen_esquema(reporte: dict) -> str:
+    """Texto corto para el log: columnas zero-copy y costo de cada cast en el archivo."""
+    casts = ", ".join(f"{c} {seg * 1000:.0f}ms" for c, seg in sorted(reporte["casts"].items(), key=lambda x: -x[1]))
+    faltantes = f" | faltantes (NULL): {', '.join(sorted(reporte['faltantes']))}" if reporte["faltantes"] else ""
+    return (f"esquema: {len(reporte['zero_copy'])}/{len(ESQUEMA)} columnas zero-copy | "
+            f"casts: {casts or 'ninguno'}{faltantes}")
+
+
 def insert_df(cursor, df: pd.DataFrame, batch_size=5000):
     """
     Inserta un DataFrame en SQL Server usando INSERT + executemany (por lotes).
@@ -219,73 +441,950 @@ def insert_df(cursor, df: pd.DataFrame, batch_size=5000):
       acelera muchísimo inserts masivos con pyodbc en SQL Server.
     - batch_size:
       inserta en grupos para no saturar memoria/tiempo (ej: 5000 filas por “viaje”).
+    - la conversión a tipos de Python se hace por columnas (columnas_a_py),
+      y las tuplas se arman lote a lote (iter_lotes).
+    """
+    # Convertimos el DataFrame columna por columna (vectorizado)
+    insertar_columnas(cursor, columnas_a_py(df), batch_size)
+
+
+def insertar_columnas(cursor, columnas: list, batch_size=5000, table=TABLE):
+    """
+    Inserta columnas ya convertidas (salida de columnas_a_py).
+    Separado de insert_df para que el modo pipeline pueda convertir en un hilo
+    e insertar en otro.
     """
     cursor.fast_executemany = True
 
     # SQL parametrizado: usamos ? para evitar construir valores dentro del SQL
     # (más seguro y más estable para tipos)
     sql = f"""
-    INSERT INTO {TABLE} (
-      VendorID,tpep_pickup_datetime,tpep_dropoff_datetime,passenger_count,trip_distance,
-      RatecodeID,store_and_fwd_flag,PULocationID,DOLocationID,payment_type,fare_amount,
-      extra,mta_tax,tip_amount,tolls_amount,improvement_surcharge,total_amount,
-      congestion_surcharge,Airport_fee,cbd_congestion_fee,source_file
-    )
-    VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+    INSERT INTO {table} ({",".join(COLUMNAS)},source_file)
+    VALUES ({",".join("?" * (len(COLUMNAS) + 1))})
     """
 
-    # Convertimos el DataFrame a una lista de tuplas “listas para SQL”
-    # df.itertuples(...) recorre fila por fila de forma eficiente
-    rows = [tuple(to_py(v) for v in row) for row in df.itertuples(index=False, name=None)]
-
     # Insert por lotes: 0..4999, 5000..9999, etc.
-    for i in range(0, len(rows), batch_size):
-        cursor.executemany(sql, rows[i:i + batch_size])
+    for lote in iter_lotes(columnas, batch_size):
+        cursor.executemany(sql, lote)
+
+
+# =====================================
+# 3) MOTORES DE INSERCIÓN (executemany / bulk)
+# =====================================
+# Un "motor" sabe hacer dos cosas con un lote ya preparado (salida de prep_df):
+# - preparar(df):        trabajo de CPU en Python (se puede hacer en otro hilo/proceso)
+# - insertar(cur, item): trabajo en SQL Server
+# Así el cargue (serie, pipeline o paralelo) no necesita saber cuál motor se usa.
+
+class MotorExecutemany:
+    """INSERT parametrizado + fast_executemany (el camino de siempre; sirve como respaldo)."""
+
+    nombre = "executemany"
+
+    def __init__(self, table=TABLE, batch_size=5000):
+        self.table = table
+        self.batch_size = batch_size
+
+    def preparar(self, df: pd.DataFrame):
+        return columnas_a_py(df)
+
+    def insertar(self, cursor, columnas):
+        insertar_columnas(cursor, columnas, self.batch_size, self.table)
+
+    def descartar(self, columnas):
+        pass
+
+
+class MotorBulk:
+    """
+    Escribe el lote a un archivo temporal delimitado por tabs y lo carga con BULK INSERT.
+
+    ¿Por qué es más rápido?
+    - No hay un viaje de parámetros por fila: SQL Server lee el archivo directo.
+    - Con TABLOCK sobre una tabla heap (sin índices) y la base en recovery SIMPLE o
+      BULK_LOGGED, SQL Server hace "minimal logging" (no escribe cada fila al log).
+
+    Formato del archivo:
+    - columnas separadas por TAB, filas por "\\n", UTF-8
+    - campo vacío = NULL (KEEPNULLS)
+    - fechas como 'YYYY-MM-DD HH:MM:SS.ffffff' (DATETIME2 lo entiende directo)
+    """
+
+    nombre = "bulk"
+
+    def __init__(self, table=TABLE, staging_dir=STAGING_DIR):
+        self.table = table
+        self.staging_dir = Path(staging_dir)
+
+    def preparar(self, df: pd.DataFrame) -> Path:
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        ruta = self.staging_dir / f"{self.table.replace('.', '_')}_{uuid.uuid4().hex}.tsv"
+        df.to_csv(ruta, sep="\t", header=False, index=False, na_rep="", lineterminator="\n",
+                  date_format="%Y-%m-%d %H:%M:%S.%f", encoding="utf-8")
+        return ruta
+
+    def insertar(self, cursor, ruta: Path):
+        try:
+            cursor.execute(f"""
+            BULK INSERT {self.table}
+            FROM '{ruta.resolve()}'
+            WITH (
+                FIELDTERMINATOR = '\\t',
+                ROWTERMINATOR = '0x0a',
+                CODEPAGE = '65001',
+                KEEPNULLS,
+                TABLOCK
+            )
+            """)
+        finally:
+            self.descartar(ruta)
+
+    def descartar(self, ruta: Path):
+        ruta.unlink(missing_ok=True)
+
+
+MOTORES = {"executemany": MotorExecutemany, "bulk": MotorBulk}
+
+
+def crear_motor(nombre=ENGINE, table=TABLE, staging_dir=STAGING_DIR):
+    """Crea el motor pedido por nombre ("executemany" o "bulk")."""
+    if nombre == "bulk":
+        return MotorBulk(table, staging_dir)
+    if nombre == "executemany":
+        return MotorExecutemany(table)
+    raise ValueError(f"Motor desconocido: {nombre} (opciones: {', '.join(MOTORES)})")
+
+
+# =====================================
+# 4) BENCHMARKS
+# =====================================
+
+def crear_df_sintetico(n_rows: int, seed=42) -> pd.DataFrame:
+    """
+    Crea un DataFrame falso con la forma de un parquet de yellow trips
+    (mismas columnas y tipos parecidos, con algunos nulos) para medir velocidad.
+    """
+    rng = np.random.default_rng(seed)
+    pickup = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 31 * 86400, n_rows), unit="s")
+    nulos = rng.random(n_rows) < 0.05  # ~5% de filas con nulos (como pasa en los parquets reales)
+
+    df = pd.DataFrame({
+        "VendorID": rng.integers(1, 3, n_rows).astype("int32"),
+        "tpep_pickup_datetime": pickup,
+        "tpep_dropoff_datetime": pickup + pd.to_timedelta(rng.integers(60, 3600, n_rows), unit="s"),
+        "passenger_count": np.where(nulos, np.nan, rng.integers(1, 5, n_rows)),
+        "trip_distance": rng.gamma(2.0, 1.5, n_rows).round(2),
+        "RatecodeID": np.where(nulos, np.nan, 1.0),
+        "store_and_fwd_flag": pd.Series(np.where(rng.random(n_rows) < 0.01, "Y", "N")).mask(nulos, None),
+        "PULocationID": rng.integers(1, 266, n_rows).astype("int32"),
+        "DOLocationID": rng.integers(1, 266, n_rows).astype("int32"),
+        "payment_type": rng.integers(0, 5, n_rows).astype("int64"),
+    })
+    for c in ["fare_amount", "extra", "mta_tax", "tip_amount", "tolls_amount",
+              "improvement_surcharge", "total_amount"]:
+        df[c] = rng.gamma(2.0, 8.0, n_rows).round(2)
+    df["congestion_surcharge"] = np.where(nulos, np.nan, 2.5)
+    df["Airport_fee"] = np.where(nulos, np.nan, 0.0)
+    # cbd_congestion_fee no existe en parquets viejos: la dejamos fuera a propósito
+    return df
+
+
+def benchmark_conversion(n_rows=1_000_000, batch_size=5000):
+    """
+    Compara filas/segundo de:
+    - ruta vieja: to_py() celda por celda + lista completa de tuplas
+    - ruta nueva: columnas_a_py() + iter_lotes()
+
+    Solo mide la conversión a tipos de Python (no toca SQL Server).
+    """
+    df = prep_df(crear_df_sintetico(n_rows), "sintetico.parquet")
+    print(f"Benchmark conversión: {n_rows:,} filas x {df.shape[1]} columnas")
+
+    t0 = time.perf_counter()
+    rows_old = [tuple(to_py(v) for v in row) for row in df.itertuples(index=False, name=None)]
+    t_old = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    n_new = 0
+    for lote in iter_lotes(columnas_a_py(df), batch_size):
+        n_new += len(lote)
+    t_new = time.perf_counter() - t0
+
+    # Chequeo (fuera del tiempo medido): TODOS los lotes deben tener exactamente
+    # los mismos valores que la ruta vieja, no solo el primero
+    if n_new != len(rows_old):
+        raise AssertionError(f"La conversión por columnas dio {n_new:,} filas y to_py() {len(rows_old):,}")
+    inicio = 0
+    for lote in iter_lotes(columnas_a_py(df), batch_size):
+        if lote != rows_old[inicio:inicio + len(lote)]:
+            raise AssertionError(f"La conversión por columnas no coincide con to_py() "
+                                 f"(lote que empieza en la fila {inicio:,})")
+        inicio += len(lote)
+
+    print(f"to_py (celda a celda): {t_old:8.2f}s | {len(rows_old) / t_old:12,.0f} filas/s")
+    print(f"columnas_a_py (lotes): {t_new:8.2f}s | {n_new / t_new:12,.0f} filas/s")
+    print(f"Aceleración: x{t_old / t_new:.1f}")
+
+
+def benchmark_motores(conn, path: Path, batch_rows=BATCH_ROWS, staging_dir=STAGING_DIR):
+    """
+    Carga el MISMO parquet con cada motor (executemany y bulk) y compara filas/s.
+
+    Para no duplicar datos en raw.yellow_trips, carga a una tabla de prueba con la misma
+    estructura (TABLE + "_bench"), que se vacía entre motores y se borra al final.
+    """
+    tabla = f"{TABLE}_bench"
+    cur = conn.cursor()
+    cur.execute(f"""
+    IF OBJECT_ID('{tabla}', 'U') IS NOT NULL DROP TABLE {tabla};
+    SELECT TOP 0 * INTO {tabla} FROM {TABLE};
+    """)
+    conn.commit()
+
+    logger.info(f"Benchmark de motores con {path.name} -> {tabla}")
+    try:
+        for nombre in MOTORES:
+            cur.execute(f"TRUNCATE TABLE {tabla}")
+            conn.commit()
+
+            stats = cargar_archivo(cur, path, batch_rows, crear_motor(nombre, tabla, staging_dir))
+            conn.commit()
+
+            en_tabla = cur.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+            logger.info(f"{nombre:>12}: {stats['filas']:,} filas ({en_tabla:,} en tabla) | "
+                        f"{stats['segundos']:.1f}s | {stats['filas'] / stats['segundos']:,.0f} filas/s")
+    finally:
+        cur.execute(f"IF OBJECT_ID('{tabla}', 'U') IS NOT NULL DROP TABLE {tabla}")
+        conn.commit()
+        cur.close()
+
+
+# =====================================
+# 5) LECTURA EN STREAMING (por lotes)
+# =====================================
+
+def rss_mb():
+    """
+    Memoria (RSS) actual del proceso en MB, o None si psutil no está instalado.
+    """
+    if psutil is None:
+        return None
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def iter_parquet(path, batch_rows=BATCH_ROWS, desde=0):
+    """
+    Recorre un parquet por pedazos en vez de leerlo completo con pd.read_parquet.
+
+    path puede ser la ruta del archivo o un pq.ParquetFile ya abierto (ej: uno que lee por HTTP,
+    ver stream_to_sqlserver.py).
+
+    - batch_rows > 0: lotes de ese número de filas (pyarrow los arma cruzando row groups).
+    - batch_rows = 0: un lote por cada row group del archivo.
+    - desde > 0: empieza en esa fila (para reanudar desde un checkpoint). Los row groups
+      que quedan completos antes de `desde` ni se leen; solo se recorta el primero.
+
+    Cada lote se entrega tal como lo decodifica pyarrow (RecordBatch/Table, sin pasar por pandas:
+    la conversión de tipos la hace coercionar_arrow). Cuando el que llama termina con él y pide
+    el siguiente, el anterior se puede liberar. Así la memoria depende del lote, no del archivo.
+    """
+    pf = path if isinstance(path, pq.ParquetFile) else pq.ParquetFile(path)
+
+    # Buscamos el primer row group que contiene la fila `desde`
+    inicio_rg, primera = 0, 0
+    while inicio_rg < pf.num_row_groups and primera + pf.metadata.row_group(inicio_rg).num_rows <= desde:
+        primera += pf.metadata.row_group(inicio_rg).num_rows
+        inicio_rg += 1
+    row_groups = list(range(inicio_rg, pf.num_row_groups))
+    saltar = desde - primera
+
+    if batch_rows and batch_rows > 0:
+        lotes = pf.iter_batches(batch_size=batch_rows, row_groups=row_groups) if row_groups else []
+    else:
+        lotes = (pf.read_row_group(i) for i in row_groups)
+
+    for lote in lotes:
+        if saltar:
+            n = min(saltar, lote.num_rows)
+            lote = lote.slice(n)
+            saltar -= n
+            if lote.num_rows == 0:
+                continue
+        yield lote
+
+
+def cargar_archivo(cur, path, batch_rows=BATCH_ROWS, motor=None, desde=0, al_insertar_lote=None,
+                   source_file=None) -> dict:
+    """
+    Carga UN parquet a SQL Server en modo streaming:
+    leer lote -> preparar -> insertar (con el motor elegido) -> soltar el lote -> siguiente lote.
+
+    No hace commit: el que llama decide cuándo confirmar. Para eso puede pasar
+    al_insertar_lote(filas_insertadas), que se llama después de cada lote (ej: checkpoints).
+    desde: fila del archivo donde empezar (reanudar).
+    source_file: nombre que se guarda en la columna source_file (por defecto, path.name;
+    es obligatorio si path es un pq.ParquetFile).
+
+    Retorna estadísticas del archivo: filas, segundos, pico de RSS (MB) observado y el
+    reporte de coerción de esquema (columnas zero-copy y costo de cada cast).
+    """
+    source_file = source_file or path.name
+    motor = motor or MotorExecutemany()
+    t0 = time.perf_counter()
+    filas = 0
+    pico = rss_mb()
+    reporte = {"zero_copy": set(), "casts": {}, "faltantes": set()}
+
+    for lote in iter_parquet(path, batch_rows, desde):
+        df = coercionar_arrow(lote, source_file, reporte)
+        del lote
+        motor.insertar(cur, motor.preparar(df))
+        filas += len(df)
+        if al_insertar_lote is not None:
+            al_insertar_lote(filas)
+
+        # Medimos con el lote todavía vivo (es el momento de mayor memoria)
+        actual = rss_mb()
+        if actual is not None:
+            pico = max(pico, actual)
+
+        # Soltamos el lote antes de leer el siguiente
+        del df
+
+    return {"archivo": source_file, "filas": filas, "segundos": time.perf_counter() - t0, "pico_rss_mb": pico,
+            "esquema": reporte}
+
+
+# =====================================================
+# 6) MODO PIPELINE (leer / preparar / insertar a la vez)
+# =====================================================
+
+# Marca de "no hay más lotes" que viaja por las colas
+_FIN = object()
+
+
+def _poner(q: queue.Queue, item, parar: threading.Event) -> bool:
+    """Pone item en la cola; si otra etapa falló (parar), se rinde en vez de quedarse bloqueado."""
+    while not parar.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _tomar(q: queue.Queue, parar: threading.Event):
+    """Saca el siguiente item de la cola, o _FIN si otra etapa falló."""
+    while not parar.is_set():
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+    return _FIN
+
+
+def cargar_archivo_pipeline(cur, path, batch_rows=BATCH_ROWS, queue_size=QUEUE_SIZE, motor=None, desde=0,
+                            al_insertar_lote=None, source_file=None) -> dict:
+    """
+    Igual que cargar_archivo, pero con las 3 etapas corriendo al mismo tiempo:
+
+        [lectura] --cola--> [preparación] --cola--> [inserción]
+
+    - lectura:     hilo que decodifica el parquet por lotes (pyarrow suelta el GIL)
+    - preparación: hilo que corre coercionar_arrow + motor.preparar (columnas_a_py o el archivo de staging)
+    - inserción:   el hilo que llama (dueño del cursor) corre motor.insertar, que espera al servidor
+
+    Las colas son acotadas (queue_size): si la inserción es la más lenta, la lectura se
+    detiene en vez de llenar la RAM. El wall time tiende a max(etapas) en vez de suma(etapas).
+
+    al_insertar_lote, desde y source_file funcionan igual que en cargar_archivo (el callback corre
+    en el hilo que llama, el mismo que usa el cursor, así que puede hacer commit).
+
+    Retorna las mismas estadísticas que cargar_archivo + segundos ocupados por etapa.
+    """
+    source_file = source_file or path.name
+    motor = motor or MotorExecutemany()
+    t0 = time.perf_counter()
+    leidos = queue.Queue(maxsize=queue_size)
+    preparados = queue.Queue(maxsize=queue_size)
+    parar = threading.Event()
+    errores = []
+    etapas = {"lectura": 0.0, "preparacion": 0.0, "insercion": 0.0}
+    reporte = {"zero_copy": set(), "casts": {}, "faltantes": set()}
+
+    def etapa_lectura():
+        try:
+            lotes = iter_parquet(path, batch_rows, desde)
+            while True:
+                t = time.perf_counter()
+                lote = next(lotes, _FIN)
+                etapas["lectura"] += time.perf_counter() - t
+                if lote is _FIN or not _poner(leidos, lote, parar):
+                    break
+        except BaseException as e:
+            errores.append(e)
+            parar.set()
+        finally:
+            _poner(leidos, _FIN, parar)
+
+    def etapa_preparacion():
+        try:
+            while True:
+                lote = _tomar(leidos, parar)
+                if lote is _FIN:
+                    break
+                t = time.perf_counter()
+                df = coercionar_arrow(lote, source_file, reporte)
+                del lote
+                item = (len(df), motor.preparar(df))
+                del df
+                etapas["preparacion"] += time.perf_counter() - t
+                if not _poner(preparados, item, parar):
+                    break
+        except BaseException as e:
+            errores.append(e)
+            parar.set()
+        finally:
+            _poner(preparados, _FIN, parar)
+
+    hilos = [
+        threading.Thread(target=etapa_lectura, name="lectura", daemon=True),
+        threading.Thread(target=etapa_preparacion, name="preparacion", daemon=True),
+    ]
+    for h in hilos:
+        h.start()
+
+    filas = 0
+    pico = rss_mb()
+    try:
+        while True:
+            item = _tomar(preparados, parar)
+            if item is _FIN:
+                break
+            n, preparado = item
+            t = time.perf_counter()
+            motor.insertar(cur, preparado)
+            etapas["insercion"] += time.perf_counter() - t
+            filas += n
+            if al_insertar_lote is not None:
+                al_insertar_lote(filas)
+
+            actual = rss_mb()
+            if actual is not None:
+                pico = max(pico, actual)
+            del item, preparado
+    except BaseException:
+        parar.set()
+        raise
+    finally:
+        for h in hilos:
+            h.join()
+        # Lotes que quedaron preparados sin insertar (por un error): limpiamos sus archivos temporales
+        while True:
+            try:
+                item = preparados.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _FIN:
+                motor.descartar(item[1])
+
+    if errores:
+        raise errores[0]
+
+    return {"archivo": source_file, "filas": filas, "segundos": time.perf_counter() - t0,
+            "pico_rss_mb": pico, "etapas": etapas, "esquema": reporte}
+
+
+def resumen_etapas(stats: dict) -> str:
+    """Texto corto para el log: segundos ocupados por etapa y cuál fue el cuello de botella."""
+    etapas = stats["etapas"]
+    cuello = max(etapas, key=etapas.get)
+    detalle = " | ".join(f"{k} {v:.1f}s" for k, v in etapas.items())
+    return f"etapas: {detalle} | suma {sum(etapas.values()):.1f}s vs wall {stats['segundos']:.1f}s | cuello de botella: {cuello}"
+
+
+# =====================================
+# 7) MANIFIESTO DE CARGA (cargue incremental)
+# =====================================
+# raw.load_manifest guarda una fila por archivo cargado:
+# - source_file, tamaño, fecha de modificación y hash SHA-256 del contenido
+# - row_count, status (LOADING / OK / FAIL) y duración
+#
+# Con eso, volver a correr el script ya no duplica datos:
+# - archivo con status OK y mismo tamaño + fecha -> se salta sin leerlo (búsqueda en un dict: O(1))
+# - archivo con status OK y mismo hash (solo cambió la fecha) -> se salta
+# - archivo LOADING/FAIL con checkpoint (rows_committed) y mismo hash -> se reanuda desde esa fila
+# - archivo LOADING/FAIL sin checkpoint o con contenido distinto -> DELETE por source_file y se recarga
+
+def ensure_manifest(cursor):
+    """Crea raw.load_manifest si no existe (no la borra ni la modifica si ya existe)."""
+    cursor.execute(f"""
+    IF OBJECT_ID('{MANIFEST_TABLE}', 'U') IS NULL
+    BEGIN
+        CREATE TABLE {MANIFEST_TABLE} (
+            source_file VARCHAR(260) NOT NULL PRIMARY KEY,
+            file_size BIGINT NULL,
+            file_mtime DATETIME2 NULL,
+            content_hash CHAR(64) NULL,
+            row_count BIGINT NULL,
+            status VARCHAR(10) NOT NULL,
+            duration_sec FLOAT NULL,
+            started_at DATETIME2 NULL,
+            finished_at DATETIME2 NULL,
+            rows_committed BIGINT NULL
+        );
+    END
+
+    -- Manifiestos creados antes de los checkpoints: agregamos la columna que falta
+    IF COL_LENGTH('{MANIFEST_TABLE}', 'rows_committed') IS NULL
+        ALTER TABLE {MANIFEST_TABLE} ADD rows_committed BIGINT NULL;
+    """)
+
+
+def hash_archivo(path: Path, chunk_size=1024 * 1024) -> str:
+    """SHA-256 del contenido del archivo (leído por pedazos de 1 MB)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def leer_manifiesto(cursor) -> dict:
+    """Trae el manifiesto completo a un dict {source_file: fila} (una sola consulta por corrida)."""
+    rows = cursor.execute(f"""
+    SELECT source_file, file_size, file_mtime, content_hash, row_count, status, rows_committed
+    FROM {MANIFEST_TABLE}
+    """).fetchall()
+    return {
+        r[0]: {"file_size": r[1], "file_mtime": r[2], "content_hash": r[3], "row_count": r[4], "status": r[5],
+               "rows_committed": r[6] or 0}
+        for r in rows
+    }
+
+
+def leer_manifiesto_descargas(carpeta: Path) -> dict:
+    """
+    Lee el manifiesto JSON del descargador (import_data_vf.py), si existe.
+    Retorna {nombre_archivo: {"size", "mtime_ns", "sha256", ...}} o {} si no hay manifiesto.
+    """
+    ruta = carpeta / DOWNLOAD_MANIFEST
+    if not ruta.exists():
+        return {}
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def hash_conocido(path: Path, descargas: dict):
+    """
+    SHA-256 de 'path' según el manifiesto de descargas, SOLO si el archivo en disco es exactamente
+    el que registró el descargador (mismo tamaño y misma fecha de modificación). Si no, None.
+    """
+    d = (descargas or {}).get(path.name)
+    st = path.stat()
+    if d and d.get("sha256") and d.get("size") == st.st_size and d.get("mtime_ns") == st.st_mtime_ns:
+        return d["sha256"]
+    return None
+
+
+def planear_carga(path: Path, manifiesto: dict, descargas=None) -> dict:
+    """
+    Decide qué hacer con un archivo según el manifiesto.
+
+    Retorna un "plan": {"accion": "saltar" | "cargar" | "reanudar" | "recargar", "file_size", "file_mtime",
+    "content_hash", "desde", "motivo"}. El hash solo se calcula si tamaño + fecha no bastan para decidir
+    (y si el manifiesto de descargas ya lo trae, ni siquiera se calcula).
+    """
+    st = path.stat()
+    plan = {
+        "file_size": st.st_size,
+        "file_mtime": datetime.fromtimestamp(st.st_mtime_ns // 1000 / 1e6),
+        "content_hash": None,
+        "desde": 0,
+    }
+    previo = manifiesto.get(path.name)
+
+    if (previo is not None and previo["status"] == "OK"
+            and previo["file_size"] == plan["file_size"] and previo["file_mtime"] == plan["file_mtime"]):
+        return {**plan, "accion": "saltar", "motivo": "sin cambios (tamaño y fecha)"}
+
+    # A partir de aquí el archivo es nuevo o cambió algo: el hash queda guardado en el manifiesto
+    plan["content_hash"] = hash_conocido(path, descargas) or hash_archivo(path)
+
+    if previo is None:
+        return {**plan, "accion": "cargar", "motivo": "nuevo"}
+
+    if previo["status"] == "OK":
+        if previo["content_hash"] == plan["content_hash"]:
+            return {**plan, "accion": "saltar", "motivo": "sin cambios (mismo hash)"}
+        # Registro heredado (creado con --inicializar-manifiesto, sin hash):
+        # si el conteo de filas coincide con el parquet, lo adoptamos sin recargar.
+        if previo["content_hash"] is None and previo["row_count"] == pq.ParquetFile(path).metadata.num_rows:
+            return {**plan, "accion": "saltar", "motivo": "ya estaba en raw (mismo conteo de filas)"}
+        return {**plan, "accion": "recargar", "motivo": "contenido distinto"}
+
+    # Quedó a medias: si es el mismo archivo y hay checkpoint, seguimos desde ahí
+    if previo["content_hash"] == plan["content_hash"] and previo["rows_committed"] > 0:
+        return {**plan, "accion": "reanudar", "desde": previo["rows_committed"],
+                "motivo": f"quedó en {previo['status']}, checkpoint en fila {previo['rows_committed']:,}"}
+
+    return {**plan, "accion": "recargar", "motivo": f"quedó en {previo['status']}"}
+
+
+def registrar_saltado(cursor, source_file: str, plan: dict):
+    """Actualiza tamaño/fecha/hash de un archivo saltado, para que la próxima vez se decida en O(1)."""
+    if plan["content_hash"] is None:
+        return
+    cursor.execute(f"""
+    UPDATE {MANIFEST_TABLE}
+    SET file_size = ?, file_mtime = ?, content_hash = ?
+    WHERE source_file = ?
+    """, plan["file_size"], plan["file_mtime"], plan["content_hash"], source_file)
+
+
+def registrar_inicio(cursor, source_file: str, plan: dict):
+    """
+    Deja el archivo en status LOADING (se confirma ANTES de cargar, para que quede huella si algo se cae).
+    rows_committed arranca en la fila desde donde se carga (0, o el checkpoint si se reanuda).
+    """
+    cursor.execute(f"DELETE FROM {MANIFEST_TABLE} WHERE source_file = ?", source_file)
+    cursor.execute(f"""
+    INSERT INTO {MANIFEST_TABLE} (source_file, file_size, file_mtime, content_hash, status, started_at, rows_committed)
+    VALUES (?, ?, ?, ?, 'LOADING', ?, ?)
+    """, source_file, plan["file_size"], plan["file_mtime"], plan["content_hash"], datetime.now(), plan["desde"])
+
+
+def registrar_checkpoint(cursor, source_file: str, rows_committed: int):
+    """Guarda hasta qué fila del archivo quedó confirmado (va en la MISMA transacción que esas filas)."""
+    cursor.execute(f"UPDATE {MANIFEST_TABLE} SET rows_committed = ? WHERE source_file = ?", rows_committed, source_file)
+
+
+def registrar_fin(cursor, source_file: str, status: str, row_count=None, duration_sec=None):
+    """Marca el final del cargue (OK o FAIL) con filas y duración. En OK, rows_committed = row_count."""
+    cursor.execute(f"""
+    UPDATE {MANIFEST_TABLE}
+    SET status = ?, row_count = ?, duration_sec = ?, finished_at = ?,
+        rows_committed = COALESCE(?, rows_committed)
+    WHERE source_file = ?
+    """, status, row_count, duration_sec, datetime.now(), row_count, source_file)
+
+
+def inicializar_manifiesto(cursor) -> int:
+    """
+    Registra como OK los source_file que YA están en raw.yellow_trips (cargados antes de existir el manifiesto).
+    Así, si esos archivos vuelven a la carpeta, no se duplican.
+    """
+    cursor.execute(f"""
+    INSERT INTO {MANIFEST_TABLE} (source_file, row_count, status, finished_at)
+    SELECT t.source_file, COUNT_BIG(*), 'OK', SYSDATETIME()
+    FROM {TABLE} t
+    WHERE t.source_file IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM {MANIFEST_TABLE} m WHERE m.source_file = t.source_file)
+    GROUP BY t.source_file
+    """)
+    return cursor.rowcount
+
+
+class FallaInyectada(RuntimeError):
+    """Error a propósito (--fallar-despues-de) para probar que reanudar no duplica ni pierde filas."""
+
+
+def cargar_con_manifiesto(conn, path, plan: dict, batch_rows=BATCH_ROWS, pipeline=False,
+                          queue_size=QUEUE_SIZE, motor=None, checkpoint_every=CHECKPOINT_EVERY,
+                          fallar_despues_de=None, source_file=None) -> dict:
+    """
+    Carga un archivo dejando el manifiesto al día:
+    1) status LOADING (commit)
+    2) si es recarga: DELETE de sus filas viejas por source_file
+       (si es "reanudar", no se borra nada: se sigue desde plan["desde"])
+    3) insertar por lotes; cada `checkpoint_every` lotes se hace commit de las filas
+       JUNTO con rows_committed en el manifiesto (así el offset guardado siempre coincide
+       con lo que de verdad quedó en la tabla: ni duplicados ni huecos al reanudar)
+    4) status OK + row_count + duración, y commit
+    Si algo falla: rollback (solo se pierde lo posterior al último checkpoint) y status FAIL.
+
+    fallar_despues_de: solo para pruebas; lanza FallaInyectada después de ese número de lotes.
+    source_file: igual que en cargar_archivo (path puede ser un pq.ParquetFile abierto).
+    """
+    source_file = source_file or path.name
+    cur = conn.cursor()
+    registrar_inicio(cur, source_file, plan)
+    conn.commit()
+
+    desde = plan["desde"]
+    lotes = 0
+
+    def al_insertar_lote(filas):
+        nonlocal lotes
+        lotes += 1
+        if fallar_despues_de is not None and lotes >= fallar_despues_de:
+            raise FallaInyectada(f"falla inyectada después de {lotes} lote(s) ({desde + filas:,} filas)")
+        if checkpoint_every and lotes % checkpoint_every == 0:
+            registrar_checkpoint(cur, source_file, desde + filas)
+            conn.commit()
+
+    try:
+        if plan["accion"] == "recargar":
+            cur.execute(f"DELETE FROM {TABLE} WHERE source_file = ?", source_file)
+            logger.info(f"   {source_file}: borradas {cur.rowcount:,} filas previas ({plan['motivo']})")
+        elif plan["accion"] == "reanudar":
+            logger.info(f"   {source_file}: reanudando desde la fila {desde:,}")
+
+        if pipeline:
+            stats = cargar_archivo_pipeline(cur, path, batch_rows, queue_size, motor, desde, al_insertar_lote,
+                                            source_file)
+        else:
+            stats = cargar_archivo(cur, path, batch_rows, motor, desde, al_insertar_lote, source_file)
+
+        registrar_fin(cur, source_file, "OK", desde + stats["filas"], stats["segundos"])
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        registrar_fin(cur, source_file, "FAIL")
+        conn.commit()
+        raise
+    finally:
+        cur.close()
+
+    stats["desde"] = desde
+    return stats
+
+
+def verificar_conteos(cursor) -> list:
+    """
+    Compara, por source_file, row_count del manifiesto vs filas reales en raw.yellow_trips.
+    Retorna la lista de diferencias (vacía = todo cuadra: cada fila quedó exactamente una vez).
+    """
+    rows = cursor.execute(f"""
+    SELECT m.source_file, m.status, m.row_count, m.rows_committed, COUNT_BIG(t.source_file) AS en_tabla
+    FROM {MANIFEST_TABLE} m
+    LEFT JOIN {TABLE} t ON t.source_file = m.source_file
+    GROUP BY m.source_file, m.status, m.row_count, m.rows_committed
+    """).fetchall()
+
+    diferencias = []
+    for source_file, status, row_count, rows_committed, en_tabla in rows:
+        # OK: deben estar todas las filas; LOADING/FAIL: exactamente las del último checkpoint
+        esperado = row_count if status == "OK" else (rows_committed or 0)
+        if esperado != en_tabla:
+            diferencias.append({"source_file": source_file, "status": status, "esperado": esperado, "en_tabla": en_tabla})
+    return diferencias
+
+
+# =====================================
+# 8) CARGA EN PARALELO (varios archivos)
+# =====================================
+
+def cargar_archivo_en_worker(path: Path, plan: dict, conn_str=None, **opciones) -> dict:
+    """
+    Carga UN archivo dentro de un proceso trabajador (worker).
+
+    - Cada worker abre SU PROPIA conexión (las conexiones pyodbc no se pueden
+      compartir entre procesos).
+    - Prepara/convierte en su propio proceso (CPU) e inserta por su conexión (red),
+      así unos workers preparan mientras otros insertan.
+    - Hace commit de su propio archivo (y de su fila en el manifiesto):
+      si un archivo falla, no afecta a los demás.
+    - opciones: las mismas de cargar_con_manifiesto (batch_rows, pipeline, motor, checkpoint_every...).
+    """
+    conn = conectar(conn_str)
+    try:
+        stats = cargar_con_manifiesto(conn, path, plan, **opciones)
+    finally:
+        conn.close()
+
+    stats["worker"] = os.getpid()
+    return stats
+
+
+def cargar_en_paralelo(planes: dict, workers: int, conn_str=None, **opciones) -> list:
+    """
+    Reparte los archivos ({path: plan}) entre `workers` procesos y espera a que terminen.
+    opciones: se pasan tal cual a cargar_con_manifiesto en cada worker.
+
+    Al final escribe en el log:
+    - throughput por worker (archivos, filas, filas/s mientras estuvo ocupado)
+    - tiempo total (wall time) y filas/s globales
+    """
+    t0 = time.perf_counter()
+    resultados = []
+    errores = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futuros = {
+            pool.submit(cargar_archivo_en_worker, f, plan, conn_str, **opciones): f
+            for f, plan in planes.items()
+        }
+        for fut, f in futuros.items():
+            try:
+                stats = fut.result()
+            except Exception as e:
+                logger.exception(f"FAIL -> {f.name}: {e}")
+                errores += 1
+                continue
+            resultados.append(stats)
+            logger.info(f"OK -> {stats['archivo']} | filas: {stats['filas']:,} | {stats['segundos']:.1f}s "
+                        f"| worker {stats['worker']}")
+            logger.info(f"   {resumen_esquema(stats['esquema'])}")
+            if "etapas" in stats:
+                logger.info(f"   {resumen_etapas(stats)}")
+
+    wall = time.perf_counter() - t0
+
+    # Resumen por worker
+    por_worker = {}
+    for r in resultados:
+        w = por_worker.setdefault(r["worker"], {"archivos": 0, "filas": 0, "segundos": 0.0})
+        w["archivos"] += 1
+        w["filas"] += r["filas"]
+        w["segundos"] += r["segundos"]
+
+    for pid, w in sorted(por_worker.items()):
+        velocidad = w["filas"] / w["segundos"] if w["segundos"] > 0 else 0
+        logger.info(f"Worker {pid}: {w['archivos']} archivo(s) | {w['filas']:,} filas | "
+                    f"{w['segundos']:.1f}s ocupado | {velocidad:,.0f} filas/s")
+
+    total = sum(r["filas"] for r in resultados)
+    logger.info(f"Paralelo: {len(resultados)} archivo(s) OK, {errores} con error | {total:,} filas | "
+                f"wall time {wall:.1f}s | {total / wall if wall > 0 else 0:,.0f} filas/s")
+
+    if errores:
+        raise RuntimeError(f"{errores} archivo(s) fallaron en la carga en paralelo (ver log).")
+    return resultados
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Carga los .parquet de PARQUET_DIR a SQL Server (raw.yellow_trips).")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS,
+                        help=f"Filas por lote al leer cada parquet (por defecto: {BATCH_ROWS:,}; 0 = por row group)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Procesos que cargan archivos a la vez, cada uno con su conexión (por defecto: 1 = en serie)")
+    parser.add_argument("--engine", choices=sorted(MOTORES), default=ENGINE,
+                        help=f"Motor de inserción (por defecto: {ENGINE}). 'bulk' usa archivos temporales + BULK INSERT")
+    parser.add_argument("--staging-dir", type=Path, default=STAGING_DIR,
+                        help="Carpeta de archivos temporales del motor bulk (debe verla el servicio de SQL Server)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Lee, prepara e inserta al mismo tiempo (3 etapas con colas acotadas)")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE,
+                        help=f"Lotes en espera entre etapas del pipeline (por defecto: {QUEUE_SIZE})")
+    parser.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY,
+                        help=f"Commit cada K lotes dentro de un archivo (por defecto: {CHECKPOINT_EVERY}; 0 = solo al final)")
+    parser.add_argument("--fallar-despues-de", type=int, default=None, metavar="N",
+                        help="SOLO PRUEBAS: provoca un error después de N lotes para probar que reanudar funciona")
+    parser.add_argument("--verificar", action="store_true",
+                        help="No carga nada: compara row_count del manifiesto vs filas reales por source_file")
+    parser.add_argument("--inicializar-manifiesto", action="store_true",
+                        help="Registra en el manifiesto los source_file que ya están en raw (cargados antes de tenerlo)")
+    parser.add_argument("--conn-str", default=None,
+                        help="Cadena ODBC completa (opcional), ej: para probar contra una base local")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="No carga nada: compara filas/s de to_py() vs conversión por columnas.")
+    parser.add_argument("--benchmark-rows", type=int, default=1_000_000,
+                        help="Filas del DataFrame sintético del benchmark (por defecto: 1,000,000)")
+    parser.add_argument("--benchmark-engines", type=Path, default=None, metavar="PARQUET",
+                        help="Carga ese parquet con cada motor a una tabla de prueba y compara filas/s")
+    return parser.parse_args()
 
 
 def main():
     """
     Orquesta todo el proceso (pipeline):
-    1) abre cursor
-    2) asegura tabla
-    3) busca archivos .parquet
-    4) por cada archivo: leer -> preparar -> insertar -> commit
+    1) abre conexión y cursor
+    2) asegura tabla y manifiesto
+    3) busca archivos .parquet y salta los que el manifiesto ya tiene cargados
+    4) por cada archivo pendiente: leer por lotes -> preparar -> insertar -> commit
     5) cierra conexión
     """
+    args = parse_args()
+    if args.benchmark:
+        benchmark_conversion(args.benchmark_rows)
+        return
+
+    conn = conectar(args.conn_str)
     cur = conn.cursor()
 
-    # Creamos la tabla si no existe (y confirmamos esa creación)
+    # Creamos la tabla y el manifiesto si no existen (y confirmamos esa creación)
     ensure_table(cur)
+    ensure_manifest(cur)
     conn.commit()
 
+    if args.benchmark_engines:
+        benchmark_motores(conn, args.benchmark_engines, args.batch_rows, args.staging_dir)
+        conn.close()
+        return
+
+    if args.verificar:
+        diferencias = verificar_conteos(cur)
+        for d in diferencias:
+            logger.error(f"Descuadre -> {d['source_file']} ({d['status']}): esperado {d['esperado']:,}, "
+                         f"en tabla {d['en_tabla']:,}")
+        logger.info("Verificación OK: cada source_file tiene exactamente sus filas" if not diferencias
+                    else f"Verificación con {len(diferencias)} descuadre(s)")
+        conn.close()
+        return
+
+    if args.inicializar_manifiesto:
+        n = inicializar_manifiesto(cur)
+        conn.commit()
+        logger.info(f"Manifiesto inicializado: {n} source_file(s) existentes registrados como OK")
+
+    opciones = {
+        "batch_rows": args.batch_rows,
+        "pipeline": args.pipeline,
+        "queue_size": args.queue_size,
+        "motor": crear_motor(args.engine, TABLE, args.staging_dir),
+        "checkpoint_every": args.checkpoint_every,
+        "fallar_despues_de": args.fallar_despues_de,
+    }
+
     # Buscamos todos los .parquet en la carpeta (ordenados)
     files = sorted(PARQUET_DIR.glob("*.parquet"))
     if not files:
         raise FileNotFoundError(f"No encontré .parquet en: {PARQUET_DIR}")
 
-    # Recorremos archivo por archivo (esto ayuda a manejar volúmenes grandes)
+    # Consultamos el manifiesto UNA vez y decidimos qué hacer con cada archivo
+    manifiesto = leer_manifiesto(cur)
+    descargas = leer_manifiesto_descargas(PARQUET_DIR)
+    planes = {}
     for f in files:
-        print("Cargando:", f.name)
+        plan = planear_carga(f, manifiesto, descargas)
+        if plan["accion"] == "saltar":
+            registrar_saltado(cur, f.name, plan)
+            logger.info(f"SKIP -> {f.name}: {plan['motivo']}")
+        else:
+            planes[f] = plan
+    conn.commit()
 
-        # 1) Leer parquet -> DataFrame
-        df = pd.read_parquet(f)
+    logger.info(f"{len(planes)} archivo(s) por cargar, {len(files) - len(planes)} saltado(s)")
 
-        # 2) Preparar (columnas/tipos + source_file)
-        df = prep_df(df, f.name)
+    # Modo paralelo: cada worker abre su conexión; esta solo se usó para preparar el cargue
+    if args.workers > 1 and planes:
+        cur.close()
+        conn.close()
+        cargar_en_paralelo(planes, args.workers, args.conn_str, **opciones)
+        logger.info("Listo: cargado a raw.yellow_trips")
+        return
 
-        # 3) Insertar a SQL
-        insert_df(cur, df)
+    # Recorremos archivo por archivo; dentro de cada archivo, lote por lote
+    for f, plan in planes.items():
+        logger.info(f"Cargando: {f.name} ({plan['motivo']}, lotes de {args.batch_rows or 'row group'}, "
+                    f"motor {opciones['motor'].nombre})")
 
-        # 4) Confirmar (guardar cambios) por archivo
-        conn.commit()
+        # Inserta y confirma (cada checkpoint y al final), junto con su fila del manifiesto
+        stats = cargar_con_manifiesto(conn, f, plan, **opciones)
 
-        print("OK -> filas:", len(df))
+        pico = f"{stats['pico_rss_mb']:.0f} MB" if stats["pico_rss_mb"] is not None else "n/d (instala psutil)"
+        logger.info(f"OK -> filas: {stats['filas']:,} | {stats['segundos']:.1f}s | pico RSS: {pico}")
+        logger.info(f"   {resumen_esquema(stats['esquema'])}")
+        if "etapas" in stats:
+            logger.info(f"   {resumen_etapas(stats)}")
 
     # Cierre limpio de recursos
     cur.close()
     conn.close()
 
-    print("Listo: cargado a raw.yellow_trips")
+    logger.info("Listo: cargado a raw.yellow_trips")
 
 
 # Punto de entrada del script:
@@ -0,0 +1,561 @@
+"""
+SCRIPT: Entrenamiento de la regresión lineal SIN cargar todas las features en memoria (out-of-core)
+
+¿Para qué sirve?
+- train_model.py arma la matriz X completa (todas las filas de feat.features_hour_zone) y se la pasa a
+  LinearRegression().fit. La memoria crece con los años de historia: en algún momento no cabe.
+- Este script entrena el MISMO modelo (mismas columnas, log1p del objetivo y pesos 1 / 3 / 8 de train_model.py)
+  leyendo las features de a un lote y sin guardar las filas.
+
+¿Cómo lo hace? (ecuaciones normales)
+- La regresión lineal con pesos resuelve:   (X' W X) b = X' W y
+  X' W X es una matriz de (columnas x columnas) (~270 x 270) y X' W y un vector: NO dependen de cuántas filas hay.
+- Se pueden sumar por partes: lo de cada lote se suma a lo acumulado ("estadísticas suficientes").
+  Al final se resuelve el sistema una sola vez.
+- El one-hot de PULocationID tiene un solo 1 por fila, así que su parte de X' W X se arma con sumas por zona
+  (np.bincount), sin construir la matriz one-hot.
+- Las estadísticas se guardan por MES (artifacts/linreg_trips_count_v2_stats/mes=YYYY-MM.npz),
+  junto con la "versión" de ese mes en la fuente (filas + checksum). Con --incremental solo se leen los meses
+  nuevos o que cambiaron, y se vuelve a resolver con todos: el tiempo depende del mes nuevo, no de la historia.
+
+Split train / test:
+- train_model.py mezcla todas las filas con train_test_split (random_state=42): depende de TODAS las filas
+  y de su orden, así que no sirve para sumar por partes.
+- Aquí cada fila va a test según un hash de (fecha, hora, zona): ~20% a test, siempre la misma fila,
+  no importa en qué lote o corrida llegue. Por eso el test NO es el mismo que el de train_model.py.
+
+Requisitos:
+- Python con pandas, numpy, scipy, scikit-learn, joblib (+ pyodbc para leer de SQL Server)
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import linalg
+from sklearn.linear_model import LinearRegression
+
+import artefactos
+import registro
+import train_model as tm
+
+# ============================================================
+# 1) CONFIGURACIÓN
+# ============================================================
+
+# El modelo y el set de test van al registro de corridas, igual que en train_model.py (ver registro.py).
+# Estadísticas por mes: una carpeta fija, un .npz por mes (las usan --acumular / --incremental y backtest_model.py)
+STATS_DIR = Path("artifacts") / "linreg_trips_count_v2_stats"
+
+# Porcentaje de filas que van a test (por hash de fecha + hora + zona)
+PORCENTAJE_TEST = 20
+
+# Tamaño inicial de los vectores por zona (las zonas TLC van de 1 a 265; si aparece una mayor, se agrandan)
+ZONAS_INICIAL = 266
+
+# Columnas de la parte "densa" del sistema: intercepto + numéricas de train_model.py
+DENSAS = ["intercept"] + tm.COLUMNAS_NUMERICAS
+
+# Diferencia máxima aceptada en --verificar (predicciones en escala log)
+TOLERANCIA = 1e-6
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(levelname)s | %(message)s",
+)
+logger = logging.getLogger("ols-streaming")
+
+
+# ============================================================
+# 2) ESTADÍSTICAS SUFICIENTES
+# ============================================================
+
+def configuracion() -> dict:
+    """Lo que tiene que coincidir para poder sumar estadísticas guardadas en otra corrida."""
+    return {"numericas": tm.COLUMNAS_NUMERICAS, "pesos": tm.PESOS, "porcentaje_test": PORCENTAJE_TEST}
+
+
+class Estadisticas:
+    """
+    Sumas de un conjunto de filas (ej: las de train de un mes) con las que se arma X' W X y X' W y.
+    - densa  : sum w * a a'   (a = [1, numéricas])            -> 8 x 8
+    - zona_a : por zona, sum w * a                             -> zonas x 8 (columna 0 = suma de pesos)
+    - xy     : sum w * a * y                                   -> 8
+    - zona_y : por zona, sum w * y                             -> zonas
+    - yy     : sum w * y^2 (para el error sin volver a leer filas)
+    - filas / zona_filas : conteo de filas (total y por zona, sin pesos)
+    Dos Estadisticas se suman (sumar): así se combinan lotes, meses y corridas.
+    """
+
+    CAMPOS = ["densa", "zona_a", "xy", "zona_y", "yy", "filas", "zona_filas"]
+
+    def __init__(self, zonas=ZONAS_INICIAL):
+        d = len(DENSAS)
+        self.densa = np.zeros((d, d))
+        self.zona_a = np.zeros((zonas, d))
+        self.xy = np.zeros(d)
+        self.zona_y = np.zeros(zonas)
+        self.yy = np.zeros(())
+        self.filas = np.zeros((), dtype=np.int64)
+        self.zona_filas = np.zeros(zonas, dtype=np.int64)
+
+    def _crecer(self, zonas: int):
+        """Agranda los vectores por zona (si llega una zona mayor que las vistas)."""
+        extra = zonas - len(self.zona_y)
+        if extra > 0:
+            self.zona_a = np.vstack([self.zona_a, np.zeros((extra, self.zona_a.shape[1]))])
+            self.zona_y = np.concatenate([self.zona_y, np.zeros(extra)])
+            self.zona_filas = np.concatenate([self.zona_filas, np.zeros(extra, dtype=np.int64)])
+
+    def agregar(self, df: pd.DataFrame):
+        """Suma las filas de un lote (DataFrame con las columnas de calendario ya agregadas)."""
+        if df.empty:
+            return
+        a = np.column_stack([np.ones(len(df)), df[tm.COLUMNAS_NUMERICAS].to_numpy(np.float64)])
+        conteo = df["trips_count"].to_numpy(np.float64)
+        y = np.log1p(conteo)
+        w = tm.calcular_pesos(conteo)
+        zona = df["PULocationID"].to_numpy(np.int64)
+        self._crecer(int(zona.max()) + 1)
+        n_zonas = len(self.zona_y)
+
+        aw = a * w[:, None]
+        self.densa += aw.T @ a
+        self.xy += aw.T @ y
+        self.yy += w @ (y * y)
+        self.filas += len(df)
+        for j in range(a.shape[1]):
+            self.zona_a[:, j] += np.bincount(zona, weights=aw[:, j], minlength=n_zonas)
+        self.zona_y += np.bincount(zona, weights=w * y, minlength=n_zonas)
+        self.zona_filas += np.bincount(zona, minlength=n_zonas)
+
+    def sumar(self, otra: "Estadisticas") -> "Estadisticas":
+        self._crecer(len(otra.zona_y))
+        otra._crecer(len(self.zona_y))
+        for campo in self.CAMPOS:
+            setattr(self, campo, getattr(self, campo) + getattr(otra, campo))
+        return self
+
+    def sistema(self, categorias: np.ndarray):
+        """
+        Arma (X' W X, X' W y) con las columnas de train_model.py: intercepto, numéricas y
+        una columna por zona de `categorias` salvo la primera (drop_first).
+        """
+        self._crecer(int(categorias.max()) + 1)
+        z = categorias[1:]
+        d = len(DENSAS)
+        m = np.zeros((d + len(z), d + len(z)))
+        m[:d, :d] = self.densa
+        m[d:, :d] = self.zona_a[z]
+        m[:d, d:] = self.zona_a[z].T
+        # Dos columnas de zona distintas nunca tienen 1 en la misma fila: esa parte es diagonal
+        m[d:, d:] = np.diag(self.zona_a[z, 0])
+        r = np.concatenate([self.xy, self.zona_y[z]])
+        return m, r
+
+    @classmethod
+    def desde_npz(cls, datos, prefijo: str = "") -> "Estadisticas":
+        est = cls(zonas=0)
+        for campo in cls.CAMPOS:
+            setattr(est, campo, datos[prefijo + campo])
+        return est
+
+
+def resolver(train: Estadisticas, categorias: np.ndarray) -> LinearRegression:
+    """
+    Resuelve (X' W X) b = X' W y y lo deja en un LinearRegression de sklearn (el mismo tipo de artefacto
+    que train_model.py: validate_model.py lo usa con .predict como siempre).
+    """
+    m, r = train.sistema(categorias)
+    # Zonas sin filas de train (solo aparecen en test): su columna es toda 0 -> coeficiente 0
+    # (igual que la solución de mínima norma de sklearn)
+    activas = np.flatnonzero(np.diag(m) > 0)
+    m, r = m[np.ix_(activas, activas)], r[activas]
+
+    # Escalado por la diagonal: hora (0-23), montos (~20-100) y zonas (0/1) tienen escalas muy distintas;
+    # así el sistema queda mejor condicionado antes de resolverlo
+    escala = 1 / np.sqrt(np.diag(m))
+    m_esc = m * escala[:, None] * escala[None, :]
+    try:
+        b = linalg.solve(m_esc, r * escala, assume_a="pos")
+    except linalg.LinAlgError:
+        # Columnas que se repiten (ej: un solo mes -> "month" es igual al intercepto): mínimos cuadrados
+        b = linalg.lstsq(m_esc, r * escala)[0]
+    b *= escala
+
+    coef = np.zeros(len(DENSAS) + len(categorias) - 1)
+    coef[activas] = b
+    model = LinearRegression()
+    model.intercept_ = float(coef[0])
+    model.coef_ = coef[1:]
+    model.n_features_in_ = len(coef) - 1
+    return model
+
+
+def error_log(est: Estadisticas, model: LinearRegression, categorias: np.ndarray) -> dict:
+    """
+    Error en escala log (ponderado con los pesos) SIN volver a leer filas:
+    sum w (y - Xb)^2 = yy - 2 b' X'Wy + b' X'WX b
+    """
+    m, r = est.sistema(categorias)
+    b = np.concatenate([[model.intercept_], model.coef_])
+    sse = float(est.yy - 2 * b @ r + b @ m @ b)
+    suma_w = est.densa[0, 0]
+    media = est.xy[0] / suma_w
+    sst = float(est.yy - suma_w * media ** 2)
+    return {"filas": int(est.filas), "rmse_log": np.sqrt(max(sse, 0) / suma_w), "r2_log": 1 - sse / sst}
+
+
+# ============================================================
+# 3) RECORRER LOS LOTES
+# ============================================================
+
+def es_test(df: pd.DataFrame) -> np.ndarray:
+    """
+    True para las filas de test: hash de (día, hora, zona) -> 0..99 < PORCENTAJE_TEST.
+    Depende solo de la fila (no del lote ni del orden): siempre cae del mismo lado.
+    """
+    dia = df["trip_date"].to_numpy().astype("datetime64[D]").astype(np.int64)
+    clave = ((dia * 24 + df["pickup_hour"].to_numpy(np.int64)) * 1024
+             + df["PULocationID"].to_numpy(np.int64)).astype(np.uint64)
+    # splitmix64: mezcla los bits para que filas vecinas no caigan todas del mismo lado
+    h = clave + np.uint64(0x9E3779B97F4A7C15)
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    h = h ^ (h >> np.uint64(31))
+    return (h % np.uint64(100)) < np.uint64(PORCENTAJE_TEST)
+
+
+def meses_completos(desde=None, hasta=None):
+    """Las estadísticas se guardan por mes: el rango se amplía a meses enteros."""
+    if desde:
+        desde = str(pd.Timestamp(desde).to_period("M").start_time.date())
+    if hasta:
+        hasta = str(pd.Timestamp(hasta).to_period("M").end_time.date())
+    return desde, hasta
+
+
+def acumular(lotes, guardar_test=True):
+    """
+    Recorre los lotes y acumula Estadisticas de train y de test por mes.
+    Si guardar_test, también guarda las filas de test (DataFrame compacto, ~30 bytes por fila)
+    para escribir X_test al final.
+    """
+    por_mes, test_filas, total = {}, [], 0
+    for lote in lotes:
+        lote = tm.agregar_calendario(lote)
+        test = es_test(lote)
+        mes = lote["trip_date"].dt.strftime("%Y-%m").to_numpy()
+        for m in np.unique(mes):
+            del_mes = mes == m
+            train_est, test_est = por_mes.setdefault(m, (Estadisticas(), Estadisticas()))
+            train_est.agregar(lote[del_mes & ~test])
+            test_est.agregar(lote[del_mes & test])
+        if guardar_test:
+            test_filas.append(lote[test])
+        total += len(lote)
+        logger.info(f"Lote: {len(lote):,} filas | acumuladas: {total:,} | meses: {len(por_mes)}")
+    return por_mes, test_filas
+
+
+# ============================================================
+# 4) GUARDAR / CARGAR ESTADÍSTICAS POR MES
+# ============================================================
+
+def guardar_meses(por_mes: dict, stats_dir: Path, versiones: dict):
+    """Un .npz por mes: train, test, configuración y la versión del mes en la fuente (para --incremental)."""
+    stats_dir.mkdir(parents=True, exist_ok=True)
+    config = json.dumps(configuracion())
+    for mes, (train_est, test_est) in por_mes.items():
+        path = stats_dir / f"mes={mes}.npz"
+        tmp = stats_dir / f"mes={mes}.tmp.npz"
+        datos = {"train_" + c: getattr(train_est, c) for c in Estadisticas.CAMPOS}
+        datos.update({"test_" + c: getattr(test_est, c) for c in Estadisticas.CAMPOS})
+        np.savez(tmp, config=config, version=json.dumps(versiones.get(mes)), **datos)
+        os.replace(tmp, path)
+
+
+def cargar_meses(stats_dir: Path):
+    """Todas las estadísticas guardadas: ({mes: (train, test)}, {mes: versión})."""
+    config = json.loads(json.dumps(configuracion()))  # igual que queda en el archivo (tuplas -> listas)
+    por_mes, versiones = {}, {}
+    for path in sorted(stats_dir.glob("mes=*.npz")):
+        if path.name.endswith(".tmp.npz"):
+            continue
+        mes = path.stem.split("=", 1)[1]
+        with np.load(path) as datos:
+            if json.loads(str(datos["config"])) != config:
+                raise ValueError(f"{path} se calculó con otras columnas / pesos / % de test. "
+                                 f"Vuelve a leer ese mes (sin --acumular) o borra {stats_dir}")
+            por_mes[mes] = (Estadisticas.desde_npz(datos, "train_"), Estadisticas.desde_npz(datos, "test_"))
+            versiones[mes] = json.loads(str(datos["version"])) if "version" in datos else None
+    return por_mes, versiones
+
+
+# ----------------------------------------------------------
+# Versión de cada mes en la fuente (qué meses hay que volver a leer)
+# ----------------------------------------------------------
+# - SQL Server: filas + checksum de las filas del mes (train_model.CHECKSUM_FEAT). Lo calcula el servidor
+#   en una sola consulta agrupada: no viajan filas.
+# - parquet: nombre / tamaño / fecha de los archivos de la carpeta del mes (trip_month=YYYY-MM).
+def versiones_sql(engine, desde=None, hasta=None) -> dict:
+    where, params = tm.filtro_fechas(desde, hasta)
+    conn = engine.raw_connection()
+    try:
+        filas = conn.cursor().execute(f"""
+        SELECT CONVERT(CHAR(7), trip_date, 126) AS mes, COUNT_BIG(*), {tm.CHECKSUM_FEAT}
+        FROM feat.features_hour_zone
+        {where}
+        GROUP BY CONVERT(CHAR(7), trip_date, 126)
+        """, *params).fetchall()
+    finally:
+        conn.close()
+    return {mes: [int(n), checksum] for mes, n, checksum in filas}
+
+
+def versiones_parquet(features_parquet, desde=None, hasta=None) -> dict:
+    versiones = {}
+    for carpeta in sorted(Path(features_parquet).glob("trip_month=*")):
+        mes = carpeta.name.split("=", 1)[1]
+        if (desde and mes < desde[:7]) or (hasta and mes > hasta[:7]):
+            continue
+        versiones[mes] = tm.version_parquet(carpeta)["firma"]
+    return versiones
+
+
+def meses_a_actualizar(versiones: dict, stats_dir: Path, desde=None, hasta=None):
+    """
+    Compara la versión de cada mes en la fuente con la guardada en stats_dir.
+    Retorna (meses a leer: nuevos o cambiados, meses quitados). Los quitados (ya no están en la fuente,
+    dentro del rango pedido) salen del modelo. Aquí NO se borra nada: el que llama decide si se guarda
+    (quitar_meses junto con guardar_meses) o no (ej: la corrida ya estaba registrada).
+    """
+    guardados, versiones_guardadas = cargar_meses(stats_dir)
+    a_leer = sorted(m for m in versiones if versiones_guardadas.get(m) != versiones[m])
+    quitados = [m for m in guardados if m not in versiones
+                and (not desde or m >= desde[:7]) and (not hasta or m <= hasta[:7])]
+    return a_leer, quitados
+
+
+def quitar_meses(quitados: list, stats_dir: Path):
+    """Borra de stats_dir los meses que ya no están en la fuente (ver meses_a_actualizar)."""
+    for mes in quitados:
+        (stats_dir / f"mes={mes}.npz").unlink(missing_ok=True)
+
+
+def rango_mes(mes: str):
+    """(primer día, último día) de un mes 'YYYY-MM'."""
+    periodo = pd.Period(mes, freq="M")
+    return str(periodo.start_time.date()), str(periodo.end_time.date())
+
+
+def sumar_meses(por_mes: dict):
+    train, test = Estadisticas(), Estadisticas()
+    for train_est, test_est in por_mes.values():
+        train.sumar(train_est)
+        test.sumar(test_est)
+    return train, test
+
+
+def zonas_del_modelo(train: Estadisticas, test: Estadisticas) -> np.ndarray:
+    """Las zonas que aparecen en las filas del modelo (train + test), igual que get_dummies sobre todo el df."""
+    filas = train.zona_filas.copy()
+    filas[:len(test.zona_filas)] += test.zona_filas
+    return np.flatnonzero(filas)
+
+
+# ============================================================
+# 5) VERIFICAR (contra el ajuste en memoria de train_model.py)
+# ============================================================
+
+def verificar(model, categorias, features_parquet=None, desde=None, hasta=None) -> bool:
+    """
+    Lee todas las filas (como train_model.py), usa el MISMO split (es_test) y ajusta con train_model.entrenar.
+    Compara intercepto, coeficientes y predicciones con el modelo de las ecuaciones normales.
+    """
+    df = tm.leer_features(features_parquet, desde, hasta)
+    test = es_test(df)
+    X, columnas, y_log, y_real = tm.preparar_xy(df, categorias)
+    en_memoria = tm.entrenar(X[~test], y_log[~test], y_real[~test])
+
+    dif_coef = float(np.abs(en_memoria.coef_ - model.coef_).max())
+    dif_intercepto = abs(en_memoria.intercept_ - model.intercept_)
+    dif_pred = float(np.abs(en_memoria.predict(X) - model.predict(X)).max())
+    ok = dif_pred <= TOLERANCIA
+    logger.info(f"Verificación vs LinearRegression en memoria ({X.shape[0]:,} filas x {X.shape[1]} columnas): "
+                f"dif. intercepto={dif_intercepto:.2e} | dif. coeficientes={dif_coef:.2e} | "
+                f"dif. predicción (log)={dif_pred:.2e} -> {'OK' if ok else 'DIFERENTE'}")
+    return ok
+
+
+# ============================================================
+# 6) PROGRAMA PRINCIPAL
+# ============================================================
+
+def guardar_test(test_filas: list, categorias: np.ndarray, carpeta: Path):
+    """X_test / y_test con el mismo formato que train_model.py (para validate_model.py)."""
+    df = pd.concat(test_filas, ignore_index=True)
+    X_test, columnas, y_test_log, y_test_real = tm.preparar_xy(df, categorias)
+    artefactos.guardar_test(X_test, columnas, y_test_real, y_test_log, carpeta)
+
+
+def parametros(args) -> dict:
+    """
+    Lo que define el modelo además de las versiones de los meses (va a la huella del registro de corridas).
+    El modo no: con los mismos meses y la misma configuración, completo / incremental / acumular / solo-stats
+    dan el mismo modelo (ver modo()).
+    """
+    return {"fuente": "parquet" if args.features_parquet else "sql", "desde": args.desde, "hasta": args.hasta,
+            "sin_test": args.sin_test, **configuracion()}
+
+
+def modo(args) -> str:
+    """Cómo se llega al modelo: queda en la corrida (params["modo"]) pero fuera de la huella."""
+    return next((m for m in ["solo_stats", "acumular", "incremental"] if getattr(args, m)), "completo")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Regresión lineal de trips_count por ecuaciones normales "
+                                                 "(lee las features por lotes, memoria fija).")
+    parser.add_argument("--features-parquet", nargs="?", const=tm.FEATURES_PARQUET, default=None,
+                        help=f"Leer del dataset parquet de build_features_parquet.py (sin ruta: {tm.FEATURES_PARQUET})")
+    parser.add_argument("--desde", default=None, help="Primer mes a leer (YYYY-MM-DD; se usa el mes entero)")
+    parser.add_argument("--hasta", default=None, help="Último mes a leer (YYYY-MM-DD; se usa el mes entero)")
+    parser.add_argument("--chunk-rows", type=int, default=tm.CHUNK_ROWS, help="Filas por lote")
+    parser.add_argument("--stats-dir", type=Path, default=STATS_DIR, help="Carpeta de estadísticas por mes")
+    parser.add_argument("--acumular", action="store_true",
+                        help="Resolver con TODOS los meses guardados en --stats-dir (los leídos ahora reemplazan "
+                             "a los guardados). Ej: sumar un mes nuevo leyendo solo ese mes")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Leer solo los meses nuevos o que cambiaron en la fuente (según la versión guardada "
+                             "de cada mes) y resolver con todos los meses guardados")
+    parser.add_argument("--solo-stats", action="store_true",
+                        help="No leer features: resolver con los meses ya guardados en --stats-dir")
+    parser.add_argument("--sin-test", action="store_true",
+                        help="No guardar X_test / y_test (las filas de test no se guardan en memoria)")
+    parser.add_argument("--verificar", action="store_true",
+                        help="Comparar con LinearRegression en memoria sobre las mismas filas (necesita que quepan)")
+    parser.add_argument("--forzar", action="store_true",
+                        help="Entrenar aunque ya haya una corrida con los mismos meses (mismas versiones) y parámetros")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    t0 = time.perf_counter()
+    desde, hasta = meses_completos(args.desde, args.hasta)
+
+    test_filas = []
+    params = parametros(args)
+    if args.solo_stats:
+        versiones = {}
+    else:
+        engine = None if args.features_parquet else tm.crear_engine()
+
+        def iterar(desde, hasta):
+            if args.features_parquet:
+                return tm.iterar_lotes_parquet(args.features_parquet, desde, hasta, args.chunk_rows)
+            return tm.iterar_lotes_sql(engine, desde, hasta, args.chunk_rows)
+
+        # La versión se pide ANTES de leer: si la fuente cambia mientras se lee, la próxima corrida lo ve
+        if args.features_parquet:
+            versiones = versiones_parquet(args.features_parquet, desde, hasta)
+        else:
+            versiones = versiones_sql(engine, desde, hasta)
+
+    quitados = []
+    if args.incremental:
+        a_leer, quitados = meses_a_actualizar(versiones, args.stats_dir, desde, hasta)
+        logger.info(f"Incremental: {len(versiones)} mes(es) en la fuente | a leer (nuevos o cambiados): "
+                    f"{', '.join(a_leer) or 'ninguno'} | quitados: {', '.join(quitados) or 'ninguno'}")
+
+    # Meses que van a quedar en el modelo: los de la fuente y, con --acumular / --incremental / --solo-stats,
+    # también los guardados en --stats-dir (los leídos ahora reemplazan a los guardados; los quitados salen)
+    guardados, versiones_guardadas = cargar_meses(args.stats_dir) if modo(args) != "completo" else ({}, {})
+    guardados = {m: est for m, est in guardados.items() if m not in quitados}
+    versiones_modelo = {**{m: v for m, v in versiones_guardadas.items() if m not in quitados}, **versiones}
+
+    # Si las versiones de esos meses y los parámetros son los de una corrida anterior, el modelo sería el mismo,
+    # no importa el modo (ej: --incremental sin meses nuevos ni cambiados, o --solo-stats después de --incremental).
+    # Excepción: la corrida anterior no tiene set de test (ej: fue --incremental) y esta lo guardaría completo
+    if not (args.forzar or args.verificar):
+        anterior = registro.buscar_corrida(registro.huella_entradas(registro.huella(versiones_modelo), params))
+        if anterior and registro.carpetas(anterior)["test"] is None and modo(args) == "completo" and not args.sin_test:
+            logger.info(f"Mismo modelo que la corrida {anterior}, pero esa no tiene set de test: se entrena para "
+                        f"guardarlo")
+        elif anterior:
+            logger.info(f"Sin cambios en la fuente ni en los parámetros: el modelo es el de la corrida {anterior} "
+                        f"(--forzar para entrenar igual)")
+            return
+
+    por_mes, leidos = guardados, {}
+    if not args.solo_stats:
+        if args.incremental:
+            lotes = (lote for mes in a_leer for lote in iterar(*rango_mes(mes)))
+        else:
+            lotes = iterar(desde, hasta)
+        leidos, test_filas = acumular(lotes, guardar_test=not args.sin_test)
+        guardar_meses(leidos, args.stats_dir, versiones)
+        quitar_meses(quitados, args.stats_dir)
+        logger.info(f"Estadísticas guardadas: {len(leidos)} mes(es) en {args.stats_dir}")
+        por_mes = {**guardados, **leidos}
+
+    # El set de test tiene que ser el de TODOS los meses del modelo. Con --acumular / --incremental las filas
+    # de test en memoria son solo las de los meses leídos ahora: validar con eso mediría solo esos meses
+    # como si fueran las métricas del modelo. Volver a leer el resto haría perder lo que ahorra leer
+    # solo los meses nuevos, así que la corrida queda sin set de test (y lo dice en el registro)
+    nota = None
+    no_leidos = sorted(set(por_mes) - set(leidos))
+    if args.sin_test:
+        nota = "--sin-test"
+    elif no_leidos:
+        test_filas = []
+        nota = (f"sin set de test completo: {len(no_leidos)} de {len(por_mes)} meses del modelo salieron de "
+                f"las estadísticas guardadas ({no_leidos[0]} .. {no_leidos[-1]}), no se leyeron sus filas. "
+                f"Para validar, entrena sin --acumular / --incremental / --solo-stats")
+        logger.warning(f"Corrida sin set de test: {nota}")
+
+    if not por_mes:
+        raise SystemExit("No hay filas ni estadísticas para entrenar")
+    train, test = sumar_meses(por_mes)
+    categorias = zonas_del_modelo(train, test)
+    model = resolver(train, categorias)
+    t_total = time.perf_counter() - t0
+
+    # Modelo y set de test: corrida nueva del registro (artifacts/objetos/, ver registro.py)
+    t1 = time.perf_counter()
+    tmp = registro.carpeta_temporal()
+    artefactos.guardar_modelo(model, tmp / "modelo")
+    if test_filas:
+        guardar_test(test_filas, categorias, tmp / "test")
+    meses = sorted(por_mes)
+    huella_features = registro.huella(versiones_modelo)
+    tiempos = {"entrenar": t_total, "guardar": time.perf_counter() - t1}
+    run_id = registro.registrar_corrida("ols_streaming.py", huella_features, params, tiempos,
+                                        tmp / "modelo", tmp / "test" if test_filas else None,
+                                        {"modo": modo(args), "nota": nota})
+    carpetas = registro.carpetas(run_id)
+
+    logger.info(f"Modelo: {model.n_features_in_} columnas | meses: {meses[0]} .. {meses[-1]} ({len(meses)}) | "
+                f"{t_total:.1f}s -> corrida {run_id} ({carpetas['modelo'].as_posix()})")
+    for nombre, est in [("train", train), ("test", test)]:
+        e = error_log(est, model, categorias)
+        logger.info(f"{nombre}: {e['filas']:,} filas | RMSE (log, ponderado)={e['rmse_log']:.4f} | "
+                    f"R2 (log, ponderado)={e['r2_log']:.4f}")
+    if test_filas:
+        logger.info(f"X_test / y_test guardados en {carpetas['test'].as_posix()} (para validate_model.py)")
+
+    # Se verifica contra los meses que entraron al modelo (con --acumular / --incremental / --solo-stats
+    # pueden ser más que los leídos): es la comparación contra re-entrenar todo desde cero
+    if args.verificar and not verificar(model, categorias, args.features_parquet,
+                                        *meses_completos(meses[0] + "-01", meses[-1] + "-01")):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,22 @@
+import argparse
+
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 
-df = pd.read_csv("artifacts/validation_results.csv")
+import artefactos
+import registro
+
+# Corrida a graficar (ver: python registro.py). Por defecto la última.
+parser = argparse.ArgumentParser(description="Gráficos del resultado por fila de validate_model.py.")
+parser.add_argument("--run-id", default=None, help="Corrida del registro (por defecto: la última)")
+args = parser.parse_args()
+carpetas = registro.carpetas(args.run_id)
+if carpetas["resultados"] is None:
+    raise SystemExit(f"La corrida {carpetas['run_id']} no está validada: corre validate_model.py --run-id {carpetas['run_id']}")
+
+# Resultado por fila de validate_model.py (parquet con tipos; si es de antes, el CSV)
+df = artefactos.cargar_resultados(["y_real", "y_pred", "abs_error"], carpeta=carpetas["resultados"])
 
 y_real = df["y_real"].values
 y_pred = df["y_pred"].values
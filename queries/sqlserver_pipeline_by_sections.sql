@@ -141,6 +141,10 @@ BEGIN
 END
 GO
 
+-- 💡 Para agregar meses nuevos SIN reconstruir todo, usa el refresco incremental en Python:
+--    python refresh_layers.py
+--    (mismas reglas de esta sección y de la 03, pero solo sobre los source_file nuevos en raw)
+
 -- Si curated.yellow_trips ya existe, la borramos
 -- ¿Por qué? para reconstruirla desde cero y que quede actualizada y limpia.
 IF OBJECT_ID('curated.yellow_trips', 'U') IS NOT NULL
@@ -221,6 +225,9 @@ BEGIN
 END
 GO
 
+-- 💡 Alternativa incremental: python refresh_layers.py (recalcula solo los grupos afectados,
+--    sumando feat.features_partials en vez de releer curated)
+
 -- Si feat.features_hour_zone ya existe, la borramos
 IF OBJECT_ID('feat.features_hour_zone', 'U') IS NOT NULL
 BEGIN
@@ -261,6 +268,97 @@ GROUP BY
   PULocationID;
 GO
 
+-- ---------------------------------------------------------
+-- 03b) SUMAS PARCIALES POR ARCHIVO (para poder "sumar" meses sin releer viajes)
+-- ---------------------------------------------------------
+-- Problema: un AVG no se puede combinar. Si llegan viajes nuevos de un día que ya estaba en feat,
+-- no hay forma de "agregarlos" al promedio guardado: hay que releer TODOS los viajes de ese grupo.
+--
+-- Solución: guardar SUMAS (que sí se pueden sumar) por grupo y por archivo (source_file):
+--   conteo, suma, suma de cuadrados, mínimo y máximo de cada medida.
+-- - promedio = suma / conteo
+-- - varianza = (suma de cuadrados - suma² / conteo) / (conteo - 1)
+-- Un mes nuevo = sus filas de sumas; un mes recargado = borrar sus filas y volver a insertarlas.
+-- refresh_layers.py mantiene esta tabla al día y recalcula feat desde aquí (sin releer curated).
+
+IF OBJECT_ID('feat.features_partials', 'U') IS NOT NULL
+BEGIN
+    DROP TABLE feat.features_partials;
+    PRINT 'Se borró feat.features_partials (para reconstruirla).';
+END
+GO
+
+SELECT
+  source_file,
+  CAST(tpep_pickup_datetime AS date) AS trip_date,
+  DATEPART(HOUR, tpep_pickup_datetime) AS pickup_hour,
+  PULocationID,
+  COUNT_BIG(*) AS trips_count,
+
+  SUM(trip_distance) AS sum_trip_distance,
+  SUM(trip_distance * trip_distance) AS sumsq_trip_distance,
+  MIN(trip_distance) AS min_trip_distance,
+  MAX(trip_distance) AS max_trip_distance,
+
+  SUM(trip_duration_min) AS sum_trip_duration_min,
+  SUM(CAST(trip_duration_min AS FLOAT) * CAST(trip_duration_min AS FLOAT)) AS sumsq_trip_duration_min,
+  MIN(trip_duration_min) AS min_trip_duration_min,
+  MAX(trip_duration_min) AS max_trip_duration_min,
+
+  SUM(total_amount) AS sum_total_amount,
+  SUM(total_amount * total_amount) AS sumsq_total_amount,
+  MIN(total_amount) AS min_total_amount,
+  MAX(total_amount) AS max_total_amount
+INTO feat.features_partials
+FROM curated.yellow_trips
+WHERE PULocationID IS NOT NULL
+GROUP BY
+  source_file,
+  CAST(tpep_pickup_datetime AS date),
+  DATEPART(HOUR, tpep_pickup_datetime),
+  PULocationID;
+GO
+
+-- Vista: los promedios (y extras como varianza/mín/máx) se calculan al LEER, sumando los archivos.
+-- avg_* da lo mismo que feat.features_hour_zone.
+CREATE OR ALTER VIEW feat.v_features_hour_zone AS
+WITH s AS (
+  -- 1) sumar los archivos: una fila por grupo
+  SELECT
+    trip_date, pickup_hour, PULocationID,
+    SUM(trips_count) AS n,
+    SUM(sum_trip_distance) AS s_dist,     SUM(sumsq_trip_distance) AS q_dist,
+    SUM(sum_trip_duration_min) AS s_dur,  SUM(sumsq_trip_duration_min) AS q_dur,
+    SUM(sum_total_amount) AS s_total,     SUM(sumsq_total_amount) AS q_total,
+    MIN(min_trip_distance) AS min_trip_distance,         MAX(max_trip_distance) AS max_trip_distance,
+    MIN(min_trip_duration_min) AS min_trip_duration_min, MAX(max_trip_duration_min) AS max_trip_duration_min,
+    MIN(min_total_amount) AS min_total_amount,           MAX(max_total_amount) AS max_total_amount
+  FROM feat.features_partials
+  GROUP BY trip_date, pickup_hour, PULocationID
+)
+-- 2) de sumas a promedios / varianzas
+SELECT
+  trip_date,
+  pickup_hour,
+  PULocationID,
+  n AS trips_count,
+
+  s_dist / n AS avg_trip_distance,
+  CAST(s_dur AS DECIMAL(38, 6)) / n AS avg_trip_duration_min,
+  s_total / n AS avg_total_amount,
+
+  -- varianza de muestra (igual que VAR()); con 1 viaje no existe (NULL).
+  -- IIF(... < 0, 0, ...): la resta puede dar un negativo diminuto por redondeo
+  CASE WHEN n > 1 THEN IIF(q_dist - s_dist * s_dist / n < 0, 0, q_dist - s_dist * s_dist / n) / (n - 1) END AS var_trip_distance,
+  CASE WHEN n > 1 THEN IIF(q_dur - SQUARE(s_dur) / n < 0, 0, q_dur - SQUARE(s_dur) / n) / (n - 1) END AS var_trip_duration_min,
+  CASE WHEN n > 1 THEN IIF(q_total - s_total * s_total / n < 0, 0, q_total - s_total * s_total / n) / (n - 1) END AS var_total_amount,
+
+  min_trip_distance, max_trip_distance,
+  min_trip_duration_min, max_trip_duration_min,
+  min_total_amount, max_total_amount
+FROM s;
+GO
+
 -- ✅ DESPUÉS: mostrar 5 filas del DESTINO (feat)
 IF OBJECT_ID('feat.features_hour_zone', 'U') IS NOT NULL
 BEGIN
@@ -352,6 +450,19 @@ GROUP BY trip_date, pickup_hour, PULocationID
 HAVING COUNT(*) > 1;
 GO
 
+--Que las sumas parciales cuadren con FEAT (debería ser 0 filas):
+IF OBJECT_ID('feat.features_partials', 'U') IS NOT NULL
+SELECT f.trip_date, f.pickup_hour, f.PULocationID, f.trips_count, p.trips_count AS partials_trips_count
+FROM feat.features_hour_zone f
+FULL OUTER JOIN (
+  SELECT trip_date, pickup_hour, PULocationID, SUM(trips_count) AS trips_count
+  FROM feat.features_partials
+  GROUP BY trip_date, pickup_hour, PULocationID
+) p
+  ON p.trip_date = f.trip_date AND p.pickup_hour = f.pickup_hour AND p.PULocationID = f.PULocationID
+WHERE f.trips_count IS NULL OR p.trips_count IS NULL OR f.trips_count <> p.trips_count;
+GO
+
 --Que FEAT tenga datos coherentes (por ejemplo trips_count mínimo >= 1):
 SELECT 
   MIN(trips_count) AS min_trips,
@@ -0,0 +1,647 @@
+"""
+SCRIPT: Refresco INCREMENTAL de las capas RAW -> CURATED -> FEAT en SQL Server
+
+¿Para qué sirve?
+- Las secciones 02 y 03 de queries/sqlserver_pipeline_by_sections.sql hacen DROP TABLE + SELECT INTO:
+  reconstruyen curated.yellow_trips y feat.features_hour_zone con TODA la historia cada vez.
+  Agregar un mes cuesta leer todos los meses cargados.
+- Este script procesa SOLO los source_file nuevos (o recargados) en raw:
+  1) borra de curated las filas viejas de esos archivos (si es una recarga) e inserta sus filas limpias
+  2) calcula las SUMAS PARCIALES de esos archivos (feat.features_partials: conteo, sumas, sumas de
+     cuadrados, mín y máx por grupo y por source_file), leyendo solo sus filas nuevas
+  3) recalcula en feat SOLO los grupos (trip_date, pickup_hour, PULocationID) que tocan esos archivos,
+     sumando las parciales de todos los archivos del grupo (sin volver a leer viajes de curated)
+  Así el costo depende de lo nuevo, no del tamaño total de las tablas.
+
+¿Cómo sabe qué es nuevo?
+- raw.load_manifest (lo llena load_parquet_to_sqlserver.py) dice qué archivos están completos (status OK)
+  y cuándo terminó su carga (finished_at).
+- curated.refresh_log (lo llena este script) guarda hasta qué carga de cada archivo ya se refrescó.
+- Pendiente = archivo OK en el manifiesto que no está en refresh_log, o que se volvió a cargar después.
+
+Reglas de limpieza y features:
+- Son EXACTAMENTE las de las secciones 02 y 03 del .sql (mismo WHERE, mismas columnas, mismos AVG).
+- --verificar reconstruye todo desde cero en tablas temporales y lo compara con lo incremental.
+
+Requisitos:
+- Python con pyodbc (usa la conexión de load_parquet_to_sqlserver.py)
+"""
+
+import argparse
+import logging
+import time
+
+import load_parquet_to_sqlserver as cargador
+
+# ============================================================
+# 1) CONFIGURACIÓN
+# ============================================================
+
+RAW_TABLE = cargador.TABLE                 # raw.yellow_trips
+MANIFEST_TABLE = cargador.MANIFEST_TABLE   # raw.load_manifest
+CURATED_TABLE = "curated.yellow_trips"
+FEAT_TABLE = "feat.features_hour_zone"
+PARTIALS_TABLE = "feat.features_partials"
+STATS_VIEW = "feat.v_features_hour_zone"
+REFRESH_LOG_TABLE = "curated.refresh_log"
+
+# Tolerancia al comparar promedios en --verificar (AVG de FLOAT puede variar en el último decimal
+# según el orden en que SQL Server suma las filas)
+TOLERANCIA = 1e-9
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(levelname)s | %(message)s"
+)
+logger = logging.getLogger("layers-refresh")
+
+
+# =====================================
+# 2) SQL DE LAS CAPAS (igual que secciones 02 y 03)
+# =====================================
+
+# Sección 02: columnas de curated (1 fila = 1 viaje limpio)
+COLUMNAS_CURATED = """
+  VendorID,
+  tpep_pickup_datetime,
+  tpep_dropoff_datetime,
+  passenger_count,
+  trip_distance,
+  PULocationID,
+  DOLocationID,
+  total_amount,
+  fare_amount,
+  tip_amount,
+  congestion_surcharge,
+  Airport_fee,
+  DATEDIFF(SECOND, tpep_pickup_datetime, tpep_dropoff_datetime) / 60.0 AS trip_duration_min,
+  source_file
+"""
+
+NOMBRES_CURATED = """
+  VendorID, tpep_pickup_datetime, tpep_dropoff_datetime, passenger_count, trip_distance, PULocationID,
+  DOLocationID, total_amount, fare_amount, tip_amount, congestion_surcharge, Airport_fee,
+  trip_duration_min, source_file
+"""
+
+# Sección 02: el "colador" de registros inválidos
+FILTRO_CURATED = """
+  tpep_pickup_datetime IS NOT NULL
+  AND tpep_dropoff_datetime IS NOT NULL
+  AND tpep_dropoff_datetime > tpep_pickup_datetime
+  AND trip_distance > 0
+  AND total_amount > 0
+"""
+
+# Sección 03: features (1 fila = un día + una hora + una zona)
+COLUMNAS_FEAT = """
+  CAST(c.tpep_pickup_datetime AS date) AS trip_date,
+  DATEPART(HOUR, c.tpep_pickup_datetime) AS pickup_hour,
+  c.PULocationID,
+  COUNT(*) AS trips_count,
+  AVG(c.trip_distance) AS avg_trip_distance,
+  AVG(c.trip_duration_min) AS avg_trip_duration_min,
+  AVG(c.total_amount) AS avg_total_amount
+"""
+
+GROUP_BY_FEAT = """
+GROUP BY
+  CAST(c.tpep_pickup_datetime AS date),
+  DATEPART(HOUR, c.tpep_pickup_datetime),
+  c.PULocationID
+"""
+
+# Sección 03b: sumas parciales por grupo y por archivo (se pueden sumar entre archivos; un AVG no)
+COLUMNAS_PARCIALES = """
+  c.source_file,
+  CAST(c.tpep_pickup_datetime AS date) AS trip_date,
+  DATEPART(HOUR, c.tpep_pickup_datetime) AS pickup_hour,
+  c.PULocationID,
+  COUNT_BIG(*) AS trips_count,
+  SUM(c.trip_distance) AS sum_trip_distance,
+  SUM(c.trip_distance * c.trip_distance) AS sumsq_trip_distance,
+  MIN(c.trip_distance) AS min_trip_distance,
+  MAX(c.trip_distance) AS max_trip_distance,
+  SUM(c.trip_duration_min) AS sum_trip_duration_min,
+  SUM(CAST(c.trip_duration_min AS FLOAT) * CAST(c.trip_duration_min AS FLOAT)) AS sumsq_trip_duration_min,
+  MIN(c.trip_duration_min) AS min_trip_duration_min,
+  MAX(c.trip_duration_min) AS max_trip_duration_min,
+  SUM(c.total_amount) AS sum_total_amount,
+  SUM(c.total_amount * c.total_amount) AS sumsq_total_amount,
+  MIN(c.total_amount) AS min_total_amount,
+  MAX(c.total_amount) AS max_total_amount
+"""
+
+NOMBRES_PARCIALES = """
+  source_file, trip_date, pickup_hour, PULocationID, trips_count,
+  sum_trip_distance, sumsq_trip_distance, min_trip_distance, max_trip_distance,
+  sum_trip_duration_min, sumsq_trip_duration_min, min_trip_duration_min, max_trip_duration_min,
+  sum_total_amount, sumsq_total_amount, min_total_amount, max_total_amount
+"""
+
+GROUP_BY_PARCIALES = """
+GROUP BY
+  c.source_file,
+  CAST(c.tpep_pickup_datetime AS date),
+  DATEPART(HOUR, c.tpep_pickup_datetime),
+  c.PULocationID
+"""
+
+# feat desde las parciales: promedio = suma / conteo (mismos tipos que los AVG de la sección 03)
+COLUMNAS_FEAT_DESDE_PARCIALES = """
+  p.trip_date,
+  p.pickup_hour,
+  p.PULocationID,
+  SUM(p.trips_count) AS trips_count,
+  SUM(p.sum_trip_distance) / SUM(p.trips_count) AS avg_trip_distance,
+  CAST(SUM(p.sum_trip_duration_min) AS DECIMAL(38, 6)) / SUM(p.trips_count) AS avg_trip_duration_min,
+  SUM(p.sum_total_amount) / SUM(p.trips_count) AS avg_total_amount
+"""
+
+# Vista con promedios + varianza / mín / máx calculados al leer (igual que en la sección 03b del .sql)
+VISTA_FEAT = f"""
+CREATE OR ALTER VIEW {STATS_VIEW} AS
+WITH s AS (
+  SELECT
+    trip_date, pickup_hour, PULocationID,
+    SUM(trips_count) AS n,
+    SUM(sum_trip_distance) AS s_dist,     SUM(sumsq_trip_distance) AS q_dist,
+    SUM(sum_trip_duration_min) AS s_dur,  SUM(sumsq_trip_duration_min) AS q_dur,
+    SUM(sum_total_amount) AS s_total,     SUM(sumsq_total_amount) AS q_total,
+    MIN(min_trip_distance) AS min_trip_distance,         MAX(max_trip_distance) AS max_trip_distance,
+    MIN(min_trip_duration_min) AS min_trip_duration_min, MAX(max_trip_duration_min) AS max_trip_duration_min,
+    MIN(min_total_amount) AS min_total_amount,           MAX(max_total_amount) AS max_total_amount
+  FROM {PARTIALS_TABLE}
+  GROUP BY trip_date, pickup_hour, PULocationID
+)
+SELECT
+  trip_date,
+  pickup_hour,
+  PULocationID,
+  n AS trips_count,
+  s_dist / n AS avg_trip_distance,
+  CAST(s_dur AS DECIMAL(38, 6)) / n AS avg_trip_duration_min,
+  s_total / n AS avg_total_amount,
+  CASE WHEN n > 1 THEN IIF(q_dist - s_dist * s_dist / n < 0, 0, q_dist - s_dist * s_dist / n) / (n - 1) END AS var_trip_distance,
+  CASE WHEN n > 1 THEN IIF(q_dur - SQUARE(s_dur) / n < 0, 0, q_dur - SQUARE(s_dur) / n) / (n - 1) END AS var_trip_duration_min,
+  CASE WHEN n > 1 THEN IIF(q_total - s_total * s_total / n < 0, 0, q_total - s_total * s_total / n) / (n - 1) END AS var_total_amount,
+  min_trip_distance, max_trip_distance,
+  min_trip_duration_min, max_trip_duration_min,
+  min_total_amount, max_total_amount
+FROM s
+"""
+
+
+# =====================================
+# 3) TABLAS E ÍNDICES
+# =====================================
+
+def existe_tabla(cursor, tabla: str) -> bool:
+    return cursor.execute("SELECT OBJECT_ID(?, 'U')", tabla).fetchone()[0] is not None
+
+
+def ensure_refresh_log(cursor):
+    """Crea curated.refresh_log si no existe: una fila por source_file ya refrescado."""
+    cursor.execute(f"""
+    IF OBJECT_ID('{REFRESH_LOG_TABLE}', 'U') IS NULL
+    BEGIN
+        CREATE TABLE {REFRESH_LOG_TABLE} (
+            source_file VARCHAR(260) NOT NULL PRIMARY KEY,
+            raw_finished_at DATETIME2 NULL,   -- finished_at del manifiesto cuando se refrescó
+            raw_rows BIGINT NULL,
+            curated_rows BIGINT NULL,
+            refreshed_at DATETIME2 NOT NULL
+        );
+    END
+    """)
+
+
+def ensure_indices(cursor):
+    """
+    Índices que hacen que el refresco incremental lea solo lo necesario:
+    - raw(source_file) y curated(source_file): buscar las filas de los archivos pendientes
+    - feat(trip_date, pickup_hour, PULocationID) único: borrar/reemplazar grupos directo (y evita duplicados)
+    - parciales (trip_date, pickup_hour, PULocationID, source_file) único: sumar los archivos de un grupo
+    - parciales (source_file): borrar / listar los grupos de un archivo
+
+    Si las secciones 02/03 del .sql reconstruyen las tablas, los índices se pierden: se vuelven a crear aquí.
+    Nota: el índice en raw quita el "minimal logging" del motor bulk del cargador (ver su documentación).
+    """
+    cursor.execute(f"""
+    IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_raw_yellow_trips_source_file'
+                   AND object_id = OBJECT_ID('{RAW_TABLE}'))
+        CREATE INDEX IX_raw_yellow_trips_source_file ON {RAW_TABLE} (source_file);
+
+    IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_curated_yellow_trips_source_file'
+                   AND object_id = OBJECT_ID('{CURATED_TABLE}'))
+        CREATE INDEX IX_curated_yellow_trips_source_file ON {CURATED_TABLE} (source_file);
+
+    IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_feat_features_hour_zone'
+                   AND object_id = OBJECT_ID('{FEAT_TABLE}'))
+        CREATE UNIQUE CLUSTERED INDEX UX_feat_features_hour_zone ON {FEAT_TABLE} (trip_date, pickup_hour, PULocationID);
+
+    IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_feat_features_partials'
+                   AND object_id = OBJECT_ID('{PARTIALS_TABLE}'))
+        CREATE UNIQUE CLUSTERED INDEX UX_feat_features_partials
+        ON {PARTIALS_TABLE} (trip_date, pickup_hour, PULocationID, source_file);
+
+    IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_feat_features_partials_source_file'
+                   AND object_id = OBJECT_ID('{PARTIALS_TABLE}'))
+        CREATE INDEX IX_feat_features_partials_source_file ON {PARTIALS_TABLE} (source_file);
+    """)
+
+
+def ensure_parciales(cursor) -> bool:
+    """
+    Si feat.features_partials no existe (curated/feat construidas antes de que existiera),
+    la arma UNA vez desde toda curated. Crea (o actualiza) la vista de estadísticas.
+    Retorna True si tuvo que construir la tabla.
+    """
+    construir = not existe_tabla(cursor, PARTIALS_TABLE)
+    if construir:
+        cursor.execute(f"""
+        SELECT {COLUMNAS_PARCIALES}
+        INTO {PARTIALS_TABLE}
+        FROM {CURATED_TABLE} c
+        WHERE c.PULocationID IS NOT NULL
+        {GROUP_BY_PARCIALES};
+        """)
+    # CREATE VIEW tiene que ir solo en su lote
+    cursor.execute(VISTA_FEAT)
+    return construir
+
+
+# =====================================
+# 4) RECONSTRUCCIÓN COMPLETA (igual que el .sql)
+# =====================================
+
+def reconstruir_completo(cursor):
+    """
+    Lo mismo que las secciones 02 y 03: DROP + SELECT INTO de curated, feat y las parciales con toda
+    la historia. Se usa la primera vez (si las tablas no existen) o con --completo. Al final marca todos
+    los archivos del manifiesto como refrescados.
+    """
+    cursor.execute(f"""
+    IF OBJECT_ID('{PARTIALS_TABLE}', 'U') IS NOT NULL DROP TABLE {PARTIALS_TABLE};
+    IF OBJECT_ID('{FEAT_TABLE}', 'U') IS NOT NULL DROP TABLE {FEAT_TABLE};
+    IF OBJECT_ID('{CURATED_TABLE}', 'U') IS NOT NULL DROP TABLE {CURATED_TABLE};
+
+    SELECT {COLUMNAS_CURATED}
+    INTO {CURATED_TABLE}
+    FROM {RAW_TABLE}
+    WHERE {FILTRO_CURATED};
+
+    SELECT {COLUMNAS_FEAT}
+    INTO {FEAT_TABLE}
+    FROM {CURATED_TABLE} c
+    WHERE c.PULocationID IS NOT NULL
+    {GROUP_BY_FEAT};
+    """)
+    ensure_parciales(cursor)
+    ensure_indices(cursor)
+
+    cursor.execute(f"DELETE FROM {REFRESH_LOG_TABLE}")
+    cursor.execute(f"""
+    INSERT INTO {REFRESH_LOG_TABLE} (source_file, raw_finished_at, raw_rows, curated_rows, refreshed_at)
+    SELECT m.source_file, m.finished_at, m.row_count,
+           (SELECT COUNT_BIG(*) FROM {CURATED_TABLE} c WHERE c.source_file = m.source_file),
+           SYSDATETIME()
+    FROM {MANIFEST_TABLE} m
+    WHERE m.status = 'OK'
+    """)
+
+
+def inicializar_refresh_log(cursor) -> int:
+    """
+    Para curated/feat ya construidas con el .sql (antes de existir este script):
+    registra como refrescados los archivos OK del manifiesto que ya tienen filas en curated.
+    """
+    cursor.execute(f"""
+    INSERT INTO {REFRESH_LOG_TABLE} (source_file, raw_finished_at, raw_rows, curated_rows, refreshed_at)
+    SELECT m.source_file, m.finished_at, m.row_count, c.n, SYSDATETIME()
+    FROM {MANIFEST_TABLE} m
+    JOIN (SELECT source_file, COUNT_BIG(*) AS n FROM {CURATED_TABLE} GROUP BY source_file) c
+      ON c.source_file = m.source_file
+    WHERE m.status = 'OK'
+      AND NOT EXISTS (SELECT 1 FROM {REFRESH_LOG_TABLE} r WHERE r.source_file = m.source_file)
+    """)
+    return cursor.rowcount
+
+
+# =====================================
+# 5) REFRESCO INCREMENTAL
+# =====================================
+
+def archivos_pendientes(cursor) -> tuple:
+    """
+    Retorna (pendientes, retirados):
+    - pendientes: source_file con status OK en raw.load_manifest que no están en curated.refresh_log
+      (nuevos) o que se volvieron a cargar después del último refresco (finished_at distinto).
+    - retirados: source_file que ya se habían refrescado pero cuya carga en raw dejó de estar OK
+      (ej: se está recargando o la recarga falló). Sus filas salen de curated hasta que vuelvan a OK.
+    Los archivos LOADING / FAIL nunca se copian a curated: sus filas en raw están incompletas.
+    """
+    pendientes = cursor.execute(f"""
+    SELECT m.source_file
+    FROM {MANIFEST_TABLE} m
+    LEFT JOIN {REFRESH_LOG_TABLE} r ON r.source_file = m.source_file
+    WHERE m.status = 'OK'
+      AND (r.source_file IS NULL OR r.raw_finished_at IS NULL OR r.raw_finished_at <> m.finished_at)
+    ORDER BY m.source_file
+    """).fetchall()
+    retirados = cursor.execute(f"""
+    SELECT r.source_file
+    FROM {REFRESH_LOG_TABLE} r
+    LEFT JOIN {MANIFEST_TABLE} m ON m.source_file = r.source_file
+    WHERE m.source_file IS NULL OR m.status <> 'OK'
+    ORDER BY r.source_file
+    """).fetchall()
+    return [r[0] for r in pendientes], [r[0] for r in retirados]
+
+
+def refrescar_incremental(cursor, pendientes: list, retirados=()) -> dict:
+    """
+    Refresca curated, parciales y feat solo para los archivos pendientes (todo en la misma transacción):
+
+    1) #pendientes = los source_file a procesar (cargar = 1) y los retirados (cargar = 0)
+    2) #grupos += grupos (día, hora, zona) que esos archivos tenían en las parciales (si es recarga)
+    3) DELETE en curated y en parciales de lo viejo de esos archivos
+    4) INSERT en curated de las filas limpias desde raw (mismo WHERE de la sección 02), solo cargar = 1
+    5) INSERT en parciales de las sumas de esas filas nuevas (única lectura de viajes: solo los nuevos)
+    6) #grupos += grupos de las parciales nuevas
+    7) DELETE en feat de los grupos afectados + INSERT de esos grupos sumando las parciales de TODOS
+       los archivos del grupo (así el promedio queda igual que en una reconstrucción completa, y el
+       costo es por grupo, no por viaje)
+    8) curated.refresh_log al día
+
+    Retorna cuántas filas y grupos se tocaron.
+    """
+    cursor.execute("""
+    IF OBJECT_ID('tempdb..#pendientes') IS NOT NULL DROP TABLE #pendientes;
+    IF OBJECT_ID('tempdb..#grupos') IS NOT NULL DROP TABLE #grupos;
+    CREATE TABLE #pendientes (source_file VARCHAR(260) NOT NULL PRIMARY KEY, cargar BIT NOT NULL);
+    CREATE TABLE #grupos (trip_date DATE NOT NULL, pickup_hour INT NOT NULL, PULocationID INT NOT NULL);
+    """)
+    cursor.executemany("INSERT INTO #pendientes (source_file, cargar) VALUES (?, ?)",
+                       [(f, 1) for f in pendientes] + [(f, 0) for f in retirados])
+
+    grupos_de_parciales = f"""
+    INSERT INTO #grupos (trip_date, pickup_hour, PULocationID)
+    SELECT p.trip_date, p.pickup_hour, p.PULocationID
+    FROM {PARTIALS_TABLE} p
+    WHERE p.source_file IN (SELECT source_file FROM #pendientes)
+    """
+
+    # 2) y 3): lo viejo (solo existe si el archivo se está recargando o retirando)
+    cursor.execute(grupos_de_parciales)
+    cursor.execute(f"DELETE FROM {PARTIALS_TABLE} WHERE source_file IN (SELECT source_file FROM #pendientes)")
+    cursor.execute(f"DELETE FROM {CURATED_TABLE} WHERE source_file IN (SELECT source_file FROM #pendientes)")
+    curated_borradas = cursor.rowcount
+
+    # 4) filas nuevas, con el mismo colador de la sección 02
+    cursor.execute(f"""
+    INSERT INTO {CURATED_TABLE} ({NOMBRES_CURATED})
+    SELECT {COLUMNAS_CURATED}
+    FROM {RAW_TABLE}
+    WHERE source_file IN (SELECT source_file FROM #pendientes WHERE cargar = 1)
+      AND {FILTRO_CURATED}
+    """)
+    curated_insertadas = cursor.rowcount
+
+    # 5) sumas parciales de las filas nuevas (índice en curated(source_file): no se recorre toda curated)
+    cursor.execute(f"""
+    INSERT INTO {PARTIALS_TABLE} ({NOMBRES_PARCIALES})
+    SELECT {COLUMNAS_PARCIALES}
+    FROM {CURATED_TABLE} c
+    WHERE c.source_file IN (SELECT source_file FROM #pendientes WHERE cargar = 1)
+      AND c.PULocationID IS NOT NULL
+    {GROUP_BY_PARCIALES}
+    """)
+    parciales_insertadas = cursor.rowcount
+
+    # 6) grupos de las parciales nuevas (y dejamos una sola fila por grupo)
+    cursor.execute(grupos_de_parciales)
+    cursor.execute("""
+    WITH d AS (
+        SELECT ROW_NUMBER() OVER (PARTITION BY trip_date, pickup_hour, PULocationID ORDER BY trip_date) AS rn
+        FROM #grupos
+    )
+    DELETE FROM d WHERE rn > 1;
+    CREATE UNIQUE CLUSTERED INDEX UX_grupos ON #grupos (trip_date, pickup_hour, PULocationID);
+    """)
+
+    # 7) feat: fuera los grupos afectados, adentro recalculados desde las parciales
+    # (índice único de parciales empieza por la llave del grupo: cada grupo es una búsqueda directa)
+    cursor.execute(f"""
+    DELETE f
+    FROM {FEAT_TABLE} f
+    JOIN #grupos g
+      ON g.trip_date = f.trip_date AND g.pickup_hour = f.pickup_hour AND g.PULocationID = f.PULocationID
+    """)
+    feat_borradas = cursor.rowcount
+
+    cursor.execute(f"""
+    INSERT INTO {FEAT_TABLE} (trip_date, pickup_hour, PULocationID, trips_count,
+                              avg_trip_distance, avg_trip_duration_min, avg_total_amount)
+    SELECT {COLUMNAS_FEAT_DESDE_PARCIALES}
+    FROM #grupos g
+    JOIN {PARTIALS_TABLE} p
+      ON p.trip_date = g.trip_date AND p.pickup_hour = g.pickup_hour AND p.PULocationID = g.PULocationID
+    GROUP BY p.trip_date, p.pickup_hour, p.PULocationID
+    """)
+    feat_insertadas = cursor.rowcount
+    grupos = cursor.execute("SELECT COUNT(*) FROM #grupos").fetchone()[0]
+
+    # 8) bitácora de refresco
+    cursor.execute(f"""
+    DELETE FROM {REFRESH_LOG_TABLE} WHERE source_file IN (SELECT source_file FROM #pendientes);
+
+    INSERT INTO {REFRESH_LOG_TABLE} (source_file, raw_finished_at, raw_rows, curated_rows, refreshed_at)
+    SELECT m.source_file, m.finished_at, m.row_count,
+           (SELECT COUNT_BIG(*) FROM {CURATED_TABLE} c WHERE c.source_file = m.source_file),
+           SYSDATETIME()
+    FROM {MANIFEST_TABLE} m
+    WHERE m.source_file IN (SELECT source_file FROM #pendientes WHERE cargar = 1);
+
+    DROP TABLE #pendientes;
+    DROP TABLE #grupos;
+    """)
+
+    return {
+        "curated_borradas": curated_borradas,
+        "curated_insertadas": curated_insertadas,
+        "parciales_insertadas": parciales_insertadas,
+        "grupos": grupos,
+        "feat_borradas": feat_borradas,
+        "feat_insertadas": feat_insertadas,
+    }
+
+
+# =====================================
+# 6) VERIFICACIÓN CONTRA UNA RECONSTRUCCIÓN COMPLETA
+# =====================================
+
+def verificar_contra_completo(cursor, tolerancia=TOLERANCIA) -> dict:
+    """
+    Reconstruye curated y feat desde cero en tablas temporales (igual que las secciones 02 y 03)
+    y las compara con las tablas incrementales:
+    - curated: mismas filas por source_file
+    - parciales: mismo conteo de viajes por source_file
+    - feat y la vista de estadísticas: mismos grupos, mismo trips_count y promedios iguales
+      (con tolerancia para FLOAT)
+
+    Es una lectura completa de raw: úsala para validar, no en cada corrida.
+    Retorna {"curated": [(source_file, completo, incremental)...], "parciales": [...],
+             "feat": n_grupos_distintos, "vista": n_grupos_distintos, ...}.
+    """
+    cursor.execute(f"""
+    IF OBJECT_ID('tempdb..#curated_full') IS NOT NULL DROP TABLE #curated_full;
+    IF OBJECT_ID('tempdb..#feat_full') IS NOT NULL DROP TABLE #feat_full;
+
+    SELECT {COLUMNAS_CURATED}
+    INTO #curated_full
+    FROM {RAW_TABLE}
+    WHERE {FILTRO_CURATED};
+
+    SELECT {COLUMNAS_FEAT}
+    INTO #feat_full
+    FROM #curated_full c
+    WHERE c.PULocationID IS NOT NULL
+    {GROUP_BY_FEAT};
+    """)
+
+    curated = cursor.execute(f"""
+    SELECT COALESCE(a.source_file, b.source_file), COALESCE(a.n, 0), COALESCE(b.n, 0)
+    FROM (SELECT source_file, COUNT_BIG(*) AS n FROM #curated_full GROUP BY source_file) a
+    FULL OUTER JOIN (SELECT source_file, COUNT_BIG(*) AS n FROM {CURATED_TABLE} GROUP BY source_file) b
+      ON a.source_file = b.source_file
+    WHERE COALESCE(a.n, 0) <> COALESCE(b.n, 0)
+    """).fetchall()
+
+    parciales = cursor.execute(f"""
+    SELECT COALESCE(a.source_file, b.source_file), COALESCE(a.n, 0), COALESCE(b.n, 0)
+    FROM (SELECT source_file, COUNT_BIG(*) AS n FROM #curated_full
+          WHERE PULocationID IS NOT NULL GROUP BY source_file) a
+    FULL OUTER JOIN (SELECT source_file, SUM(trips_count) AS n FROM {PARTIALS_TABLE} GROUP BY source_file) b
+      ON a.source_file = b.source_file
+    WHERE COALESCE(a.n, 0) <> COALESCE(b.n, 0)
+    """).fetchall()
+
+    def comparar_feat(destino: str) -> tuple:
+        return tuple(cursor.execute(f"""
+        SELECT
+          SUM(CASE WHEN a.trip_date IS NULL OR b.trip_date IS NULL
+                     OR a.trips_count <> b.trips_count
+                     OR ABS(a.avg_trip_distance - b.avg_trip_distance) > ?
+                     OR ABS(a.avg_trip_duration_min - b.avg_trip_duration_min) > ?
+                     OR ABS(a.avg_total_amount - b.avg_total_amount) > ?
+                   THEN 1 ELSE 0 END),
+          SUM(CASE WHEN a.trip_date IS NOT NULL THEN 1 ELSE 0 END),
+          SUM(CASE WHEN b.trip_date IS NOT NULL THEN 1 ELSE 0 END)
+        FROM #feat_full a
+        FULL OUTER JOIN {destino} b
+          ON a.trip_date = b.trip_date AND a.pickup_hour = b.pickup_hour AND a.PULocationID = b.PULocationID
+        """, tolerancia, tolerancia, tolerancia).fetchone())
+
+    feat_distintos, feat_full, feat_inc = comparar_feat(FEAT_TABLE)
+    vista_distintos, _, _ = comparar_feat(STATS_VIEW)
+
+    cursor.execute("DROP TABLE #curated_full; DROP TABLE #feat_full;")
+    return {"curated": [tuple(r) for r in curated], "parciales": [tuple(r) for r in parciales],
+            "feat": feat_distintos or 0, "vista": vista_distintos or 0,
+            "feat_completo": feat_full or 0, "feat_incremental": feat_inc or 0}
+
+
+# =========================
+# 7) PROGRAMA PRINCIPAL
+# =========================
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Refresco incremental de curated.yellow_trips, feat.features_partials "
+                                                 "y feat.features_hour_zone.")
+    parser.add_argument("--completo", action="store_true",
+                        help="Reconstruir todo desde cero (igual que las secciones 02 y 03 del .sql)")
+    parser.add_argument("--inicializar", action="store_true",
+                        help="Registrar como refrescados los archivos que ya están en curated "
+                             "(curated/feat construidas antes con el .sql)")
+    parser.add_argument("--verificar", action="store_true",
+                        help="Comparar curated/feat contra una reconstrucción completa (lee todo raw)")
+    parser.add_argument("--conn-str", default=None,
+                        help="Cadena de conexión ODBC completa (por defecto se arma con SERVER/DB/USER/PWD)")
+    return parser.parse_args()
+
+
+def main():
+    """
+    1) Asegura refresh_log (y manifiesto)
+    2) Si curated o feat no existen (o --completo): reconstrucción completa
+       Si no: refresco incremental de los archivos pendientes
+    3) --verificar: compara con una reconstrucción completa
+    """
+    args = parse_args()
+    conn = cargador.conectar(args.conn_str)
+    cur = conn.cursor()
+
+    cargador.ensure_manifest(cur)
+    ensure_refresh_log(cur)
+    conn.commit()
+
+    t0 = time.perf_counter()
+    if args.completo or not existe_tabla(cur, CURATED_TABLE) or not existe_tabla(cur, FEAT_TABLE):
+        logger.info("Reconstrucción completa de curated y feat (DROP + SELECT INTO)...")
+        reconstruir_completo(cur)
+        conn.commit()
+        logger.info(f"Listo: reconstrucción completa en {time.perf_counter() - t0:.1f}s")
+    else:
+        if ensure_parciales(cur):
+            logger.info(f"{PARTIALS_TABLE} no existía: se construyó una vez desde {CURATED_TABLE}")
+        ensure_indices(cur)
+        conn.commit()
+
+        if args.inicializar:
+            n = inicializar_refresh_log(cur)
+            conn.commit()
+            logger.info(f"refresh_log inicializado: {n} source_file(s) ya presentes en curated")
+
+        pendientes, retirados = archivos_pendientes(cur)
+        if not pendientes and not retirados:
+            logger.info("Nada que refrescar: curated y feat ya están al día con raw.load_manifest")
+        else:
+            if pendientes:
+                logger.info(f"Refrescando {len(pendientes)} archivo(s): {', '.join(pendientes)}")
+            if retirados:
+                logger.info(f"Retirando de curated {len(retirados)} archivo(s) que ya no están OK en raw: "
+                            f"{', '.join(retirados)}")
+            try:
+                r = refrescar_incremental(cur, pendientes, retirados)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            logger.info(f"Listo en {time.perf_counter() - t0:.1f}s | curated: -{r['curated_borradas']:,} "
+                        f"+{r['curated_insertadas']:,} filas | parciales: +{r['parciales_insertadas']:,} | "
+                        f"feat: {r['grupos']:,} grupos afectados "
+                        f"(-{r['feat_borradas']:,} +{r['feat_insertadas']:,})")
+
+    if args.verificar:
+        t = time.perf_counter()
+        v = verificar_contra_completo(cur)
+        conn.rollback()  # solo se crearon tablas temporales
+        for source_file, completo, incremental in v["curated"]:
+            logger.error(f"curated descuadrado -> {source_file}: completo {completo:,} vs incremental {incremental:,}")
+        for source_file, completo, incremental in v["parciales"]:
+            logger.error(f"parciales descuadradas -> {source_file}: completo {completo:,} vs parciales {incremental:,}")
+        if v["feat"]:
+            logger.error(f"feat: {v['feat']:,} grupo(s) distintos (completo {v['feat_completo']:,} "
+                         f"vs incremental {v['feat_incremental']:,})")
+        if v["vista"]:
+            logger.error(f"{STATS_VIEW}: {v['vista']:,} grupo(s) distintos a una reconstrucción completa")
+        if not v["curated"] and not v["parciales"] and not v["feat"] and not v["vista"]:
+            logger.info(f"Verificación OK ({time.perf_counter() - t:.1f}s): curated, parciales y feat iguales a una "
+                        f"reconstrucción completa ({v['feat_completo']:,} grupos)")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+SCRIPT / MÓDULO: Registro de corridas (modelo, set de test, métricas) en SQLite
+
+¿Para qué sirve?
+- Antes, el modelo, el set de test y los resultados quedaban en rutas fijas (artifacts/linreg_trips_count_v2.joblib,
+  artifacts/X_test_v2/, ...): cada entrenamiento pisaba el anterior. metrics_summary.txt es un texto que solo
+  crece: comparar corridas era buscar líneas a mano.
+- Aquí cada entrenamiento es una CORRIDA con su id (run_id) y queda en artifacts/registro.sqlite:
+  - huella de las features (versión de la fuente: filas + checksum en SQL Server / archivos en parquet)
+  - parámetros (fuente, fechas, pesos, columnas, split)
+  - tiempos por paso
+  - carpetas de sus artefactos (modelo, set de test, resultados de validate_model.py)
+  - métricas de validate_model.py (una fila por métrica: se comparan con SQL o con `python registro.py`)
+
+Artefactos por contenido (sin duplicar):
+- Cada carpeta de artefactos (modelo / test / resultados) se guarda en artifacts/objetos/<tipo>/<hash>, donde
+  <hash> es el sha256 de sus archivos. Si dos corridas producen el mismo set de test (mismas filas y split),
+  la carpeta ya existe y no se vuelve a escribir: las dos corridas apuntan a la misma.
+
+Corridas sin cambios:
+- "huella de entradas" = huella de las features + parámetros. Si ya hay una corrida con la misma huella,
+  train_model.py / ols_streaming.py no entrenan (--forzar para entrenar igual). validate_model.py no vuelve
+  a validar una corrida ya validada (sus artefactos no cambian).
+
+Uso:
+- python registro.py                 -> tabla de corridas con sus métricas principales
+- python registro.py --run-id ID     -> detalle de una corrida (parámetros, tiempos, artefactos, métricas)
+  (ID puede ser el comienzo del run_id, si no es ambiguo)
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+# ============================================================
+# 1) CONFIGURACIÓN
+# ============================================================
+
+ARTIFACTS = Path("artifacts")
+REGISTRO = ARTIFACTS / "registro.sqlite"
+OBJETOS = ARTIFACTS / "objetos"
+
+# Archivos que no entran al hash de una carpeta (el manifest tiene fechas: cambiaría en cada corrida)
+SIN_HASH = {"manifest_v2.json"}
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS corridas (
+    run_id          TEXT PRIMARY KEY,
+    creada          TEXT NOT NULL,
+    script          TEXT NOT NULL,
+    huella_features TEXT NOT NULL,
+    huella_entradas TEXT NOT NULL,
+    params          TEXT NOT NULL,   -- JSON
+    tiempos         TEXT NOT NULL,   -- JSON: segundos por paso
+    modelo          TEXT NOT NULL,   -- carpetas relativas a artifacts/
+    test            TEXT,            -- NULL: corrida sin set de test (ols_streaming.py, ver "nota" en params)
+    resultados      TEXT,            -- NULL: todavía sin validar
+    validada        TEXT
+);
+CREATE INDEX IF NOT EXISTS corridas_huella_entradas ON corridas (huella_entradas);
+CREATE TABLE IF NOT EXISTS metricas (
+    run_id TEXT NOT NULL REFERENCES corridas (run_id),
+    nombre TEXT NOT NULL,
+    valor  REAL,
+    PRIMARY KEY (run_id, nombre)
+);
+"""
+
+
+def conectar() -> sqlite3.Connection:
+    ARTIFACTS.mkdir(exist_ok=True)
+    conn = sqlite3.connect(REGISTRO)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(ESQUEMA)
+    return conn
+
+
+def huella(*partes) -> str:
+    """sha256 (16 caracteres) de cualquier cosa que se pueda pasar a JSON."""
+    texto = json.dumps(partes, sort_keys=True, default=str)
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()[:16]
+
+
+def huella_entradas(huella_features: str, params: dict) -> str:
+    return huella(huella_features, params)
+
+
+# ============================================================
+# 2) ARTEFACTOS POR CONTENIDO
+# ============================================================
+
+def carpeta_temporal() -> Path:
+    """Carpeta donde escribir los artefactos antes de guardarlos (mismo disco que objetos/: se mueven, no se copian)."""
+    carpeta = OBJETOS / "tmp" / uuid.uuid4().hex
+    carpeta.mkdir(parents=True)
+    return carpeta
+
+
+def huella_carpeta(carpeta: Path) -> str:
+    """sha256 de los archivos de una carpeta (ruta relativa + contenido), en orden."""
+    h = hashlib.sha256()
+    for path in sorted(p for p in Path(carpeta).rglob("*") if p.is_file() and p.name not in SIN_HASH):
+        h.update(path.relative_to(carpeta).as_posix().encode("utf-8") + b"\0")
+        with open(path, "rb") as f:
+            for bloque in iter(lambda: f.read(1 << 20), b""):
+                h.update(bloque)
+    return h.hexdigest()
+
+
+def guardar_objeto(carpeta: Path, tipo: str) -> str:
+    """
+    Mueve `carpeta` a objetos/<tipo>/<hash>. Si ya existe (mismo contenido), no se escribe de nuevo:
+    se borra la carpeta temporal. Retorna la ruta relativa a artifacts/ (lo que se guarda en el registro).
+    """
+    destino = OBJETOS / tipo / huella_carpeta(carpeta)
+    if destino.exists():
+        shutil.rmtree(carpeta)
+    else:
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(carpeta, destino)
+    return destino.relative_to(ARTIFACTS).as_posix()
+
+
+def quitar_temporal(carpeta: Path):
+    """Borra la carpeta de carpeta_temporal() que contenía `carpeta` (si ya quedó vacía)."""
+    try:
+        Path(carpeta).parent.rmdir()
+    except OSError:
+        pass
+
+
+# ============================================================
+# 3) CORRIDAS
+# ============================================================
+
+def buscar_corrida(entradas: str):
+    """La última corrida con esa huella de entradas (None si no hay)."""
+    with conectar() as conn:
+        fila = conn.execute("SELECT run_id FROM corridas WHERE huella_entradas = ? "
+                            "ORDER BY creada DESC, rowid DESC LIMIT 1", (entradas,)).fetchone()
+    return fila["run_id"] if fila else None
+
+
+def registrar_corrida(script: str, huella_features: str, params: dict, tiempos: dict, modelo: Path, test=None,
+                      extras=None) -> str:
+    """
+    Guarda los artefactos (carpetas temporales de `modelo` y `test`) por contenido y agrega la corrida.
+    extras: dict que queda en params pero NO entra en la huella: cómo se llegó al modelo, no qué modelo es
+    (ej: {"modo": "incremental", "nota": "por qué no tiene set de test"}).
+    Retorna el run_id (fecha y hora + 6 caracteres al azar).
+    """
+    t0 = time.perf_counter()
+    entradas = huella_entradas(huella_features, params)
+    params = {**params, **{k: v for k, v in (extras or {}).items() if v is not None}}
+    rel_modelo = guardar_objeto(modelo, "modelo")
+    rel_test = guardar_objeto(test, "test") if test else None
+    tiempos = {**tiempos, "registrar": time.perf_counter() - t0}
+
+    creada = datetime.now().isoformat(timespec="seconds")
+    run_id = f"{creada.replace('-', '').replace(':', '').replace('T', '-')}-{uuid.uuid4().hex[:6]}"
+    with conectar() as conn:
+        conn.execute(
+            "INSERT INTO corridas (run_id, creada, script, huella_features, huella_entradas, params, tiempos, "
+            "modelo, test) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (run_id, creada, script, huella_features, entradas, json.dumps(params, default=str),
+             json.dumps(tiempos), rel_modelo, rel_test),
+        )
+    quitar_temporal(modelo)
+    return run_id
+
+
+def obtener_corrida(run_id=None):
+    """
+    La corrida `run_id` (o la única que empieza así) como dict; sin run_id, la última.
+    None si el registro está vacío.
+    """
+    with conectar() as conn:
+        if run_id is None:
+            filas = conn.execute("SELECT * FROM corridas ORDER BY creada DESC, rowid DESC LIMIT 1").fetchall()
+        else:
+            filas = conn.execute("SELECT * FROM corridas WHERE run_id LIKE ? || '%'", (run_id,)).fetchall()
+            if not filas:
+                raise SystemExit(f"No hay corridas con run_id {run_id} (ver: python registro.py)")
+            if len(filas) > 1:
+                raise SystemExit(f"run_id {run_id} es ambiguo: " + ", ".join(f["run_id"] for f in filas))
+        if not filas:
+            return None
+        corrida = dict(filas[0])
+        corrida["params"] = json.loads(corrida["params"])
+        corrida["tiempos"] = json.loads(corrida["tiempos"])
+        corrida["metricas"] = {f["nombre"]: f["valor"] for f in conn.execute(
+            "SELECT nombre, valor FROM metricas WHERE run_id = ? ORDER BY nombre", (corrida["run_id"],))}
+    return corrida
+
+
+def carpetas(run_id=None) -> dict:
+    """
+    Carpetas de artefactos de una corrida: {"run_id", "modelo", "test", "resultados"} (None si no tiene),
+    más la "nota" de la corrida (None si no tiene).
+    Si el registro está vacío (artefactos de antes del registro), todas son artifacts/.
+    """
+    corrida = obtener_corrida(run_id)
+    if corrida is None:
+        return {"run_id": None, "modelo": ARTIFACTS, "test": ARTIFACTS, "resultados": ARTIFACTS, "nota": None}
+    return {"run_id": corrida["run_id"],
+            **{k: ARTIFACTS / corrida[k] if corrida[k] else None for k in ["modelo", "test", "resultados"]},
+            "nota": (corrida["params"] or {}).get("nota")}
+
+
+def registrar_validacion(run_id: str, metricas: dict, resultados: Path, segundos: float) -> Path:
+    """
+    Métricas de validate_model.py (una fila por métrica) y la carpeta de resultados por fila.
+    Retorna la carpeta donde quedaron los resultados.
+    """
+    rel = guardar_objeto(resultados, "resultados")
+    with conectar() as conn:
+        tiempos = json.loads(conn.execute("SELECT tiempos FROM corridas WHERE run_id = ?", (run_id,)).fetchone()[0])
+        tiempos["validar"] = segundos
+        conn.execute("UPDATE corridas SET resultados = ?, validada = ?, tiempos = ? WHERE run_id = ?",
+                     (rel, datetime.now().isoformat(timespec="seconds"), json.dumps(tiempos), run_id))
+        conn.execute("DELETE FROM metricas WHERE run_id = ?", (run_id,))
+        conn.executemany("INSERT INTO metricas (run_id, nombre, valor) VALUES (?, ?, ?)",
+                         [(run_id, k, float(v)) for k, v in metricas.items()])
+    quitar_temporal(resultados)
+    return ARTIFACTS / rel
+
+
+def listar() -> pd.DataFrame:
+    """Una fila por corrida con sus métricas principales (las que tenga)."""
+    with conectar() as conn:
+        return pd.read_sql_query("""
+        SELECT c.run_id, c.script, c.huella_features,
+               MAX(CASE WHEN m.nombre = 'mae' THEN m.valor END)  AS mae,
+               MAX(CASE WHEN m.nombre = 'rmse' THEN m.valor END) AS rmse,
+               MAX(CASE WHEN m.nombre = 'r2' THEN m.valor END)   AS r2,
+               MAX(CASE WHEN m.nombre = 'improve_mae_pct' THEN m.valor END) AS improve_mae_pct,
+               c.test, c.validada
+        FROM corridas c LEFT JOIN metricas m ON m.run_id = c.run_id
+        GROUP BY c.run_id
+        ORDER BY c.creada, c.rowid
+        """, conn)
+
+
+# ============================================================
+# 4) PROGRAMA PRINCIPAL
+# ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Registro de corridas (artifacts/registro.sqlite).")
+    parser.add_argument("--run-id", default=None, help="Detalle de una corrida (o el comienzo de su run_id)")
+    args = parser.parse_args()
+    if args.run_id:
+        print(json.dumps(obtener_corrida(args.run_id), indent=2, ensure_ascii=False))
+        return
+    tabla = listar()
+    if tabla.empty:
+        print("Registro vacío: corre train_model.py (u ols_streaming.py)")
+        return
+    # Solo el comienzo del hash del set de test (alcanza para ver qué corridas comparten el mismo test)
+    tabla["test"] = tabla["test"].str.rsplit("/", n=1).str[-1].str[:12]
+    with pd.option_context("display.width", 200, "display.max_rows", None, "display.float_format", "{:.3f}".format):
+        print(tabla.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
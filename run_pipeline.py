@@ -0,0 +1,516 @@
+"""
+SCRIPT: Orquestador del pipeline completo (descarga -> carga -> curated -> feat -> entrenamiento -> validación)
+
+¿Para qué sirve?
+- El pipeline SQL es un script manual ("selecciona una sección ... y presiona F5") y los scripts de Python
+  se corren uno por uno. No queda registro de cuánto tardó cada etapa ni se puede reintentar.
+- Este script corre TODO con un solo comando:
+  1) lee queries/sqlserver_pipeline_by_sections.sql, lo parte por SECCIÓN y por lotes GO
+  2) corre cada paso en orden de dependencias (los pasos independientes, en paralelo)
+  3) guarda duración, filas y estado de cada paso en ml.pipeline_runs
+  4) SALTA los pasos cuyas entradas no cambiaron desde su última corrida OK
+
+Pasos (y de qué dependen):
+    schemas (SQL 00) ─┐
+    download ─────────┴─> load ─> curated (SQL 02) ─> feat (SQL 03) ─┬─> train ─> validate
+                                                                     └─> checks (SQL 05)
+  Con --incremental, curated + feat se reemplazan por un solo paso "capas" (refresh_layers.py).
+
+¿Cómo sabe si las entradas cambiaron? (huella / fingerprint)
+- Cada paso calcula un SHA-256 de: su código (el SQL de la sección o el archivo .py) + sus entradas
+  externas (ej: entrada.txt, la lista de parquets, raw.load_manifest) + las huellas de los pasos de
+  los que depende. Si la huella es igual a la de su última corrida OK, el paso se salta.
+- Como la huella incluye la de los pasos anteriores, si algo cambia arriba, todo lo de abajo se vuelve a correr.
+
+Requisitos:
+- Python con pyodbc (usa la conexión de load_parquet_to_sqlserver.py)
+- El schema ml lo crea el paso "schemas" (sección 00 del .sql); como ml.pipeline_runs se crea antes
+  de correr ningún paso, ensure_runs_table también lo crea si falta (base nueva)
+"""
+
+import argparse
+import hashlib
+import logging
+import queue
+import re
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import load_parquet_to_sqlserver as cargador
+
+# ============================================================
+# 1) CONFIGURACIÓN
+# ============================================================
+
+BASE_DIR = Path(__file__).resolve().parent
+SQL_PIPELINE = BASE_DIR / "queries" / "sqlserver_pipeline_by_sections.sql"
+RUNS_TABLE = "ml.pipeline_runs"
+
+# Reintentos por paso (ej: un timeout de red o un deadlock) y espera entre intentos (se duplica cada vez)
+REINTENTOS = 1
+ESPERA_REINTENTO_SEG = 10
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(levelname)s | %(message)s"
+)
+logger = logging.getLogger("pipeline-runner")
+
+
+# =====================================
+# 2) LEER EL .SQL POR SECCIONES Y LOTES GO
+# =====================================
+
+def leer_secciones(ruta_sql: Path) -> dict:
+    """
+    Parte el script SQL en {numero_seccion: [lote1, lote2, ...]}.
+
+    - Una sección empieza en la línea "-- SECCIÓN XX) ..." y termina donde empieza la siguiente.
+    - Dentro de cada sección, los lotes se separan con líneas "GO" (igual que en SSMS:
+      GO no es SQL, es una señal para el cliente de "manda hasta aquí").
+    - Los lotes vacíos o que solo tienen comentarios se descartan.
+    """
+    texto = ruta_sql.read_text(encoding="utf-8-sig")
+    partes = re.split(r"^--\s*SECCI[ÓO]N\s+(\d+)\).*$", texto, flags=re.MULTILINE)
+    # partes = [preámbulo, "00", cuerpo00, "01", cuerpo01, ...]
+    secciones = {}
+    for numero, cuerpo in zip(partes[1::2], partes[2::2]):
+        lotes = []
+        for lote in re.split(r"^\s*GO\s*$", cuerpo, flags=re.MULTILINE):
+            sin_comentarios = re.sub(r"--.*$", "", lote, flags=re.MULTILINE).strip()
+            if sin_comentarios:
+                lotes.append(lote.strip())
+        secciones[numero] = lotes
+    return secciones
+
+
+def ejecutar_lote(cursor, sql: str) -> int:
+    """
+    Ejecuta un lote y recorre todos sus resultados (los SELECT TOP 5 de "antes/después" también
+    devuelven filas: hay que pasarlas para que el lote termine). Retorna la suma de filas afectadas
+    por INSERT/UPDATE/DELETE/SELECT INTO del lote.
+    """
+    cursor.execute(sql)
+    filas = 0
+    while True:
+        if cursor.description is None and cursor.rowcount and cursor.rowcount > 0:
+            filas += cursor.rowcount
+        if not cursor.nextset():
+            break
+    return filas
+
+
+# =====================================
+# 3) POOL DE CONEXIONES
+# =====================================
+
+class PoolConexiones:
+    """
+    Unas pocas conexiones abiertas que los pasos SQL se van prestando (abrir una conexión por
+    paso es lento, y dos pasos en paralelo no pueden compartir la misma).
+    """
+
+    def __init__(self, tamano: int, conn_str=None):
+        self._libres = queue.Queue()
+        self._todas = []
+        for _ in range(tamano):
+            conn = cargador.conectar(conn_str)
+            self._todas.append(conn)
+            self._libres.put(conn)
+
+    @contextmanager
+    def conexion(self):
+        conn = self._libres.get()
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._libres.put(conn)
+
+    def cerrar(self):
+        for conn in self._todas:
+            conn.close()
+
+
+# =====================================
+# 4) PASOS DEL PIPELINE
+# =====================================
+
+class Paso:
+    """
+    Un paso del pipeline.
+
+    - nombre: identificador (se guarda en ml.pipeline_runs)
+    - depende: nombres de los pasos que deben terminar antes
+    - seccion: número de sección del .sql (paso SQL) ...
+    - script / args: ... o script de Python a correr (en un proceso aparte)
+    - tabla: tabla de salida para registrar su conteo de filas al terminar (opcional)
+    - entradas: función (pool) -> texto con las entradas externas del paso, para la huella (opcional)
+    - siempre: correrlo aunque su huella no cambie (ej: la descarga, para ver si algún mes fue republicado)
+    """
+
+    def __init__(self, nombre, depende=(), seccion=None, script=None, args=(), tabla=None, entradas=None,
+                 siempre=False):
+        self.nombre = nombre
+        self.depende = list(depende)
+        self.seccion = seccion
+        self.script = script
+        self.args = list(args)
+        self.tabla = tabla
+        self.entradas = entradas
+        self.siempre = siempre
+
+    def codigo(self, secciones: dict) -> str:
+        """El "código" del paso para la huella: el SQL de la sección o el contenido del .py."""
+        if self.seccion is not None:
+            return "\nGO\n".join(secciones[self.seccion])
+        return (BASE_DIR / self.script).read_text(encoding="utf-8") + " ".join(self.args)
+
+
+def _hash(*partes) -> str:
+    h = hashlib.sha256()
+    for p in partes:
+        h.update(str(p).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def entradas_download(pool) -> str:
+    """
+    La descarga depende de qué meses pide entrada.txt.
+    (Igual corre siempre, ver construir_pasos: esta huella solo decide si los pasos de abajo cambian.)
+    """
+    ruta = BASE_DIR / "entrada.txt"
+    return ruta.read_text(encoding="utf-8") if ruta.exists() else ""
+
+
+def entradas_load(pool) -> str:
+    """La carga depende de los .parquet que hay en la carpeta (nombre, tamaño y fecha)."""
+    if not cargador.PARQUET_DIR.exists():
+        return ""
+    return "\n".join(f"{f.name}|{f.stat().st_size}|{f.stat().st_mtime_ns}"
+                     for f in sorted(cargador.PARQUET_DIR.glob("*.parquet")))
+
+
+def entradas_raw(pool) -> str:
+    """
+    Lo que hay en raw, resumido con el manifiesto de carga (barato: una fila por archivo).
+    Así también se detectan meses cargados por stream_to_sqlserver.py, no solo por este pipeline.
+    """
+    with pool.conexion() as conn:
+        cur = conn.cursor()
+        if cur.execute("SELECT OBJECT_ID(?, 'U')", cargador.MANIFEST_TABLE).fetchone()[0] is None:
+            return ""
+        filas = cur.execute(f"""
+        SELECT source_file, status, row_count, finished_at
+        FROM {cargador.MANIFEST_TABLE}
+        ORDER BY source_file
+        """).fetchall()
+        conn.commit()
+    return "\n".join("|".join(str(v) for v in f) for f in filas)
+
+
+def construir_pasos(incremental=False) -> list:
+    """Lista de pasos en orden de dependencias."""
+    pasos = [
+        Paso("schemas", seccion="00"),
+        # Siempre corre: un mes ya bajado puede haber sido republicado en el servidor, y eso no cambia
+        # entrada.txt. Sus GET son condicionales (lo que no cambió no se baja) y, si bajó algo, la
+        # huella de "load" (lista de parquets con tamaño y fecha) cambia sola.
+        Paso("download", script="import_data_vf.py", entradas=entradas_download, siempre=True),
+        Paso("load", depende=["schemas", "download"], script="load_parquet_to_sqlserver.py",
+             tabla=cargador.TABLE, entradas=entradas_load),
+    ]
+    if incremental:
+        pasos.append(Paso("capas", depende=["load"], script="refresh_layers.py",
+                          tabla="feat.features_hour_zone", entradas=entradas_raw))
+        ultimo = "capas"
+    else:
+        pasos += [
+            Paso("curated", depende=["load"], seccion="02", tabla="curated.yellow_trips", entradas=entradas_raw),
+            Paso("feat", depende=["curated"], seccion="03", tabla="feat.features_hour_zone"),
+        ]
+        ultimo = "feat"
+    pasos += [
+        Paso("checks", depende=[ultimo], seccion="05"),
+        Paso("train", depende=[ultimo], script="train_model.py"),
+        Paso("validate", depende=["train"], script="validate_model.py"),
+    ]
+    return pasos
+
+
+# =====================================
+# 5) REGISTRO DE CORRIDAS (ml.pipeline_runs)
+# =====================================
+
+def ensure_runs_table(cursor):
+    """
+    Crea ml.pipeline_runs si no existe: una fila por paso y corrida.
+    Corre antes del paso "schemas": en una base nueva el schema ml todavía no existe, así que se crea aquí.
+    """
+    cursor.execute("IF SCHEMA_ID('ml') IS NULL EXEC('CREATE SCHEMA ml')")
+    cursor.execute(f"""
+    IF OBJECT_ID('{RUNS_TABLE}', 'U') IS NULL
+    BEGIN
+        CREATE TABLE {RUNS_TABLE} (
+            run_id CHAR(36) NOT NULL,
+            step VARCHAR(50) NOT NULL,
+            status VARCHAR(10) NOT NULL,          -- OK / FAIL / SKIP / BLOCKED
+            attempts INT NULL,
+            started_at DATETIME2 NULL,
+            finished_at DATETIME2 NULL,
+            duration_sec FLOAT NULL,
+            rows_affected BIGINT NULL,            -- filas tocadas por el paso (pasos SQL)
+            output_rows BIGINT NULL,              -- filas de la tabla de salida al terminar
+            input_fingerprint CHAR(64) NULL,
+            detail NVARCHAR(4000) NULL,
+            PRIMARY KEY (run_id, step)
+        );
+    END
+    """)
+
+
+def ultima_huella_ok(cursor, paso: str):
+    row = cursor.execute(f"""
+    SELECT TOP 1 input_fingerprint
+    FROM {RUNS_TABLE}
+    WHERE step = ? AND status IN ('OK', 'SKIP')
+    ORDER BY finished_at DESC
+    """, paso).fetchone()
+    return row[0] if row else None
+
+
+def registrar_paso(pool, run_id: str, r: dict):
+    with pool.conexion() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+        INSERT INTO {RUNS_TABLE} (run_id, step, status, attempts, started_at, finished_at, duration_sec,
+                                  rows_affected, output_rows, input_fingerprint, detail)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, run_id, r["paso"], r["status"], r.get("intentos"), r.get("inicio"), r.get("fin"),
+            r.get("segundos"), r.get("filas"), r.get("filas_salida"), r.get("huella"),
+            (r.get("detalle") or "")[:4000] or None)
+        conn.commit()
+
+
+# =====================================
+# 6) CORRER UN PASO
+# =====================================
+
+def correr_sql(pool, lotes: list) -> int:
+    """
+    Corre los lotes de una sección en una conexión del pool, con autocommit (igual que SSMS:
+    cada lote se confirma al terminar; además CREATE DATABASE no se permite dentro de una transacción).
+    """
+    filas = 0
+    with pool.conexion() as conn:
+        conn.autocommit = True
+        try:
+            cur = conn.cursor()
+            for lote in lotes:
+                filas += ejecutar_lote(cur, lote)
+        finally:
+            conn.autocommit = False
+    return filas
+
+
+def correr_script(paso: Paso):
+    """Corre un script de Python del repo en un proceso aparte (su salida se ve en la consola)."""
+    r = subprocess.run([sys.executable, str(BASE_DIR / paso.script), *paso.args], cwd=BASE_DIR)
+    if r.returncode != 0:
+        raise RuntimeError(f"{paso.script} terminó con código {r.returncode}")
+
+
+def contar_filas(pool, tabla: str):
+    with pool.conexion() as conn:
+        n = conn.cursor().execute(f"SELECT COUNT_BIG(*) FROM {tabla}").fetchone()[0]
+        conn.commit()
+    return n
+
+
+def correr_paso(pool, paso: Paso, secciones: dict, huella: str, reintentos=REINTENTOS) -> dict:
+    """Corre un paso con reintentos. Retorna lo que se registra en ml.pipeline_runs."""
+    inicio = datetime.now()
+    t0 = time.perf_counter()
+    espera = ESPERA_REINTENTO_SEG
+    for intento in range(1, reintentos + 2):
+        try:
+            filas = correr_sql(pool, secciones[paso.seccion]) if paso.seccion is not None else correr_script(paso)
+            break
+        except Exception as e:
+            if intento > reintentos:
+                return {"paso": paso.nombre, "status": "FAIL", "intentos": intento, "inicio": inicio,
+                        "fin": datetime.now(), "segundos": time.perf_counter() - t0, "huella": huella,
+                        "detalle": f"{type(e).__name__}: {e}"}
+            logger.warning(f"{paso.nombre}: intento {intento} falló ({e}); reintento en {espera}s")
+            time.sleep(espera)
+            espera *= 2
+
+    return {"paso": paso.nombre, "status": "OK", "intentos": intento, "inicio": inicio, "fin": datetime.now(),
+            "segundos": time.perf_counter() - t0, "filas": filas,
+            "filas_salida": contar_filas(pool, paso.tabla) if paso.tabla else None, "huella": huella}
+
+
+# =====================================
+# 7) ORQUESTACIÓN (orden de dependencias + paralelo)
+# =====================================
+
+def correr_pipeline(pool, pasos: list, secciones: dict, run_id: str, paralelo=2, forzar=(),
+                    reintentos=REINTENTOS) -> list:
+    """
+    Corre los pasos respetando dependencias:
+    - un paso arranca cuando todos los suyos terminaron OK (o se saltaron)
+    - los pasos listos al mismo tiempo corren en paralelo (hasta `paralelo` a la vez)
+    - si un paso falla, los que dependen de él quedan BLOCKED (no se corren)
+    - antes de correr, se calcula la huella; si es igual a la de su última corrida OK -> SKIP
+    Los pasos de `forzar` se corren aunque su huella no haya cambiado ("all" = todos).
+    """
+    por_nombre = {p.nombre: p for p in pasos}
+    huellas, estado, resultados = {}, {}, []
+    pendientes = list(pasos)
+    en_curso = {}
+
+    def listos():
+        for p in list(pendientes):
+            deps = [d for d in p.depende if d in por_nombre]
+            if any(estado.get(d) in ("FAIL", "BLOCKED") for d in deps):
+                pendientes.remove(p)
+                estado[p.nombre] = "BLOCKED"
+                r = {"paso": p.nombre, "status": "BLOCKED", "detalle": "falló un paso anterior"}
+                registrar_paso(pool, run_id, r)
+                resultados.append(r)
+                logger.error(f"BLOCKED -> {p.nombre} (falló un paso anterior)")
+            elif all(estado.get(d) in ("OK", "SKIP") for d in deps):
+                pendientes.remove(p)
+                yield p
+
+    def huella_de(paso: str):
+        """Huella de un paso: la de esta corrida, o (si no está en esta corrida) la de su última corrida OK."""
+        if paso not in huellas:
+            with pool.conexion() as conn:
+                huellas[paso] = ultima_huella_ok(conn.cursor(), paso)
+                conn.commit()
+        return huellas[paso]
+
+    with ThreadPoolExecutor(max_workers=max(1, paralelo)) as ejecutor:
+        while pendientes or en_curso:
+            antes = len(pendientes)
+            for p in list(listos()):
+                externas = p.entradas(pool) if p.entradas else ""
+                previa = huella_de(p.nombre)
+                huella = _hash(p.codigo(secciones), externas, *(huella_de(d) for d in p.depende))
+                huellas[p.nombre] = huella
+
+                if previa == huella and not p.siempre and not ({"all", p.nombre} & set(forzar)):
+                    estado[p.nombre] = "SKIP"
+                    r = {"paso": p.nombre, "status": "SKIP", "inicio": datetime.now(), "fin": datetime.now(),
+                         "segundos": 0.0, "huella": huella, "detalle": "entradas sin cambios"}
+                    registrar_paso(pool, run_id, r)
+                    resultados.append(r)
+                    logger.info(f"SKIP -> {p.nombre} (entradas sin cambios)")
+                    continue
+
+                logger.info(f"INICIO -> {p.nombre}")
+                en_curso[ejecutor.submit(correr_paso, pool, p, secciones, huella, reintentos)] = p
+
+            if not en_curso:
+                # Nada corriendo: si en esta vuelta no avanzó ningún paso (SKIP / BLOCKED), no va a avanzar nunca
+                if pendientes and len(pendientes) == antes:
+                    raise RuntimeError(f"Dependencias imposibles de cumplir: {[p.nombre for p in pendientes]}")
+                continue
+            hechos, _ = wait(list(en_curso), return_when=FIRST_COMPLETED)
+            for futuro in hechos:
+                p = en_curso.pop(futuro)
+                r = futuro.result()
+                estado[p.nombre] = r["status"]
+                registrar_paso(pool, run_id, r)
+                resultados.append(r)
+                if r["status"] == "OK":
+                    extra = f" | filas: {r['filas']:,}" if r.get("filas") else ""
+                    extra += f" | {p.tabla}: {r['filas_salida']:,} filas" if r.get("filas_salida") is not None else ""
+                    logger.info(f"OK -> {p.nombre}: {r['segundos']:.1f}s{extra}")
+                else:
+                    logger.error(f"FAIL -> {p.nombre}: {r['detalle']}")
+    return resultados
+
+
+def resumen(resultados: list, segundos: float) -> str:
+    """Tabla corta de tiempos por paso + el paso más lento (para saber dónde optimizar)."""
+    lineas = [f"{'paso':<10} {'estado':<8} {'seg':>9} {'filas':>14}"]
+    for r in resultados:
+        seg = f"{r['segundos']:.1f}" if r.get("segundos") is not None else "-"
+        filas = f"{r['filas']:,}" if r.get("filas") else "-"
+        lineas.append(f"{r['paso']:<10} {r['status']:<8} {seg:>9} {filas:>14}")
+    corridos = [r for r in resultados if r["status"] in ("OK", "FAIL") and r.get("segundos")]
+    if corridos:
+        lento = max(corridos, key=lambda r: r["segundos"])
+        lineas.append(f"Total (wall): {segundos:.1f}s | paso más lento: {lento['paso']} ({lento['segundos']:.1f}s)")
+    return "\n".join(lineas)
+
+
+# =========================
+# 8) PROGRAMA PRINCIPAL
+# =========================
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Corre el pipeline completo con tiempos, dependencias y saltos.")
+    parser.add_argument("--pasos", default=None,
+                        help="Solo estos pasos, separados por coma (ej: curated,feat). Sus dependencias "
+                             "fuera de la lista se dan por cumplidas")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Usar refresh_layers.py (paso 'capas') en vez de las secciones 02/03")
+    parser.add_argument("--forzar", default="",
+                        help="Pasos a correr aunque sus entradas no hayan cambiado (separados por coma, o 'all')")
+    parser.add_argument("--paralelo", type=int, default=2, help="Pasos independientes a la vez (por defecto: 2)")
+    parser.add_argument("--reintentos", type=int, default=REINTENTOS, help="Reintentos por paso si falla")
+    parser.add_argument("--sql", type=Path, default=SQL_PIPELINE, help="Script SQL por secciones")
+    parser.add_argument("--listar", action="store_true", help="Solo mostrar los pasos y sus dependencias")
+    parser.add_argument("--conn-str", default=None,
+                        help="Cadena de conexión ODBC completa (por defecto se arma con SERVER/DB/USER/PWD)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    secciones = leer_secciones(args.sql)
+    pasos = construir_pasos(args.incremental)
+    if args.pasos:
+        elegidos = {p.strip() for p in args.pasos.split(",")}
+        pasos = [p for p in pasos if p.nombre in elegidos]
+
+    if args.listar:
+        for p in pasos:
+            que = f"SQL sección {p.seccion} ({len(secciones[p.seccion])} lotes)" if p.seccion else p.script
+            print(f"{p.nombre:<10} <- {', '.join(p.depende) or '-':<20} {que}")
+        return
+
+    # Tantas conexiones como pasos a la vez (+1 para registrar corridas y calcular huellas)
+    pool = PoolConexiones(max(1, args.paralelo) + 1, args.conn_str)
+    try:
+        with pool.conexion() as conn:
+            ensure_runs_table(conn.cursor())
+            conn.commit()
+
+        run_id = str(uuid.uuid4())
+        logger.info(f"Corrida {run_id}: {', '.join(p.nombre for p in pasos)}")
+        t0 = time.perf_counter()
+        forzar = [f.strip() for f in args.forzar.split(",") if f.strip()]
+        resultados = correr_pipeline(pool, pasos, secciones, run_id, args.paralelo, forzar, args.reintentos)
+        logger.info("Resumen:\n" + resumen(resultados, time.perf_counter() - t0))
+    finally:
+        pool.cerrar()
+
+    if any(r["status"] in ("FAIL", "BLOCKED") for r in resultados):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
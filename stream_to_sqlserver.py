@@ -0,0 +1,473 @@
+"""
+SCRIPT: Cargar meses de yellow trips DIRECTO desde la web a SQL Server (sin guardar el parquet antes)
+
+¿Para qué sirve?
+- El flujo normal es: import_data_vf.py (baja a data/raw/yellow) -> load_parquet_to_sqlserver.py (lo vuelve
+  a leer del disco) -> archive_parquets.py (lo mueve a backup). Cada byte se escribe y se lee del disco
+  dos veces antes de llegar a raw.yellow_trips.
+- Este script lee el parquet POR HTTP, con peticiones "Range" (pedazos del archivo):
+  1) pide solo el final del archivo (el footer, donde está la metadata)
+  2) con la metadata sabe dónde empieza y termina cada row group
+  3) pide cada row group y se lo pasa al MISMO camino del cargador (coercionar_arrow + motor de inserción)
+  Mientras se inserta un row group, el siguiente ya se está bajando (se solapan red e inserción).
+- Opcional (--tee): guarda a la vez una copia del archivo en la carpeta de backup, así no hace falta
+  archive_parquets.py para ese mes.
+
+¿En qué escenario se usa?
+- Para cargar un mes nuevo lo más rápido posible (el primer lote entra a SQL Server apenas llega
+  el primer row group, sin esperar la descarga completa) y con la mitad de E/S de disco.
+
+Requisitos:
+- Los mismos de load_parquet_to_sqlserver.py (pandas, numpy, pyarrow, pyodbc) + requests.
+- Que el servidor acepte peticiones "Range" (la web de NYC TLC sí las acepta).
+"""
+
+import argparse
+import io
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+import pyarrow.parquet as pq
+import requests
+
+import load_parquet_to_sqlserver as cargador
+from import_data_vf import construir_url, leer_config, parquet_valido
+
+# ============================================================
+# 1) CONFIGURACIÓN
+# ============================================================
+
+# Carpeta donde se deja la copia del parquet cuando se usa --tee (la misma de archive_parquets.py)
+BACKUP_DIR = Path(r"data\raw\yellow-backup")
+
+# Bytes del final del archivo que se piden de entrada: casi siempre alcanza para el footer completo
+# (si el footer es más grande, se pide lo que falte)
+BYTES_FOOTER = 64 * 1024
+
+# Row groups que se bajan por adelantado mientras se inserta el actual
+# (más = más solape con la red, pero más memoria: cada row group son ~decenas de MB)
+ROW_GROUPS_ADELANTE = 2
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(levelname)s | %(message)s"
+)
+logger = logging.getLogger("parquet-stream")
+
+
+# =====================================
+# 2) ARCHIVO REMOTO (lectura por HTTP Range)
+# =====================================
+
+class ArchivoHTTP(io.RawIOBase):
+    """
+    Un "archivo" de solo lectura que en realidad está en una URL.
+
+    pyarrow lo usa como si fuera un archivo local (seek + read). Cada lectura se responde desde
+    pedazos ya bajados; si el pedazo no está, se pide con "Range: bytes=inicio-fin".
+
+    - programar(rangos): lista de (inicio, fin) en el orden en que se van a leer (los row groups).
+      Cuando pyarrow entra a un rango, se bajan en segundo plano los ROW_GROUPS_ADELANTE siguientes
+      y se sueltan los anteriores (la memoria no depende del tamaño del archivo).
+    - tee: si se pasa una ruta, cada byte bajado se escribe también ahí (en su posición).
+      Al final, completar_tee() baja lo que no se haya leído (ej: row groups saltados al reanudar),
+      valida el parquet y lo deja en su nombre final.
+
+    Todas las peticiones usan "If-Match: <ETag>": si el archivo cambia en el servidor a mitad
+    de la lectura, el servidor responde 412 y se aborta (nunca se mezclan dos versiones).
+    """
+
+    def __init__(self, url: str, tee=None, adelante=ROW_GROUPS_ADELANTE):
+        super().__init__()
+        self.url = url
+        self.adelante = adelante
+        self.pos = 0
+        self.bytes_bajados = 0
+        self.peticiones = 0
+
+        self._local = threading.local()  # una sesión HTTP por hilo (requests.Session no es thread-safe)
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="http")
+        self._pedazos = {}               # (inicio, fin) -> Future con los bytes de ese rango
+        self._rangos = []                # rangos programados (row groups), en orden
+        self._tee_ruta = Path(tee) if tee else None
+        self._tee = None
+        self._tee_bajado = []            # rangos ya escritos en la copia
+
+        # HEAD: tamaño y versión del archivo
+        r = self._sesion().head(url, timeout=60, allow_redirects=True)
+        r.raise_for_status()
+        self.size = int(r.headers["content-length"])
+        self.etag = r.headers.get("ETag")
+        self.last_modified = r.headers.get("Last-Modified")
+
+        if self._tee_ruta is not None:
+            self._tee_ruta.parent.mkdir(parents=True, exist_ok=True)
+            self._tee_parcial = self._tee_ruta.with_name(self._tee_ruta.name + ".part")
+            self._tee = open(self._tee_parcial, "wb")
+            self._tee.truncate(self.size)
+
+    # ---------- HTTP ----------
+
+    def _sesion(self) -> requests.Session:
+        if not hasattr(self._local, "sesion"):
+            self._local.sesion = requests.Session()
+        return self._local.sesion
+
+    def _bajar(self, inicio: int, fin: int) -> bytes:
+        """Baja los bytes [inicio, fin) con una petición Range (y los copia al tee, si hay)."""
+        headers = {"Range": f"bytes={inicio}-{fin - 1}"}
+        if self.etag:
+            headers["If-Match"] = self.etag
+        r = self._sesion().get(self.url, headers=headers, timeout=120)
+        if r.status_code == 412:
+            raise RuntimeError(f"{self.url} cambió en el servidor durante la lectura (ETag distinto)")
+        r.raise_for_status()
+        if r.status_code != 206:
+            raise RuntimeError(f"El servidor no aceptó la petición Range (HTTP {r.status_code}): {self.url}")
+        datos = r.content
+        if len(datos) != fin - inicio:
+            raise RuntimeError(f"Respuesta incompleta para bytes {inicio}-{fin - 1}: {len(datos):,} bytes")
+
+        with self._lock:
+            self.bytes_bajados += len(datos)
+            self.peticiones += 1
+            if self._tee is not None:
+                self._tee.seek(inicio)
+                self._tee.write(datos)
+                self._tee_bajado.append((inicio, fin))
+        return datos
+
+    def _pedir(self, inicio: int, fin: int):
+        """Agenda la bajada de [inicio, fin) en segundo plano (si no estaba ya pedida)."""
+        with self._lock:
+            if (inicio, fin) not in self._pedazos:
+                self._pedazos[(inicio, fin)] = self._pool.submit(self._bajar, inicio, fin)
+
+    # ---------- footer y row groups por adelantado ----------
+
+    def pedir_footer(self):
+        """Pide el final del archivo de una vez (pyarrow lee los últimos 8 bytes y luego la metadata)."""
+        self._pedir(max(0, self.size - BYTES_FOOTER), self.size)
+
+    def programar(self, rangos: list):
+        """Registra los rangos (row groups) en el orden en que pyarrow los va a leer."""
+        self._rangos = list(rangos)
+
+    def _al_entrar(self, pos: int):
+        """Si pos cae en el row group i: pide i .. i+adelante y suelta los row groups anteriores a i."""
+        for i, (inicio, fin) in enumerate(self._rangos):
+            if inicio <= pos < fin:
+                for j in range(i, min(i + 1 + self.adelante, len(self._rangos))):
+                    self._pedir(*self._rangos[j])
+                with self._lock:
+                    for viejo in self._rangos[:i]:
+                        self._pedazos.pop(viejo, None)
+                return
+
+    # ---------- interfaz de archivo (lo que usa pyarrow) ----------
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.pos = offset
+        elif whence == io.SEEK_CUR:
+            self.pos += offset
+        else:
+            self.pos = self.size + offset
+        return self.pos
+
+    def readinto(self, b) -> int:
+        n = min(len(b), self.size - self.pos)
+        if n <= 0:
+            return 0
+        self._al_entrar(self.pos)
+
+        # Se arma la respuesta con los pedazos (ya bajados o en camino) que cubren [pos, pos + n).
+        # pyarrow a veces lee dos row groups seguidos de una vez: se juntan sus dos pedazos.
+        copiados = 0
+        while copiados < n:
+            pos = self.pos + copiados
+            with self._lock:
+                pedazo = next(((ini, fin, fut) for (ini, fin), fut in self._pedazos.items() if ini <= pos < fin), None)
+                if pedazo is None:
+                    # No estaba previsto (ej: lectura fuera de los row groups): pedimos hasta el próximo pedazo
+                    fin = min([ini for (ini, _) in self._pedazos if pos < ini] + [self.pos + n])
+                    pedazo = (pos, fin, self._pool.submit(self._bajar, pos, fin))
+                    self._pedazos[(pos, fin)] = pedazo[2]
+            inicio, fin, futuro = pedazo
+            datos = futuro.result()
+            k = min(fin, self.pos + n) - pos
+            b[copiados:copiados + k] = datos[pos - inicio:pos - inicio + k]
+            copiados += k
+
+        self.pos += n
+        return n
+
+    # ---------- copia local (tee) ----------
+
+    def completar_tee(self) -> Path:
+        """
+        Baja lo que falte de la copia local (huecos que pyarrow no leyó), valida que sea un
+        parquet completo y lo renombra a su nombre final (os.replace: atómico).
+        """
+        if self._tee is None:
+            return None
+        with self._lock:
+            bajado = sorted(self._tee_bajado)
+        huecos, cursor = [], 0
+        for inicio, fin in bajado:
+            if inicio > cursor:
+                huecos.append((cursor, inicio))
+            cursor = max(cursor, fin)
+        if cursor < self.size:
+            huecos.append((cursor, self.size))
+        for inicio, fin in huecos:
+            self._bajar(inicio, fin)
+
+        self._tee.close()
+        self._tee = None
+        if not parquet_valido(self._tee_parcial):
+            self._tee_parcial.unlink(missing_ok=True)
+            raise ValueError(f"La copia local de {self.url} no es un parquet válido")
+        os.replace(self._tee_parcial, self._tee_ruta)
+        return self._tee_ruta
+
+    def close(self):
+        if not self.closed:
+            self._pool.shutdown(wait=True)
+            if self._tee is not None:
+                # Se cerró sin completar (error): se descarta la copia a medias
+                self._tee.close()
+                self._tee = None
+                self._tee_parcial.unlink(missing_ok=True)
+            self._pedazos.clear()
+        super().close()
+
+
+def rangos_row_groups(metadata) -> list:
+    """
+    Rango de bytes [inicio, fin) de cada row group, sacado de la metadata del footer:
+    desde la primera página (de diccionario o de datos) de su primera columna hasta el final
+    de la última columna.
+    """
+    rangos = []
+    for i in range(metadata.num_row_groups):
+        rg = metadata.row_group(i)
+        inicio, fin = None, 0
+        for j in range(rg.num_columns):
+            col = rg.column(j)
+            desde = col.data_page_offset
+            if col.has_dictionary_page and col.dictionary_page_offset:
+                desde = min(desde, col.dictionary_page_offset)
+            inicio = desde if inicio is None else min(inicio, desde)
+            fin = max(fin, desde + col.total_compressed_size)
+        rangos.append((inicio, fin))
+    return rangos
+
+
+# =====================================
+# 3) PLAN CONTRA EL MANIFIESTO DE CARGA
+# =====================================
+
+def planear_remoto(nombre: str, remoto: ArchivoHTTP, manifiesto: dict, num_rows=None) -> dict:
+    """
+    Igual que cargador.planear_carga, pero para un archivo que está en la web:
+    no hay archivo local para calcular el SHA-256, así que la "versión" es tamaño + Last-Modified
+    del servidor (se guardan en file_size / file_mtime de raw.load_manifest).
+
+    num_rows: filas según el footer del servidor (si ya se pidió). Un mes cargado desde disco
+    (load_parquet_to_sqlserver.py: tiene content_hash y la fecha del archivo local, no el Last-Modified)
+    se adopta sin recargar si el tamaño es el mismo y el conteo de filas coincide con el footer.
+    Un mes que ya se cargó desde la web (content_hash vacío) con otro Last-Modified fue republicado:
+    se recarga aunque tenga el mismo tamaño y las mismas filas (ej: TLC corrigió valores).
+    """
+    mtime = parsedate_to_datetime(remoto.last_modified).replace(tzinfo=None) if remoto.last_modified else None
+    plan = {"file_size": remoto.size, "file_mtime": mtime, "content_hash": None, "desde": 0}
+    previo = manifiesto.get(nombre)
+    mismo = previo is not None and previo["file_size"] == remoto.size and previo["file_mtime"] == mtime
+
+    if previo is None:
+        return {**plan, "accion": "cargar", "motivo": "nuevo"}
+    if previo["status"] == "OK":
+        if mismo:
+            return {**plan, "accion": "saltar", "motivo": "sin cambios (tamaño y Last-Modified)"}
+        desde_disco = previo["content_hash"] is not None
+        if desde_disco and previo["file_size"] == remoto.size and num_rows is not None \
+                and previo["row_count"] == num_rows:
+            return {**plan, "accion": "saltar", "motivo": "ya estaba en raw (mismo tamaño y conteo de filas)"}
+        return {**plan, "accion": "recargar", "motivo": "el servidor tiene otra versión"}
+    if mismo and previo["rows_committed"] > 0:
+        return {**plan, "accion": "reanudar", "desde": previo["rows_committed"],
+                "motivo": f"quedó en {previo['status']}, checkpoint en fila {previo['rows_committed']:,}"}
+    return {**plan, "accion": "recargar", "motivo": f"quedó en {previo['status']}"}
+
+
+def registrar_adoptado(conn, nombre: str, plan: dict):
+    """
+    Guarda tamaño + Last-Modified de un mes adoptado (ya estaba en raw, cargado desde disco):
+    la próxima vez se salta solo con el HEAD, sin pedir el footer.
+    content_hash queda vacío: desde ahora la versión es la del servidor, así que si lo republican
+    (otro Last-Modified) se recarga, no se vuelve a adoptar.
+    """
+    cur = conn.cursor()
+    cur.execute(f"""
+    UPDATE {cargador.MANIFEST_TABLE}
+    SET file_size = ?, file_mtime = ?, content_hash = NULL
+    WHERE source_file = ?
+    """, plan["file_size"], plan["file_mtime"], nombre)
+    conn.commit()
+    cur.close()
+
+
+# =====================================
+# 4) CARGAR UN MES EN STREAMING
+# =====================================
+
+def cargar_mes(conn, url: str, manifiesto: dict, tee_dir=None, **opciones) -> dict:
+    """
+    Carga un mes directo desde la URL:
+    HEAD + footer -> plan contra raw.load_manifest -> row groups por HTTP -> coercionar_arrow -> motor.
+    Usa cargador.cargar_con_manifiesto, así que los checkpoints y el reanudar funcionan igual que
+    con archivos locales (al reanudar, los row groups ya cargados ni se piden).
+
+    Retorna las estadísticas del cargador + bytes/peticiones HTTP y segundos hasta tener el footer
+    (o {"saltado": True} si el manifiesto dice que ese mes ya está cargado y no cambió).
+    """
+    nombre = url.rstrip("/").rsplit("/", 1)[-1]
+    t0 = time.perf_counter()
+    segundos_footer = None
+    remoto = ArchivoHTTP(url, tee=(Path(tee_dir) / nombre) if tee_dir else None)
+    try:
+        # Con el HEAD ya sabemos tamaño y Last-Modified: si no cambió, no se baja ni el footer
+        plan = planear_remoto(nombre, remoto, manifiesto)
+        if plan["accion"] == "saltar":
+            logger.info(f"SKIP -> {nombre}: {plan['motivo']}")
+            stats = {"archivo": nombre, "filas": 0, "saltado": True}
+        else:
+            remoto.pedir_footer()
+            pf = pq.ParquetFile(remoto)
+            segundos_footer = time.perf_counter() - t0
+            # Con el footer ya se sabe el conteo de filas: un mes cargado desde disco se adopta
+            plan = planear_remoto(nombre, remoto, manifiesto, pf.metadata.num_rows)
+            if plan["accion"] == "saltar":
+                registrar_adoptado(conn, nombre, plan)
+                logger.info(f"SKIP -> {nombre}: {plan['motivo']}")
+                stats = {"archivo": nombre, "filas": 0, "saltado": True}
+            else:
+                remoto.programar(rangos_row_groups(pf.metadata))
+                logger.info(f"Streaming -> {nombre} ({remoto.size / (1024 * 1024):.1f} MB, "
+                            f"{pf.num_row_groups} row groups, footer en {segundos_footer:.2f}s): {plan['motivo']}")
+                stats = cargador.cargar_con_manifiesto(conn, pf, plan, source_file=nombre, **opciones)
+
+        if tee_dir and not stats.get("saltado"):
+            copia = remoto.completar_tee()
+            logger.info(f"   copia local: {copia}")
+    finally:
+        remoto.close()
+
+    stats.update({
+        "bytes_http": remoto.bytes_bajados,
+        "peticiones_http": remoto.peticiones,
+        "segundos_footer": segundos_footer,
+        "segundos_total": time.perf_counter() - t0,
+    })
+    return stats
+
+
+# =========================
+# 5) PROGRAMA PRINCIPAL
+# =========================
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Carga meses de yellow trips directo desde la web a raw.yellow_trips (sin bajar el parquet antes)."
+    )
+    parser.add_argument("--entrada", default="entrada.txt",
+                        help="Archivo con BASE=... y los meses, igual que import_data_vf.py (por defecto: entrada.txt)")
+    parser.add_argument("--tee", action="store_true",
+                        help=f"Guardar además una copia de cada parquet en la carpeta de backup ({BACKUP_DIR})")
+    parser.add_argument("--backup", default=str(BACKUP_DIR), help="Carpeta de la copia con --tee")
+    parser.add_argument("--batch-rows", type=int, default=0,
+                        help="Filas por lote (por defecto 0 = un lote por row group, lo natural al leer por HTTP)")
+    parser.add_argument("--engine", choices=sorted(cargador.MOTORES), default=cargador.ENGINE,
+                        help="Motor de inserción (igual que en load_parquet_to_sqlserver.py)")
+    parser.add_argument("--staging-dir", type=Path, default=cargador.STAGING_DIR,
+                        help="Carpeta de archivos temporales del motor bulk")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Leer, preparar e insertar en etapas paralelas (ver load_parquet_to_sqlserver.py)")
+    parser.add_argument("--checkpoint-every", type=int, default=cargador.CHECKPOINT_EVERY,
+                        help="Commit cada N lotes (0 = un commit por mes)")
+    parser.add_argument("--conn-str", default=None,
+                        help="Cadena de conexión ODBC completa (por defecto se arma con SERVER/DB/USER/PWD)")
+    return parser.parse_args()
+
+
+def main():
+    """
+    1) Lee BASE y meses desde entrada.txt
+    2) Asegura tabla y manifiesto de carga
+    3) Por cada mes: lo carga en streaming (y opcionalmente deja la copia en backup)
+    4) Resumen: filas, MB bajados, tiempo total
+    """
+    args = parse_args()
+    base, periodos = leer_config(args.entrada)
+
+    conn = cargador.conectar(args.conn_str)
+    cur = conn.cursor()
+    cargador.ensure_table(cur)
+    cargador.ensure_manifest(cur)
+    conn.commit()
+    manifiesto = cargador.leer_manifiesto(cur)
+    cur.close()
+
+    opciones = {
+        "batch_rows": args.batch_rows,
+        "pipeline": args.pipeline,
+        "motor": cargador.crear_motor(args.engine, cargador.TABLE, args.staging_dir),
+        "checkpoint_every": args.checkpoint_every,
+    }
+
+    t0 = time.perf_counter()
+    filas, bajados, fallas = 0, 0, 0
+    for periodo in periodos:
+        url = construir_url(base, periodo)
+        try:
+            stats = cargar_mes(conn, url, manifiesto, args.backup if args.tee else None, **opciones)
+        except Exception as e:
+            logger.error(f"FAIL -> {url}: {e}")
+            fallas += 1
+            continue
+        filas += stats["filas"]
+        bajados += stats["bytes_http"]
+        if not stats.get("saltado"):
+            pico = f"{stats['pico_rss_mb']:.0f} MB" if stats["pico_rss_mb"] is not None else "n/d (instala psutil)"
+            logger.info(f"OK -> {stats['archivo']}: {stats['filas']:,} filas | {stats['segundos_total']:.1f}s | "
+                        f"{stats['bytes_http'] / (1024 * 1024):.1f} MB en {stats['peticiones_http']} peticiones | "
+                        f"pico RSS: {pico}")
+            logger.info(f"   {cargador.resumen_esquema(stats['esquema'])}")
+            if "etapas" in stats:
+                logger.info(f"   {cargador.resumen_etapas(stats)}")
+
+    segundos = time.perf_counter() - t0
+    logger.info(f"Listo ({datetime.now():%Y-%m-%d %H:%M:%S}): {filas:,} filas | "
+                f"{bajados / (1024 * 1024):.1f} MB por HTTP | {segundos:.1f}s | {fallas} mes(es) con error")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
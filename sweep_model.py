@@ -0,0 +1,217 @@
+"""
+SCRIPT: Barrido (sweep) de pesos, regularización y columnas para el modelo de trips_count
+
+¿Para qué sirve?
+- En train_model.py los pesos están fijos (1 / 3 si trips_count > 200 / 8 si > 500). Probar otro esquema
+  era editar el script y volver a correr todo, incluida la lectura de SQL Server.
+- Este script lee las features UNA vez y entrena muchas configuraciones a la vez:
+  - esquemas de pesos (umbrales y valores)
+  - regularización (alpha de Ridge; alpha=0 es la LinearRegression de siempre)
+  - subconjuntos de columnas numéricas (las zonas van siempre)
+- Cada configuración se evalúa con las MISMAS métricas de validate_model.py (MAE, RMSE, R², mejora vs
+  baseline, percentiles, dictamen) sobre el mismo set de test, y todo queda en una sola tabla.
+
+¿Cómo lo hace rápido?
+- Mismo split que train_model.py (train_test_split con random_state=42): la fila del esquema actual
+  con alpha=0 y todas las columnas da las mismas métricas que train_model.py + validate_model.py.
+- X_train / X_test (matrices dispersas) e y se guardan una vez como .npy y cada proceso los abre con
+  np.load(mmap_mode="r"): el sistema operativo comparte esas páginas entre procesos (no se copia la
+  matriz a cada uno, ni se manda por pickle).
+- Las configuraciones se reparten entre núcleos con joblib (--workers).
+
+Requisitos:
+- Python con pandas, numpy, scipy, scikit-learn, joblib (+ pyodbc para leer de SQL Server)
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.linear_model import LinearRegression, Ridge
+
+import artefactos
+import train_model as tm
+import validate_model as vm
+
+# ============================================================
+# 1) CONFIGURACIÓN
+# ============================================================
+
+SWEEP_DIR = Path("artifacts") / "sweep"
+# Arrays compartidos (memmap) mientras corre el barrido; se borran al terminar
+DATOS_DIR = SWEEP_DIR / "datos"
+RESULTADOS = SWEEP_DIR / "sweep_results.csv"
+
+# Esquemas de pesos por defecto: "umbral:peso,umbral:peso" (vacío = sin pesos)
+# (el primero es el de train_model.py; el segundo es la "OPCIÓN B" que se discutía en sus comentarios)
+ESQUEMAS = ["200:3,500:8", "200:5,500:10", "200:2,500:4", "100:2,300:4,600:8", ""]
+
+# Regularización (alpha de Ridge). 0 = LinearRegression sin regularizar (como train_model.py)
+ALPHAS = [0, 0.1, 1, 10, 100]
+
+# Subconjuntos de columnas numéricas: nombre -> columnas que se QUITAN (las zonas van siempre)
+SUBCONJUNTOS = {
+    "todas": [],
+    "sin_day_of_month": ["day_of_month"],
+    "sin_promedios": ["avg_trip_distance", "avg_trip_duration_min", "avg_total_amount"],
+}
+
+# Segmentos extra de la tabla (MAE por rango, como la sección 7.5 de validate_model.py)
+SEGMENTOS_TABLA = {"mae_alto": "ALTO (>200)", "mae_pico": "PICO (>500)"}
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(levelname)s | %(message)s",
+)
+logger = logging.getLogger("sweep")
+
+
+# ============================================================
+# 2) DATOS COMPARTIDOS (MEMMAP)
+# ============================================================
+
+def guardar_datos(X_train, X_test, y_train_log, y_train_real, y_test_real, columnas, destino: Path):
+    """
+    Guarda cada array como .npy (las matrices CSR, en sus tres arrays: data / indices / indptr, con
+    artefactos.guardar_csr).
+    Los procesos del barrido los abren con mmap_mode="r" (ver cargar_datos).
+    """
+    destino.mkdir(parents=True, exist_ok=True)
+    for nombre, X in [("X_train", X_train), ("X_test", X_test)]:
+        artefactos.guardar_csr(X, destino / nombre)
+    for nombre, y in [("y_train_log", y_train_log), ("y_train_real", y_train_real), ("y_test_real", y_test_real)]:
+        np.save(destino / f"{nombre}.npy", np.asarray(y, dtype=np.float64))
+    with open(destino / "columnas.json", "w", encoding="utf-8") as f:
+        json.dump(columnas, f)
+
+
+def cargar_datos(origen: Path) -> dict:
+    """Abre los arrays sin leerlos a memoria (np.load con mmap_mode="r")."""
+    with open(origen / "columnas.json", encoding="utf-8") as f:
+        datos = {"columnas": json.load(f)}
+    for nombre in ["X_train", "X_test"]:
+        datos[nombre] = artefactos.cargar_csr(origen / nombre)
+    for nombre in ["y_train_log", "y_train_real", "y_test_real"]:
+        datos[nombre] = np.load(origen / f"{nombre}.npy", mmap_mode="r")
+    return datos
+
+
+# ============================================================
+# 3) UNA CONFIGURACIÓN
+# ============================================================
+
+def leer_esquema(texto: str) -> list:
+    """'200:3,500:8' -> [(200, 3.0), (500, 8.0)]  ('' o 'sin' -> [] = todas las filas pesan 1)"""
+    if texto.strip().lower() in ("", "sin"):
+        return []
+    return [(float(u), float(p)) for u, p in (par.split(":") for par in texto.split(","))]
+
+
+def ajustar_config(config: dict, origen: str) -> dict:
+    """Entrena y evalúa una configuración (corre en un proceso del barrido)."""
+    datos = cargar_datos(Path(origen))
+    X_train, X_test = datos["X_train"], datos["X_test"]
+
+    # Columnas: se quitan las numéricas del subconjunto (las de zona quedan todas)
+    quitar = set(SUBCONJUNTOS[config["subconjunto"]])
+    cols = [i for i, c in enumerate(datos["columnas"]) if c not in quitar]
+    if len(cols) < X_train.shape[1]:
+        X_train, X_test = X_train[:, cols], X_test[:, cols]
+
+    weights = tm.calcular_pesos(datos["y_train_real"], leer_esquema(config["esquema"]))
+    # alpha=0: la LinearRegression de train_model.py; si no, Ridge (penaliza coeficientes grandes)
+    if config["alpha"] == 0:
+        model = LinearRegression(tol=tm.TOL_LSQR)
+    else:
+        model = Ridge(alpha=config["alpha"])
+
+    t0 = time.perf_counter()
+    model.fit(X_train, datos["y_train_log"], sample_weight=weights)
+    seg_ajuste = time.perf_counter() - t0
+
+    y_test = np.asarray(datos["y_test_real"])
+    # Métricas y segmentos en una pasada (los mismos acumuladores de validate_model.py)
+    acumulado = vm.MetricasAcumuladas()
+    acumulado.agregar(y_test, vm.predecir(model, X_test))
+    m = acumulado.resultado()
+    fila = {**config, "columnas": len(cols), "seg_ajuste": seg_ajuste, **m, "dictamen": vm.dictamen(m)[0]}
+    for clave, segmento in SEGMENTOS_TABLA.items():
+        _, minimo, maximo = next(s for s in vm.SEGMENTOS if s[0] == segmento)
+        fila[clave] = float(acumulado.segmento(minimo, maximo)[1])
+    return fila
+
+
+# ============================================================
+# 4) PROGRAMA PRINCIPAL
+# ============================================================
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Barrido de pesos / regularización / columnas (lee las features una vez).")
+    parser.add_argument("--features-parquet", nargs="?", const=tm.FEATURES_PARQUET, default=None,
+                        help=f"Leer del dataset parquet de build_features_parquet.py (sin ruta: {tm.FEATURES_PARQUET})")
+    parser.add_argument("--desde", default=None, help="Solo fechas desde este día (YYYY-MM-DD, incluido)")
+    parser.add_argument("--hasta", default=None, help="Solo fechas hasta este día (YYYY-MM-DD, incluido)")
+    parser.add_argument("--esquemas", nargs="+", default=ESQUEMAS,
+                        help='Esquemas de pesos "umbral:peso,umbral:peso" ("sin" = sin pesos)')
+    parser.add_argument("--alphas", nargs="+", type=float, default=ALPHAS, help="Valores de alpha (0 = sin regularizar)")
+    parser.add_argument("--subconjuntos", nargs="+", default=list(SUBCONJUNTOS), choices=list(SUBCONJUNTOS),
+                        help="Subconjuntos de columnas numéricas")
+    parser.add_argument("--ordenar", default="mae", help="Métrica para el ranking (menor es mejor; r2 / improve_* al revés)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Procesos en paralelo")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    t0 = time.perf_counter()
+
+    # Leer y preparar UNA vez (mismo split que train_model.py)
+    df = tm.leer_features(args.features_parquet, args.desde, args.hasta)
+    X, columnas, y_log, y_real = tm.preparar_xy(df)
+    del df
+    X_train, X_test, y_train_log, _, y_train_real, y_test_real = tm.dividir(X, y_log, y_real)
+    del X
+    if DATOS_DIR.exists():
+        shutil.rmtree(DATOS_DIR)
+    guardar_datos(X_train, X_test, y_train_log, y_train_real, y_test_real, columnas, DATOS_DIR)
+    del X_train, X_test
+    t_datos = time.perf_counter() - t0
+
+    configs = [{"esquema": e, "alpha": a, "subconjunto": s}
+               for e, a, s in itertools.product(args.esquemas, args.alphas, args.subconjuntos)]
+    logger.info(f"Datos listos en {t_datos:.1f}s | {len(configs)} configuraciones | {args.workers} proceso(s)")
+
+    try:
+        t1 = time.perf_counter()
+        filas = Parallel(n_jobs=args.workers)(delayed(ajustar_config)(c, str(DATOS_DIR)) for c in configs)
+        t_barrido = time.perf_counter() - t1
+    finally:
+        shutil.rmtree(DATOS_DIR, ignore_errors=True)
+
+    # Ranking: menor es mejor, salvo R² y las mejoras vs baseline
+    mayor_mejor = args.ordenar in ("r2", "improve_mae_pct", "improve_rmse_pct")
+    tabla = pd.DataFrame(filas).sort_values(args.ordenar, ascending=not mayor_mejor, ignore_index=True)
+    tabla.insert(0, "rank", range(1, len(tabla) + 1))
+    tabla["esquema"] = tabla["esquema"].replace("", "sin")
+    SWEEP_DIR.mkdir(parents=True, exist_ok=True)
+    tabla.to_csv(RESULTADOS, index=False)
+
+    vista = tabla[["rank", "esquema", "alpha", "subconjunto", "mae", "rmse", "r2", "improve_mae_pct",
+                   "p90", "mae_pico", "seg_ajuste"]]
+    with pd.option_context("display.width", 200, "display.max_rows", None, "display.float_format", "{:.3f}".format):
+        print(vista.to_string(index=False))
+    logger.info(f"Barrido: {t_barrido:.1f}s ({sum(tabla['seg_ajuste']):.1f}s de ajustes sumados) | "
+                f"mejor por {args.ordenar}: {tabla.loc[0, 'esquema']} / alpha={tabla.loc[0, 'alpha']:g} / "
+                f"{tabla.loc[0, 'subconjunto']} | tabla completa: {RESULTADOS}")
+
+
+if __name__ == "__main__":
+    main()
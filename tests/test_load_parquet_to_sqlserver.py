@@ -0,0 +1,158 @@
+"""
+Chequeos automáticos de load_parquet_to_sqlserver.py que no necesitan SQL Server.
+
+Correr desde la raíz del proyecto:  python -m pytest tests
+(el módulo importa pyodbc: si no está instalado o no encuentra el driver ODBC, estos chequeos se saltan)
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+RAIZ = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(RAIZ))
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+import load_parquet_to_sqlserver as cargador  # noqa: E402
+
+
+# =====================================
+# _castear: errors="coerce" sin truncar números ni romper con fechas en ns
+# =====================================
+
+def test_castear_timestamp_ns_se_trunca_a_us():
+    # DATETIME2 guarda µs: los ns se cortan (hacia abajo, también antes de 1970), no rompen el archivo
+    arr = pa.array([1_000_000_001, -1_500, None], pa.timestamp("ns"))
+    res = cargador._castear(arr, pa.timestamp("us"))
+    assert res.type == pa.timestamp("us")
+    assert res.cast(pa.int64()).to_pylist() == [1_000_000, -2, None]
+
+
+def test_castear_texto_con_ns_se_trunca_a_us():
+    res = cargador._castear(pa.array(["2024-01-01 00:00:00.123456789", "basura"]), pa.timestamp("us"))
+    assert res.to_pylist()[0].microsecond == 123456
+    assert res.to_pylist()[1] is None
+
+
+def test_castear_int64_que_no_cabe_en_int32_queda_null():
+    res = cargador._castear(pa.array([3_000_000_000, 5, -3_000_000_000], pa.int64()), pa.int32())
+    assert res.to_pylist() == [None, 5, None]
+
+
+def test_castear_float_con_decimales_queda_null():
+    res = cargador._castear(pa.array([1.5, 2.0, float("nan"), None]), pa.int32())
+    assert res.type == pa.int32()
+    assert res.to_pylist() == [None, 2, None, None]
+
+
+# =====================================
+# Reanudar después de una falla: cada fila queda exactamente una vez
+# =====================================
+
+class BaseFalsa:
+    """
+    "SQL Server" en memoria con transacciones: lo confirmado (commit) y lo pendiente de la transacción
+    abierta. Solo entiende las sentencias que usa cargar_con_manifiesto sobre raw.yellow_trips y
+    raw.load_manifest.
+    """
+
+    def __init__(self):
+        self.confirmado = {"filas": [], "manifiesto": {}}
+        self.rollback()
+
+    def commit(self):
+        self.confirmado = {"filas": list(self.pendiente["filas"]),
+                           "manifiesto": {k: dict(v) for k, v in self.pendiente["manifiesto"].items()}}
+
+    def rollback(self):
+        self.pendiente = {"filas": list(self.confirmado["filas"]),
+                          "manifiesto": {k: dict(v) for k, v in self.confirmado["manifiesto"].items()}}
+
+    def cursor(self):
+        return CursorFalso(self)
+
+
+class CursorFalso:
+    def __init__(self, base: BaseFalsa):
+        self.base = base
+        self.rowcount = -1
+        self.fast_executemany = False
+        self._resultado = []
+
+    def execute(self, sql, *params):
+        datos = self.base.pendiente
+        sql = " ".join(sql.split())
+        if sql.startswith(f"INSERT INTO {cargador.MANIFEST_TABLE}"):
+            nombre, size, mtime, content_hash, _, desde = params
+            datos["manifiesto"][nombre] = {"file_size": size, "file_mtime": mtime, "content_hash": content_hash,
+                                           "row_count": None, "status": "LOADING", "rows_committed": desde}
+        elif sql.startswith(f"DELETE FROM {cargador.MANIFEST_TABLE}"):
+            datos["manifiesto"].pop(params[0], None)
+        elif sql.startswith(f"UPDATE {cargador.MANIFEST_TABLE} SET rows_committed"):
+            datos["manifiesto"][params[1]]["rows_committed"] = params[0]
+        elif sql.startswith(f"UPDATE {cargador.MANIFEST_TABLE} SET status"):
+            status, row_count, duration_sec, _, committed, nombre = params
+            fila = datos["manifiesto"][nombre]
+            fila.update(status=status, row_count=row_count)
+            if committed is not None:
+                fila["rows_committed"] = committed
+        elif sql.startswith(f"DELETE FROM {cargador.TABLE}"):
+            antes = len(datos["filas"])
+            datos["filas"] = [f for f in datos["filas"] if f[-1] != params[0]]
+            self.rowcount = antes - len(datos["filas"])
+        elif sql.startswith("SELECT source_file, file_size"):
+            self._resultado = [(k, v["file_size"], v["file_mtime"], v["content_hash"], v["row_count"], v["status"],
+                                v["rows_committed"]) for k, v in datos["manifiesto"].items()]
+        else:
+            raise AssertionError(f"SQL inesperado: {sql[:80]}")
+        return self
+
+    def executemany(self, sql, filas):
+        assert sql.split()[2] == cargador.TABLE
+        self.base.pendiente["filas"].extend(filas)
+
+    def fetchall(self):
+        return self._resultado
+
+    def close(self):
+        pass
+
+
+@pytest.mark.parametrize("pipeline", [False, True])
+def test_reanudar_despues_de_una_falla_no_duplica_ni_pierde_filas(tmp_path, pipeline):
+    n, batch_rows, checkpoint_every, falla = 1_000, 100, 2, 5
+    df = cargador.crear_df_sintetico(n)
+    df["trip_distance"] = np.arange(n, dtype="float64")  # identifica cada fila del parquet
+    path = tmp_path / "yellow_tripdata_2024-01.parquet"
+    df.to_parquet(path, index=False, row_group_size=250)
+
+    base = BaseFalsa()
+    opciones = {"batch_rows": batch_rows, "checkpoint_every": checkpoint_every, "pipeline": pipeline}
+
+    # 1) Se "cae" en el lote 5: quedan confirmados los lotes hasta el último checkpoint (lote 4)
+    plan = cargador.planear_carga(path, cargador.leer_manifiesto(base.cursor()))
+    assert plan["accion"] == "cargar"
+    with pytest.raises(cargador.FallaInyectada):
+        cargador.cargar_con_manifiesto(base, path, plan, fallar_despues_de=falla, **opciones)
+    confirmadas = (falla - 1) // checkpoint_every * checkpoint_every * batch_rows
+    previo = base.confirmado["manifiesto"][path.name]
+    assert previo["status"] == "FAIL"
+    assert previo["rows_committed"] == confirmadas == len(base.confirmado["filas"])
+
+    # 2) Se vuelve a correr: el plan reanuda desde rows_committed y termina el archivo
+    plan = cargador.planear_carga(path, cargador.leer_manifiesto(base.cursor()))
+    assert plan["accion"] == "reanudar" and plan["desde"] == confirmadas
+    stats = cargador.cargar_con_manifiesto(base, path, plan, **opciones)
+    assert stats["filas"] == n - confirmadas
+
+    # Exactamente una vez: tantas filas como el parquet, y cada una una sola vez
+    filas = base.confirmado["filas"]
+    ids = sorted(f[cargador.COLUMNAS.index("trip_distance")] for f in filas)
+    assert len(filas) == pq.ParquetFile(path).metadata.num_rows
+    assert ids == list(range(n))
+    fin = base.confirmado["manifiesto"][path.name]
+    assert fin["status"] == "OK" and fin["row_count"] == fin["rows_committed"] == n
@@ -0,0 +1,146 @@
+"""
+Chequeo automático de ols_streaming.py: el modelo de las ecuaciones normales (sumas por lote, y con
+--incremental: estadísticas guardadas + un mes nuevo) tiene que ser el MISMO que re-entrenar todo desde cero
+en memoria (train_model.entrenar).
+
+Usa un dataset parquet sintético chico (3 meses, una carpeta por mes como build_features_parquet.py):
+no necesita SQL Server. Correr desde la raíz del proyecto:  python -m pytest tests
+"""
+
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+RAIZ = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(RAIZ))
+
+import artefactos  # noqa: E402
+import ols_streaming as ols  # noqa: E402
+import registro  # noqa: E402
+
+MESES = ["2024-01", "2024-02", "2024-03"]
+ZONAS = [4, 13, 48, 132, 161, 237]
+
+
+def escribir_mes(carpeta: Path, mes: str, rng: np.random.Generator):
+    """Un mes de features con la misma estructura que feat.features_hour_zone (todas las horas, ZONAS)."""
+    dias = pd.date_range(mes + "-01", pd.Period(mes, freq="M").end_time.normalize(), freq="D")
+    df = pd.DataFrame([(d, h, z) for d in dias for h in range(24) for z in ZONAS],
+                      columns=["trip_date", "pickup_hour", "PULocationID"])
+    n = len(df)
+    # Picos por zona y hora (para que haya filas con los tres pesos de train_model.PESOS) + ruido
+    base = np.where(df["PULocationID"].isin([132, 161, 237]), 300.0, 40.0)
+    hora = 1.0 + np.sin(df["pickup_hour"].to_numpy() / 24 * 2 * np.pi) * 0.8
+    df["trips_count"] = np.maximum(1, base * hora * rng.lognormal(0, 0.3, n)).astype(np.int32)
+    df["avg_trip_distance"] = rng.gamma(2.0, 1.5, n)
+    df["avg_trip_duration_min"] = df["avg_trip_distance"] * 4 + rng.normal(0, 2, n)
+    df["avg_total_amount"] = 3 + df["avg_trip_distance"] * 3.5 + rng.normal(0, 1, n)
+    df["trip_date"] = df["trip_date"].dt.date
+    df = df.astype({"pickup_hour": np.int32, "PULocationID": np.int32})
+
+    destino = carpeta / f"trip_month={mes}"
+    destino.mkdir(parents=True)
+    df.to_parquet(destino / "part-0.parquet", index=False)
+
+
+def correr(cwd: Path, *args):
+    subprocess.run([sys.executable, str(RAIZ / "ols_streaming.py"), "--features-parquet", "features", *args],
+                   cwd=cwd, check=True, capture_output=True, text=True)
+
+
+@pytest.mark.parametrize("chunk_rows", [97, 5_000])
+def test_ecuaciones_normales_igual_a_linear_regression(tmp_path, monkeypatch, chunk_rows):
+    """resolver (sumas por lote) = train_model.entrenar con todas las filas en memoria, sin importar el lote."""
+    monkeypatch.chdir(tmp_path)  # verificar lee con train_model.leer_features, que deja caché en artifacts/
+    rng = np.random.default_rng(5)
+    fuente = tmp_path / "features"
+    for mes in MESES:
+        escribir_mes(fuente, mes, rng)
+
+    por_mes, _ = ols.acumular(ols.tm.iterar_lotes_parquet(str(fuente), chunk_rows=chunk_rows), guardar_test=False)
+    assert sorted(por_mes) == MESES
+    train, test = ols.sumar_meses(por_mes)
+    categorias = ols.zonas_del_modelo(train, test)
+    assert categorias.tolist() == ZONAS
+    model = ols.resolver(train, categorias)
+    assert ols.verificar(model, categorias, str(fuente))
+
+
+def test_incremental_igual_a_reentrenar_todo(tmp_path, monkeypatch):
+    rng = np.random.default_rng(7)
+    fuente = tmp_path / "features"
+    for mes in MESES[:2]:
+        escribir_mes(fuente, mes, rng)
+
+    # 1) Primera corrida: lee los dos meses (set de test completo)
+    correr(tmp_path, "--incremental")
+    # 2) Llega un mes nuevo: solo se lee ese mes, el resto sale de las estadísticas guardadas
+    escribir_mes(fuente, MESES[2], rng)
+    correr(tmp_path, "--incremental")
+    # 3) Sin meses nuevos: no entrena ni registra otra corrida
+    correr(tmp_path, "--incremental")
+
+    monkeypatch.chdir(tmp_path)
+    corridas = registro.listar()
+    assert len(corridas) == 2
+    carpetas = registro.carpetas()
+    # Las filas de test en memoria eran solo las del mes nuevo: la corrida queda sin set de test (y lo dice)
+    assert carpetas["test"] is None
+    assert "sin set de test completo" in carpetas["nota"]
+
+    # El modelo de las estadísticas = LinearRegression en memoria sobre TODAS las filas (mismo split)
+    model = artefactos.cargar_modelo(carpetas["modelo"])
+    assert ols.verificar(model, np.array(ZONAS), str(fuente))
+
+    # Una corrida completa da el mismo modelo, pero sí guarda el set de test: se registra
+    correr(tmp_path)
+    assert len(registro.listar()) == 3
+    assert registro.carpetas()["test"] is not None
+    assert registro.carpetas()["modelo"] == carpetas["modelo"]
+
+
+def test_otro_modo_sin_cambios_no_registra(tmp_path, monkeypatch):
+    rng = np.random.default_rng(11)
+    for mes in MESES:
+        escribir_mes(tmp_path / "features", mes, rng)
+
+    # Mismos meses y misma configuración: el modo no cambia el modelo, así que no hay corrida nueva
+    correr(tmp_path, "--incremental")
+    correr(tmp_path, "--solo-stats")
+    correr(tmp_path)
+
+    monkeypatch.chdir(tmp_path)
+    corridas = registro.listar()
+    assert len(corridas) == 1
+    # La corrida leyó todos los meses: su set de test es el completo
+    assert registro.carpetas(corridas["run_id"].iloc[0])["test"] is not None
+    assert registro.obtener_corrida()["params"]["modo"] == "incremental"
+
+
+def test_corrida_ya_registrada_no_toca_las_estadisticas(tmp_path, monkeypatch):
+    rng = np.random.default_rng(3)
+    fuente = tmp_path / "features"
+    for mes in MESES[:2]:
+        escribir_mes(fuente, mes, rng)
+    correr(tmp_path, "--incremental")
+    escribir_mes(fuente, MESES[2], rng)
+    correr(tmp_path, "--incremental")
+
+    # Se quita el mes nuevo de la fuente: el modelo vuelve a ser el de la primera corrida (se salta)...
+    stats = tmp_path / ols.STATS_DIR / f"mes={MESES[2]}.npz"
+    shutil.rmtree(fuente / f"trip_month={MESES[2]}")
+    correr(tmp_path, "--incremental")
+
+    monkeypatch.chdir(tmp_path)
+    assert len(registro.listar()) == 2
+    # ... y como no se guardó nada, su archivo de estadísticas sigue ahí
+    assert stats.exists()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,48 @@
+"""
+Chequeos automáticos de stream_to_sqlserver.py que no necesitan SQL Server ni red.
+
+Correr desde la raíz del proyecto:  python -m pytest tests
+(importa load_parquet_to_sqlserver.py, que usa pyodbc: si no está disponible, se saltan)
+"""
+
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+RAIZ = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(RAIZ))
+
+pytest.importorskip("pyodbc", exc_type=ImportError)
+import stream_to_sqlserver as stream  # noqa: E402
+
+
+class Remoto:
+    """Lo único que planear_remoto usa de ArchivoHTTP: tamaño y Last-Modified del HEAD."""
+    size = 1000
+    last_modified = "Wed, 01 May 2024 10:00:00 GMT"
+
+
+def manifiesto(content_hash):
+    return {"m.parquet": {"file_size": 1000, "file_mtime": datetime(2024, 1, 1), "content_hash": content_hash,
+                          "row_count": 50, "status": "OK", "rows_committed": 0}}
+
+
+def test_mes_cargado_desde_disco_se_adopta_si_coinciden_las_filas():
+    m = manifiesto("sha256-del-archivo-local")
+    assert stream.planear_remoto("m.parquet", Remoto(), m)["accion"] == "recargar"  # sin footer no se sabe
+    assert stream.planear_remoto("m.parquet", Remoto(), m, num_rows=50)["accion"] == "saltar"
+    assert stream.planear_remoto("m.parquet", Remoto(), m, num_rows=51)["accion"] == "recargar"
+
+
+def test_mes_cargado_desde_la_web_y_republicado_se_recarga():
+    # Mismo tamaño y mismas filas, pero otro Last-Modified: TLC corrigió valores
+    m = manifiesto(None)
+    assert stream.planear_remoto("m.parquet", Remoto(), m, num_rows=50)["accion"] == "recargar"
+
+
+def test_mes_sin_cambios_se_salta_con_el_head():
+    m = manifiesto(None)
+    m["m.parquet"]["file_mtime"] = datetime(2024, 5, 1, 10, 0, 0)
+    assert stream.planear_remoto("m.parquet", Remoto(), m)["accion"] == "saltar"
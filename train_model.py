@@ -1,13 +1,22 @@
-
-
+import argparse
+import hashlib
+import json
 import os
+import time
+import tracemalloc
+from pathlib import Path
 import pandas as pd
 import numpy as np
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from scipy import sparse
 from sqlalchemy import create_engine
 
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LinearRegression
-import joblib
+
+import artefactos
+import registro
 
 # ==========================================================
 # OBJETIVO GENERAL DEL SCRIPT
@@ -30,18 +39,31 @@ DB = "TaxiML"
 USER = "usuario"
 PWD = "clave"
 
-# create_engine crea un "motor" (engine) para conectarse a SQL usando SQLAlchemy.
-# mssql+pyodbc indica que hablamos con SQL Server usando el driver ODBC.
-engine = create_engine(
-    f"mssql+pyodbc://{USER}:{PWD}@{SERVER}/{DB}?driver=ODBC+Driver+17+for+SQL+Server"
-)
+# Alternativa SIN base de datos: el dataset parquet que deja build_features_parquet.py
+# (mismas columnas y mismos valores que feat.features_hour_zone). Se usa con --features-parquet.
+FEATURES_PARQUET = r"data\feat\features_hour_zone"
+
+
+def crear_engine():
+    # create_engine crea un "motor" (engine) para conectarse a SQL usando SQLAlchemy.
+    # mssql+pyodbc indica que hablamos con SQL Server usando el driver ODBC.
+    # (Va dentro de una función: así con --features-parquet ni se intenta conectar.)
+    return create_engine(
+        f"mssql+pyodbc://{USER}:{PWD}@{SERVER}/{DB}?driver=ODBC+Driver+17+for+SQL+Server"
+    )
 
 
 # =========================
-# 2) Leer FEAT desde SQL
+# 2) Leer FEAT (desde SQL o desde parquet)
 # =========================
 # Este query trae un dataset ya "procesado" (features) desde la capa feat.
 # Cada fila representa una combinación (fecha + hora + zona) con variables agregadas.
+#
+# ORDER BY: el split train/test (random_state=42) depende del orden de las filas.
+# Sin ORDER BY, SQL Server puede devolverlas en cualquier orden y el split cambia entre corridas;
+# con el mismo orden que usa la lectura parquet, las dos fuentes dan el mismo modelo.
+#
+# (Esta es la lectura "de siempre" con pd.read_sql. Se deja para comparar con --comparar-lectura.)
 query = """
 SELECT
   trip_date,
@@ -52,151 +74,652 @@ SELECT
   avg_trip_duration_min,
   avg_total_amount
 FROM feat.features_hour_zone
+ORDER BY trip_date, pickup_hour, PULocationID
 """
 
-# pd.read_sql ejecuta el query y lo trae como un DataFrame (tabla en memoria).
-df = pd.read_sql(query, engine)
+# ----------------------------------------------------------
+# Lectura por lotes con tipos compactos (la que se usa por defecto)
+# ----------------------------------------------------------
+# pd.read_sql pasa por SQLAlchemy fila por fila, arma columnas de objetos de Python
+# (date, Decimal, int...) y recién al final pandas adivina los tipos. Con varios años de datos
+# es lo más lento del entrenamiento y usa varias veces la memoria del DataFrame final.
+#
+# Aquí:
+# - se piden las filas por lotes (fetchmany) y cada lote se convierte de una vez a arrays de numpy
+#   con el tipo final (los objetos de Python del lote se liberan antes de pedir el siguiente)
+# - la fecha llega como número de días desde 1970 (DATEDIFF) y la duración como FLOAT:
+#   así pyodbc no crea objetos date / Decimal
+# - tipos chicos: hora y zona caben en int16, los promedios en float32
+#   (float32 guarda ~7 dígitos: sobra para promedios de millas, minutos y dólares)
+query_lotes = """
+SELECT
+  DATEDIFF(DAY, '19700101', trip_date) AS trip_day,
+  pickup_hour,
+  PULocationID,
+  trips_count,
+  avg_trip_distance,
+  CAST(avg_trip_duration_min AS FLOAT) AS avg_trip_duration_min,
+  avg_total_amount
+FROM feat.features_hour_zone
+{where}
+ORDER BY trip_date, pickup_hour, PULocationID
+"""
 
-print("Filas leídas:", len(df))
+# Tipo de cada columna en memoria (trip_date va aparte: datetime64)
+TIPOS_FEATURES = {
+    "pickup_hour": np.int16,
+    "PULocationID": np.int16,
+    "trips_count": np.int32,
+    "avg_trip_distance": np.float32,
+    "avg_trip_duration_min": np.float32,
+    "avg_total_amount": np.float32,
+}
+
+# Filas por lote al leer de SQL Server
+CHUNK_ROWS = 200_000
+
+# Copia local de lo leído (parquet): la segunda corrida no vuelve a pedir nada a SQL Server
+CACHE_DIR = os.path.join("artifacts", "cache")
+
+
+def filtro_fechas(desde=None, hasta=None):
+    """WHERE por rango de fechas (ambas incluidas) y sus parámetros."""
+    condiciones, params = [], []
+    if desde:
+        condiciones.append("trip_date >= ?")
+        params.append(desde)
+    if hasta:
+        condiciones.append("trip_date <= ?")
+        params.append(hasta)
+    return ("WHERE " + " AND ".join(condiciones)) if condiciones else "", params
+
+
+def compactar(df: pd.DataFrame) -> pd.DataFrame:
+    """Deja las columnas con los tipos de TIPOS_FEATURES y trip_date como fecha (datetime64)."""
+    # datetime64[s]: la misma unidad venga de SQL, del dataset parquet o de la caché
+    df["trip_date"] = pd.to_datetime(df["trip_date"]).astype("datetime64[s]")
+    return df.astype(TIPOS_FEATURES)
+
+
+def leer_features_read_sql(engine) -> pd.DataFrame:
+    """La lectura original: todo de una con pd.read_sql (tipos que adivina pandas)."""
+    # pd.read_sql ejecuta el query y lo trae como un DataFrame (tabla en memoria).
+    return pd.read_sql(query, engine)
+
+
+def lote_a_df(columnas: list) -> pd.DataFrame:
+    """Columnas de un lote (trip_day + TIPOS_FEATURES, como arrays de numpy) -> DataFrame con trip_date."""
+    df = pd.DataFrame(dict(zip(TIPOS_FEATURES, columnas[1:])))
+    df.insert(0, "trip_date", columnas[0].astype("datetime64[D]").astype("datetime64[s]"))
+    return df
+
+
+def iterar_lotes_sql(engine, desde=None, hasta=None, chunk_rows=CHUNK_ROWS):
+    """
+    Genera la tabla feat.features_hour_zone de a un lote (DataFrame con tipos compactos) a la vez.
+    Solo hay un lote en memoria: sirve para procesar años de datos sin cargarlos completos.
+    """
+    where, params = filtro_fechas(desde, hasta)
+    tipos = [np.int32] + list(TIPOS_FEATURES.values())
+
+    # raw_connection: la conexión pyodbc que está debajo de SQLAlchemy (sin su capa fila por fila)
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(query_lotes.format(where=where), *params)
+        while True:
+            filas = cur.fetchmany(chunk_rows)
+            if not filas:
+                break
+            # zip(*filas): de una lista de filas a una tupla de valores por columna
+            yield lote_a_df([np.array(valores, dtype=tipo) for valores, tipo in zip(zip(*filas), tipos)])
+    finally:
+        conn.close()
+
+
+def leer_features_por_lotes(engine, desde=None, hasta=None, chunk_rows=CHUNK_ROWS) -> pd.DataFrame:
+    """Lee feat.features_hour_zone por lotes, directo a arrays de numpy con tipos compactos."""
+    partes = list(iterar_lotes_sql(engine, desde, hasta, chunk_rows))
+    if not partes:
+        return lote_a_df([np.array([], dtype=np.int32)] + [np.array([], dtype=t) for t in TIPOS_FEATURES.values()])
+    return pd.concat(partes, ignore_index=True)
+
+
+COLUMNAS_FEATURES = ["trip_date", "pickup_hour", "PULocationID", "trips_count",
+                     "avg_trip_distance", "avg_trip_duration_min", "avg_total_amount"]
+
+
+def filtros_parquet(desde=None, hasta=None):
+    """Filtro de fechas en el formato de pyarrow (None = sin filtro)."""
+    filtros = []
+    if desde:
+        filtros.append(("trip_date", ">=", pd.Timestamp(desde).date()))
+    if hasta:
+        filtros.append(("trip_date", "<=", pd.Timestamp(hasta).date()))
+    return filtros or None
+
+
+def leer_features_parquet(features_parquet, desde=None, hasta=None) -> pd.DataFrame:
+    """
+    Dataset de build_features_parquet.py (una carpeta por mes), sin base de datos.
+    Se ordena igual que el ORDER BY del query para que el split sea el mismo.
+    """
+    df = pd.read_parquet(features_parquet, columns=COLUMNAS_FEATURES, filters=filtros_parquet(desde, hasta))
+    df = compactar(df)
+    return df.sort_values(["trip_date", "pickup_hour", "PULocationID"], ignore_index=True)
+
+
+def iterar_lotes_parquet(features_parquet, desde=None, hasta=None, chunk_rows=CHUNK_ROWS):
+    """
+    Igual que iterar_lotes_sql pero desde el dataset parquet (de a un row group / lote por vez).
+    Los lotes salen en el orden de los archivos, no en el del ORDER BY.
+    """
+    filtros = filtros_parquet(desde, hasta)
+    dataset = ds.dataset(features_parquet, format="parquet", partitioning="hive")
+    for lote in dataset.to_batches(columns=COLUMNAS_FEATURES, batch_size=chunk_rows,
+                                   filter=pq.filters_to_expression(filtros) if filtros else None):
+        if lote.num_rows:
+            yield compactar(lote.to_pandas())
 
-# Convertimos trip_date a tipo fecha real (datetime).
-df["trip_date"] = pd.to_datetime(df["trip_date"])
 
-# Creamos variables derivadas de la fecha:
-# - day_of_week: 0=lunes ... 6=domingo (número de día de semana)
-# - month: número de mes (1..12)
-# - day_of_month: día del mes (1..31)
-df["day_of_week"] = df["trip_date"].dt.dayofweek
-df["month"] = df["trip_date"].dt.month
-df["day_of_month"] = df["trip_date"].dt.day
+# ----------------------------------------------------------
+# Caché local con invalidación
+# ----------------------------------------------------------
+# Cada archivo de caché (parquet) tiene al lado un .json con la "versión" de la fuente cuando se guardó:
+# - SQL Server: filas, fecha máxima y checksum del rango pedido + último refresco de capas (curated.refresh_log).
+#   El checksum lo calcula SQL Server sin mandar filas: detecta también cambios que no mueven el conteo
+#   (ej: un mes recargado con valores corregidos, o feat reconstruida con la sección 03 del .sql)
+# - parquet: nombre / tamaño / fecha de cada archivo del dataset
+# Si la versión no cambió -> se usa la caché (una consulta chiquita en vez de bajar toda la tabla).
+# Si cambió en SQL Server -> se revisa si lo viejo sigue igual (huella de las filas ANTES de la última
+# fecha guardada). Si sí: solo se bajan las fechas nuevas (desde la última fecha, que pudo quedar a medias)
+# y se pegan a la caché. Si no (ej: se recargó un mes viejo): se vuelve a leer todo.
+
+def ruta_cache(features_parquet=None, desde=None, hasta=None) -> str:
+    """Un archivo de caché por fuente + rango de fechas (si cambia el query, cambia el nombre)."""
+    fuente = os.path.abspath(features_parquet) if features_parquet else query_lotes
+    clave = hashlib.sha256(f"{fuente}|{desde}|{hasta}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, f"features_hour_zone_{clave}.parquet")
+
+
+def leer_meta_cache(cache: str):
+    """El .json de la caché, o None si no hay caché (o está incompleta)."""
+    if not (os.path.exists(cache) and os.path.exists(cache + ".json")):
+        return None
+    with open(cache + ".json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def guardar_cache(df: pd.DataFrame, cache: str, meta: dict):
+    """Primero el parquet y luego el .json (cada uno con .tmp + os.replace): nunca queda un .json de otra versión."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    if os.path.exists(cache + ".json"):
+        os.remove(cache + ".json")
+    df.to_parquet(cache + ".tmp", index=False)
+    os.replace(cache + ".tmp", cache)
+    with open(cache + ".json.tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(cache + ".json.tmp", cache + ".json")
+
+
+# Checksum de las filas de feat (mismas columnas que se leen)
+CHECKSUM_FEAT = """CHECKSUM_AGG(BINARY_CHECKSUM(trip_date, pickup_hour, PULocationID, trips_count,
+                                  avg_trip_distance, avg_trip_duration_min, avg_total_amount))"""
+
+
+def version_sql(cur, desde=None, hasta=None) -> dict:
+    """
+    Versión de la fuente en una consulta que no manda filas: conteo, fecha máxima y checksum del rango,
+    más el último refresco de curated/feat (si existe la bitácora de refresh_layers.py).
+    """
+    where, params = filtro_fechas(desde, hasta)
+    filas, max_dia, checksum = cur.execute(f"""
+    SELECT COUNT_BIG(*), DATEDIFF(DAY, '19700101', MAX(trip_date)), {CHECKSUM_FEAT}
+    FROM feat.features_hour_zone
+    {where}
+    """, *params).fetchone()
+    refresco = None
+    if cur.execute("SELECT OBJECT_ID('curated.refresh_log', 'U')").fetchone()[0] is not None:
+        refresco = cur.execute("SELECT MAX(refreshed_at) FROM curated.refresh_log").fetchone()[0]
+    return {"filas": int(filas), "max_dia": max_dia, "checksum": checksum,
+            "refresco": str(refresco) if refresco is not None else None}
+
+
+def huella_antes_de(cur, dia: int, desde=None, hasta=None) -> list:
+    """
+    [filas, checksum] de las filas del rango con trip_date ANTES del día `dia` (días desde 1970).
+    CHECKSUM_AGG(BINARY_CHECKSUM(...)) lo calcula SQL Server sin mandar las filas.
+    """
+    where, params = filtro_fechas(desde, hasta)
+    where = (where + " AND " if where else "WHERE ") + "trip_date < DATEADD(DAY, ?, '19700101')"
+    filas, checksum = cur.execute(f"""
+    SELECT COUNT_BIG(*), {CHECKSUM_FEAT}
+    FROM feat.features_hour_zone
+    {where}
+    """, *params, dia).fetchone()
+    return [int(filas), checksum]
+
+
+def leer_features_sql_con_cache(cache: str, desde=None, hasta=None, usar_cache=True, refrescar_cache=False):
+    """Lectura desde SQL Server usando (y manteniendo) la caché. Retorna (df, cómo se obtuvo)."""
+    engine = crear_engine()
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        version = version_sql(cur, desde, hasta)
+        meta = leer_meta_cache(cache) if usar_cache and not refrescar_cache else None
+
+        if meta and meta["version"] == version:
+            return compactar(pd.read_parquet(cache)), "caché (sin cambios en la fuente)"
+
+        df, modo = None, "completa"
+        if meta and meta["version"]["max_dia"] is not None and version["max_dia"] is not None \
+                and version["max_dia"] >= meta["version"]["max_dia"] \
+                and huella_antes_de(cur, meta["version"]["max_dia"], desde, hasta) == meta["huella_antes_max"]:
+            # Lo viejo está igual: se conserva y se bajan solo las fechas desde la última guardada
+            corte = np.datetime64(meta["version"]["max_dia"], "D")
+            viejo = compactar(pd.read_parquet(cache))
+            viejo = viejo[viejo["trip_date"] < corte]
+            desde_nuevo = str(corte) if not desde or str(corte) > desde else desde
+            nuevo = leer_features_por_lotes(engine, desde_nuevo, hasta)
+            df = pd.concat([viejo, nuevo], ignore_index=True)
+            modo = f"caché + incremental ({len(nuevo):,} filas desde {corte})"
+        else:
+            df = leer_features_por_lotes(engine, desde, hasta)
+
+        if usar_cache:
+            # La versión se vuelve a pedir al final: si la tabla cambió mientras leíamos,
+            # la próxima corrida no va a coincidir y vuelve a revisar
+            version = version_sql(cur, desde, hasta)
+            huella = huella_antes_de(cur, version["max_dia"], desde, hasta) if version["max_dia"] is not None else None
+            guardar_cache(df, cache, {"version": version, "huella_antes_max": huella,
+                                      "guardado": time.strftime("%Y-%m-%d %H:%M:%S")})
+        return df, modo
+    finally:
+        conn.close()
+
+
+def version_parquet(features_parquet) -> dict:
+    """Versión de un dataset parquet: cada archivo con su tamaño y fecha de modificación."""
+    archivos = sorted(str(p) for p in Path(features_parquet).rglob("*.parquet"))
+    firma = "\n".join(f"{a}|{os.path.getsize(a)}|{os.stat(a).st_mtime_ns}" for a in archivos)
+    return {"archivos": len(archivos), "firma": hashlib.sha256(firma.encode("utf-8")).hexdigest()}
+
+
+def version_fuente(features_parquet=None, desde=None, hasta=None) -> dict:
+    """Versión de las features que se van a leer (la del registro de corridas, sin leer filas)."""
+    if features_parquet:
+        return version_parquet(features_parquet)
+    conn = crear_engine().raw_connection()
+    try:
+        return version_sql(conn.cursor(), desde, hasta)
+    finally:
+        conn.close()
+
+
+def leer_features(features_parquet=None, desde=None, hasta=None, usar_cache=True, refrescar_cache=False) -> pd.DataFrame:
+    t0 = time.perf_counter()
+    cache = ruta_cache(features_parquet, desde, hasta)
+    if features_parquet:
+        version = version_parquet(features_parquet)
+        meta = leer_meta_cache(cache) if usar_cache and not refrescar_cache else None
+        if meta and meta["version"] == version:
+            df, modo = compactar(pd.read_parquet(cache)), "caché (sin cambios en la fuente)"
+        else:
+            df, modo = leer_features_parquet(features_parquet, desde, hasta), "completa"
+            if usar_cache:
+                guardar_cache(df, cache, {"version": version, "guardado": time.strftime("%Y-%m-%d %H:%M:%S")})
+    else:
+        df, modo = leer_features_sql_con_cache(cache, desde, hasta, usar_cache, refrescar_cache)
+
+    print(f"Filas leídas: {len(df)} | lectura: {modo} | {time.perf_counter() - t0:.1f}s")
+    print(f"Memoria del DataFrame: {df.memory_usage(deep=True).sum() / 1e6:.1f} MB")
+
+    # Creamos variables derivadas de la fecha:
+    # - day_of_week: 0=lunes ... 6=domingo (número de día de semana)
+    # - month: número de mes (1..12)
+    # - day_of_month: día del mes (1..31)
+    # (int8: caben de sobra y ocupan 1 byte por fila)
+    return agregar_calendario(df)
+
+
+def agregar_calendario(df: pd.DataFrame) -> pd.DataFrame:
+    df["day_of_week"] = df["trip_date"].dt.dayofweek.astype(np.int8)
+    df["month"] = df["trip_date"].dt.month.astype(np.int8)
+    df["day_of_month"] = df["trip_date"].dt.day.astype(np.int8)
+    return df
+
+
+def medir_lectura(nombre: str, leer) -> dict:
+    """
+    Corre una lectura dos veces:
+    - una para el tiempo (sin medir memoria: tracemalloc hace más lento el código Python)
+    - otra con tracemalloc para el pico de memoria (numpy y pandas registran sus arrays en tracemalloc)
+    """
+    t0 = time.perf_counter()
+    df = leer()
+    segundos = time.perf_counter() - t0
+    filas, mb_df = len(df), df.memory_usage(deep=True).sum() / 1e6
+    del df
+
+    tracemalloc.start()
+    df = leer()
+    pico = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return {"lectura": nombre, "filas": filas, "segundos": segundos, "pico_mb": pico, "df_mb": mb_df}
+
+
+def comparar_lecturas(desde=None, hasta=None):
+    """pd.read_sql (la de siempre) vs lectura por lotes con tipos compactos: tiempo y memoria."""
+    engine = crear_engine()
+    resultados = [
+        medir_lectura("pd.read_sql", lambda: leer_features_read_sql(engine)),
+        medir_lectura("por lotes + tipos compactos", lambda: leer_features_por_lotes(engine, desde, hasta)),
+    ]
+    print(f"{'lectura':<28} {'filas':>12} {'seg':>8} {'pico MB':>9} {'DataFrame MB':>13}")
+    for r in resultados:
+        print(f"{r['lectura']:<28} {r['filas']:>12,} {r['segundos']:>8.1f} {r['pico_mb']:>9.1f} {r['df_mb']:>13.1f}")
+    if desde or hasta:
+        print("(pd.read_sql lee la tabla completa; la lectura por lotes, solo el rango de fechas)")
 
 
 # =========================
 # 3) Definir y (objetivo) y X (features)
 # =========================
-# y_real: es el conteo real de viajes.
-y_real = df["trips_count"].astype(float)
-
-# y_log: es una versión transformada para entrenar mejor.
-# np.log1p(y_real) = log(1 + y_real)
-# ¿Por qué se usa?
-# - Si hay valores muy altos (picos), el modelo puede sesgarse.
-# - El log "comprime" esos picos, haciendo el entrenamiento más estable.
-y_log = np.log1p(y_real)
-
-# X: variables de entrada del modelo.
-# Son las columnas que el modelo va a usar para predecir y.
-X = df[[
-  "pickup_hour",
-  "day_of_week",
-  "month",
-  "day_of_month",
-  "avg_trip_distance",
-  "avg_trip_duration_min",
-  "avg_total_amount"
-]].copy()
-
-# ----------------------------------------------------------
-# PULocationID como categórica -> one-hot encoding (get_dummies)
-# ----------------------------------------------------------
-# PULocationID es una "zona" (categoría). Un modelo lineal no entiende bien
-# categorías como números, porque "zona 100" no significa "más" que "zona 10".
-#
-# Por eso se convierte a columnas binarias 0/1:
-# - PULocationID_10, PULocationID_11, PULocationID_12, ...
-# Cada fila tendrá 1 en la columna que corresponde a su zona, y 0 en las demás.
-#
-# pd.get_dummies hace esa transformación automáticamente.
-#
-# drop_first=True:
-# - Se elimina una categoría para evitar multicolinealidad perfecta
-#   (el famoso "dummy variable trap") en modelos lineales.
-X = pd.get_dummies(
-    X.join(df["PULocationID"].astype("int").astype("category")),
-    columns=["PULocationID"],
-    drop_first=True
-)
-
-print("Columnas X:", X.shape[1])
+# Variables numéricas del modelo (van antes de las columnas de zona)
+COLUMNAS_NUMERICAS = [
+    "pickup_hour",
+    "day_of_week",
+    "month",
+    "day_of_month",
+    "avg_trip_distance",
+    "avg_trip_duration_min",
+    "avg_total_amount",
+]
+
+
+def one_hot_zonas(zonas: np.ndarray, categorias=None):
+    """
+    One-hot de PULocationID como matriz dispersa CSR (solo se guardan los 1).
+    Mismo resultado que pd.get_dummies(..., drop_first=True): una columna por zona
+    (ordenadas de menor a mayor), sin la primera. Retorna (matriz, nombres de columnas).
+    `categorias`: todas las zonas del modelo (por defecto, las que aparecen en `zonas`).
+    """
+    categorias = np.unique(zonas) if categorias is None else np.asarray(categorias)
+    # índice de la zona de cada fila dentro de `categorias` (0 = la zona que se elimina)
+    codigo = np.searchsorted(categorias, zonas)
+    filas = np.flatnonzero(codigo > 0)
+    matriz = sparse.csr_matrix(
+        (np.ones(len(filas)), (filas, codigo[filas] - 1)),
+        shape=(len(zonas), len(categorias) - 1),
+    )
+    return matriz, [f"PULocationID_{z}" for z in categorias[1:]]
+
+
+def preparar_xy(df: pd.DataFrame, categorias=None):
+    # y_real: es el conteo real de viajes.
+    y_real = df["trips_count"].astype(float)
+
+    # y_log: es una versión transformada para entrenar mejor.
+    # np.log1p(y_real) = log(1 + y_real)
+    # ¿Por qué se usa?
+    # - Si hay valores muy altos (picos), el modelo puede sesgarse.
+    # - El log "comprime" esos picos, haciendo el entrenamiento más estable.
+    y_log = np.log1p(y_real)
+
+    # X: variables de entrada del modelo.
+    # Son las columnas que el modelo va a usar para predecir y.
+    numericas = df[COLUMNAS_NUMERICAS].to_numpy(np.float64)
+    # float64: en memoria las features van compactas (int16 / float32), pero el modelo
+    # se ajusta en float64 (si le llegan float32, sklearn resolvería los mínimos cuadrados en float32)
+
+    # ----------------------------------------------------------
+    # PULocationID como categórica -> one-hot encoding (matriz dispersa)
+    # ----------------------------------------------------------
+    # PULocationID es una "zona" (categoría). Un modelo lineal no entiende bien
+    # categorías como números, porque "zona 100" no significa "más" que "zona 10".
+    #
+    # Por eso se convierte a columnas binarias 0/1:
+    # - PULocationID_10, PULocationID_11, PULocationID_12, ...
+    # Cada fila tendrá 1 en la columna que corresponde a su zona, y 0 en las demás.
+    #
+    # drop_first: se elimina una categoría para evitar multicolinealidad perfecta
+    # (el famoso "dummy variable trap") en modelos lineales.
+    #
+    # Antes se hacía con pd.get_dummies: ~260 columnas densas por fila, casi todas 0
+    # (sklearn las pasa a float64: ~2 KB por fila). En formato CSR solo se guardan
+    # los valores distintos de 0: las 7 numéricas + un 1 por fila (~100 bytes por fila).
+    zonas, columnas_zona = one_hot_zonas(df["PULocationID"].to_numpy(), categorias)
+    X = sparse.hstack([sparse.csr_matrix(numericas), zonas], format="csr")
+    columnas = COLUMNAS_NUMERICAS + columnas_zona
+
+    print("Columnas X:", X.shape[1], f"| valores guardados (CSR): {X.nnz:,}")
+    return X, columnas, y_log, y_real
 
 
 # =========================
 # 4) Split Train/Test
 # =========================
-# train_test_split divide datos en:
-# - train: para entrenar
-# - test : para evaluar
-#
-# test_size=0.2 -> 20% test, 80% train
-# random_state=42 -> hace la separación reproducible (si corres el script,
-# queda el mismo split)
-#
-# Aquí se pasan 3 "objetivos" a la vez: X, y_log, y_real.
-# sklearn los separa con el MISMO corte, para que:
-# - y_log y y_real sigan alineados fila a fila con X_train / X_test.
-X_train, X_test, y_train_log, y_test_log, y_train_real, y_test_real = train_test_split(
-    X, y_log, y_real, test_size=0.2, random_state=42
-)
-
-print("Train:", X_train.shape, "Test:", X_test.shape)
+def dividir(X, y_log, y_real):
+    # train_test_split divide datos en:
+    # - train: para entrenar
+    # - test : para evaluar
+    #
+    # test_size=0.2 -> 20% test, 80% train
+    # random_state=42 -> hace la separación reproducible (si corres el script,
+    # queda el mismo split)
+    #
+    # Aquí se pasan 3 "objetivos" a la vez: X, y_log, y_real.
+    # sklearn los separa con el MISMO corte, para que:
+    # - y_log y y_real sigan alineados fila a fila con X_train / X_test.
+    X_train, X_test, y_train_log, y_test_log, y_train_real, y_test_real = train_test_split(
+        X, y_log, y_real, test_size=0.2, random_state=42
+    )
+
+    print("Train:", X_train.shape, "Test:", X_test.shape)
+    return X_train, X_test, y_train_log, y_test_log, y_train_real, y_test_real
 
 
 # =========================
 # 5) Entrenar modelo con "pesos" (sample_weight)
 # =========================
-# sample_weight permite decirle al modelo:
-# "estas filas importan más que estas otras".
-#
-# La idea aquí: darle más importancia a casos con conteos altos (picos),
-# para que el modelo aprenda mejor esos escenarios.
-#
-# OJO: tú entrenas con y_train_log (log), pero los pesos se basan en y_train_real (real).
-# Esto tiene sentido si lo que quieres es "priorizar picos reales".
-
-# Creamos un vector de pesos del mismo tamaño que y_train_real.
-# Por defecto todas las filas pesan 1.
-weights = np.ones(len(y_train_real), dtype=float)
+# Tolerancia del solver LSQR que usa LinearRegression con matrices dispersas
+# (con el valor por defecto, 1e-6, la diferencia con la solución densa es unas 100 veces mayor)
+TOL_LSQR = 1e-10
 
-# Marcamos casos "altos" y "pico" según umbrales.
+# Pesos por conteo real: (umbral, peso). Se aplican en orden, así que el último que se cumple gana.
 # - Si trips_count > 200 -> peso mayor
 # - Si trips_count > 500 -> peso aún mayor (sobrescribe el anterior)
-weights[y_train_real > 200] = 3.0
-weights[y_train_real > 500] = 8.0
-
-
-# OPCIÓN A: Ajustar prints a 3 y 8
-# OPCIÓN B: Ajustar pesos a 5 y 10 (si eso era lo planeado)
-print("Weights resumen:")
-print(" - peso=1  (normal):", int((weights == 1).sum()))
-print(" - peso=3  (alto):  ", int((weights == 3).sum()))
-print(" - peso=8  (pico):  ", int((weights == 8).sum()))
-
-# Entrenamos el modelo lineal.
-# Aprende a predecir y_train_log a partir de X_train, usando weights.
-model = LinearRegression()
-model.fit(X_train, y_train_log, sample_weight=weights)
+PESOS = [(200, 3.0), (500, 8.0)]
+
+
+def calcular_pesos(y_real, pesos=None) -> np.ndarray:
+    """Un peso por fila: 1 por defecto y los de `pesos` (por defecto PESOS) para los casos "altos" y "pico"."""
+    # Creamos un vector de pesos del mismo tamaño que y_real.
+    # Por defecto todas las filas pesan 1.
+    y_real = np.asarray(y_real)
+    weights = np.ones(len(y_real), dtype=float)
+    for umbral, peso in (PESOS if pesos is None else pesos):
+        weights[y_real > umbral] = peso
+    return weights
+
+
+def entrenar(X_train, y_train_log, y_train_real) -> LinearRegression:
+    # sample_weight permite decirle al modelo:
+    # "estas filas importan más que estas otras".
+    #
+    # La idea aquí: darle más importancia a casos con conteos altos (picos),
+    # para que el modelo aprenda mejor esos escenarios.
+    #
+    # OJO: tú entrenas con y_train_log (log), pero los pesos se basan en y_train_real (real).
+    # Esto tiene sentido si lo que quieres es "priorizar picos reales".
+
+    weights = calcular_pesos(y_train_real)
+
+    # Para probar otros esquemas (ej: 5 y 10) sin editar el script, ver sweep_model.py
+    print("Weights resumen:")
+    print(" - peso=1  (normal):", int((weights == 1).sum()))
+    for (umbral, peso), nombre in zip(PESOS, ["alto", "pico"] + [""] * len(PESOS)):
+        print(f" - peso={peso:g}  ({nombre or f'>{umbral}'}):".ljust(20), int((weights == peso).sum()))
+
+    # Entrenamos el modelo lineal.
+    # Aprende a predecir y_train_log a partir de X_train, usando weights.
+    # Con X dispersa, sklearn resuelve los mínimos cuadrados con LSQR (iterativo) en vez de
+    # descomponer la matriz densa; con tol=TOL_LSQR las predicciones difieren de la solución densa en < 1e-6 (escala log).
+    model = LinearRegression(tol=TOL_LSQR)
+    model.fit(X_train, y_train_log, sample_weight=weights)
+    return model
+
+
+def x_denso(df: pd.DataFrame) -> pd.DataFrame:
+    """El X de antes (pd.get_dummies denso). Solo para --comparar-onehot."""
+    X = df[COLUMNAS_NUMERICAS].astype(np.float64)
+    return pd.get_dummies(
+        X.join(df["PULocationID"].astype("int").astype("category")),
+        columns=["PULocationID"],
+        drop_first=True
+    )
+
+
+def comparar_onehot(df: pd.DataFrame):
+    """
+    One-hot denso (pd.get_dummies, lo de antes) vs disperso (CSR) con las mismas filas:
+    - pico de memoria de armar X + ajustar (tracemalloc) y memoria de X
+    - segundos de ajuste (en una pasada aparte, sin tracemalloc)
+    - tamaño de X_test en disco (CSV vs npz)
+    - diferencia máxima entre las predicciones de los dos modelos
+    """
+    y_log = np.log1p(df["trips_count"].astype(float))
+    y_real = df["trips_count"].astype(float)
+    resultados, predicciones = [], {}
+    for nombre, armar in [("denso (get_dummies)", x_denso), ("disperso (CSR)", lambda d: preparar_xy(d)[0])]:
+        tracemalloc.start()
+        X = armar(df)
+        mb_x = (X.data.nbytes + X.indices.nbytes + X.indptr.nbytes if sparse.issparse(X)
+                else X.memory_usage(deep=True).sum()) / 1e6
+        X_train, X_test, y_train_log, _, y_train_real, _ = dividir(X, y_log, y_real)
+        model = entrenar(X_train, y_train_log, y_train_real)
+        pico = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+
+        t0 = time.perf_counter()
+        entrenar(X_train, y_train_log, y_train_real)
+        segundos = time.perf_counter() - t0
+
+        os.makedirs("artifacts", exist_ok=True)
+        ruta = os.path.join("artifacts", "_comparar_X_test")
+        if sparse.issparse(X_test):
+            sparse.save_npz(ruta + ".npz", X_test)
+            ruta += ".npz"
+        else:
+            X_test.to_csv(ruta + ".csv", index=False)
+            ruta += ".csv"
+        mb_disco = os.path.getsize(ruta) / 1e6
+        os.remove(ruta)
+
+        predicciones[nombre] = model.predict(X_test)
+        resultados.append((nombre, X.shape[1], mb_x, pico, segundos, mb_disco))
+        del X, X_train, X_test
+
+    print(f"{'one-hot':<22} {'columnas':>9} {'X MB':>8} {'pico MB':>9} {'ajuste seg':>11} {'X_test disco MB':>16}")
+    for nombre, cols, mb_x, pico, seg, disco in resultados:
+        print(f"{nombre:<22} {cols:>9} {mb_x:>8.1f} {pico:>9.1f} {seg:>11.2f} {disco:>16.1f}")
+    denso, disperso = predicciones.values()
+    print(f"Diferencia máxima de predicción (escala log): {np.abs(denso - disperso).max():.2e}")
 
 
 # =========================
 # 6) Guardar artefactos
 # =========================
-# Creamos carpeta artifacts/ si no existe.
-os.makedirs("artifacts", exist_ok=True)
+def parametros(args) -> dict:
+    """Lo que define el modelo además de las features (va al registro; si no cambia, no hace falta reentrenar)."""
+    return {"fuente": "parquet" if args.features_parquet else "sql", "desde": args.desde, "hasta": args.hasta,
+            "pesos": PESOS, "columnas": COLUMNAS_NUMERICAS, "test_size": 0.2, "random_state": 42,
+            "tol_lsqr": TOL_LSQR}
+
+
+def guardar_artefactos(model, X_test, columnas, y_test_real, y_test_log, huella_features, params, tiempos):
+    # Cada entrenamiento es una "corrida" del registro (ver registro.py): los artefactos se escriben
+    # en una carpeta temporal y después se guardan por contenido en artifacts/objetos/ (sin pisar los anteriores).
+    t0 = time.perf_counter()
+    tmp = registro.carpeta_temporal()
+
+    # Guardamos el modelo ya entrenado.
+    artefactos.guardar_modelo(model, tmp / "modelo")
+
+    # Guardamos X_test: las entradas que se usan para validar.
+    # Es una matriz dispersa: se guardan sus tres arrays (data / indices / indptr) como .npy,
+    # solo los valores distintos de 0 (un CSV escribiría todos los ceros de las columnas de zona).
+    # Los nombres de columnas van aparte (la matriz no los tiene).
+    # También el objetivo REAL (para evaluar en escala real) y en log (opcional, útil para debug).
+    # Todo en binario con su tipo (.npy), no CSV: validate_model.py los abre sin copiarlos (ver artefactos.py).
+    artefactos.guardar_test(X_test, columnas, y_test_real, y_test_log, tmp / "test")
+    tiempos["guardar"] = time.perf_counter() - t0
+
+    run_id = registro.registrar_corrida("train_model.py", huella_features, params, tiempos, tmp / "modelo", tmp / "test")
+    c = registro.carpetas(run_id)
+    print(f"✅ Corrida {run_id} (artifacts/registro.sqlite):")
+    print(f"- {c['modelo'].as_posix()}/   (linreg_trips_count_v2.joblib)")
+    print(f"- {c['test'].as_posix()}/   (X_test_v2/, X_test_v2_columns.json, y_test_real_v2.npy, y_test_log_v2.npy)")
+    print("  (cada carpeta con su manifest_v2.json: formato, tipo y tamaño de cada artefacto)")
+    print("Tiempos: " + " | ".join(f"{k} {v:.1f}s" for k, v in tiempos.items()))
 
-# Guardamos el modelo ya entrenado.
-joblib.dump(model, "artifacts/linreg_trips_count_v2.joblib")
 
-# Guardamos X_test: las entradas que se usan para validar.
-X_test.to_csv("artifacts/X_test_v2.csv", index=False)
-
-# Guardamos el objetivo REAL para evaluar resultados en escala real.
-y_test_real.to_csv("artifacts/y_test_real_v2.csv", index=False)
-
-# Guardamos también el objetivo en log (opcional, útil para debug).
-y_test_log.to_csv("artifacts/y_test_log_v2.csv", index=False)
-
-print("✅ Guardado:")
-print("- artifacts/linreg_trips_count_v2.joblib")
-print("- artifacts/X_test_v2.csv")
-print("- artifacts/y_test_real_v2.csv   (para validar)")
-print("- artifacts/y_test_log_v2.csv    (debug opcional)")
+# =========================
+# 7) Programa principal
+# =========================
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Entrena la regresión lineal de trips_count (FEAT -> artifacts/).")
+    parser.add_argument("--features-parquet", nargs="?", const=FEATURES_PARQUET, default=None,
+                        help=f"Leer las features del dataset parquet de build_features_parquet.py en vez de SQL Server "
+                             f"(sin ruta: {FEATURES_PARQUET})")
+    parser.add_argument("--desde", default=None, help="Solo fechas desde este día (YYYY-MM-DD, incluido)")
+    parser.add_argument("--hasta", default=None, help="Solo fechas hasta este día (YYYY-MM-DD, incluido)")
+    parser.add_argument("--sin-cache", action="store_true", help=f"No leer ni guardar la copia local en {CACHE_DIR}")
+    parser.add_argument("--refrescar-cache", action="store_true", help="Volver a leer de la fuente y reemplazar la caché")
+    parser.add_argument("--comparar-lectura", action="store_true",
+                        help="Solo comparar tiempo y memoria de pd.read_sql vs la lectura por lotes (no entrena)")
+    parser.add_argument("--comparar-onehot", action="store_true",
+                        help="Solo comparar one-hot denso (pd.get_dummies) vs disperso: memoria, ajuste y X_test en disco")
+    parser.add_argument("--forzar", action="store_true",
+                        help="Entrenar aunque ya haya una corrida con las mismas features y parámetros")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.comparar_lectura:
+        comparar_lecturas(args.desde, args.hasta)
+        return
+
+    # Si ya hay una corrida con las mismas features (misma versión de la fuente) y parámetros, el modelo sería el mismo
+    tiempos = {}
+    t0 = time.perf_counter()
+    huella_features = registro.huella(version_fuente(args.features_parquet, args.desde, args.hasta))
+    params = parametros(args)
+    anterior = registro.buscar_corrida(registro.huella_entradas(huella_features, params))
+    tiempos["version"] = time.perf_counter() - t0
+    if anterior and not args.forzar and not args.comparar_onehot:
+        print(f"Sin cambios en las features ni en los parámetros: el modelo es el de la corrida {anterior} "
+              f"(--forzar para entrenar igual)")
+        return
+
+    t0 = time.perf_counter()
+    df = leer_features(args.features_parquet, args.desde, args.hasta,
+                       usar_cache=not args.sin_cache, refrescar_cache=args.refrescar_cache)
+    tiempos["leer"] = time.perf_counter() - t0
+    if args.comparar_onehot:
+        comparar_onehot(df)
+        return
+    t0 = time.perf_counter()
+    X, columnas, y_log, y_real = preparar_xy(df)
+    X_train, X_test, y_train_log, y_test_log, y_train_real, y_test_real = dividir(X, y_log, y_real)
+    tiempos["preparar"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    model = entrenar(X_train, y_train_log, y_train_real)
+    tiempos["entrenar"] = time.perf_counter() - t0
+    guardar_artefactos(model, X_test, columnas, y_test_real, y_test_log, huella_features, params, tiempos)
+
+
+if __name__ == "__main__":
+    main()
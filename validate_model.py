@@ -13,160 +13,382 @@ Flujo de alto nivel:
 6) Emite un dictamen basado en la mejora vs baseline
 7) Evalúa desempeño por rangos (bajo/medio/alto/pico)
 8) Guarda resúmenes y resultados para comparar iteraciones
+Los pasos 2-5, 7 y 8 son UNA pasada por lotes de filas (sección 2.5): en memoria queda un lote a la vez.
 
-Entradas esperadas (en carpeta artifacts/):
+Entradas esperadas (carpetas de una corrida del registro, ver registro.py; por defecto la última):
 - linreg_trips_count_v2.joblib  -> modelo entrenado (scikit-learn)
-- X_test_v2.csv                 -> features del set de prueba
-- y_test_real_v2.csv             -> objetivo REAL (conteo) del set de prueba
+- X_test_v2/                    -> features del set de prueba (matriz dispersa CSR en .npy, ver artefactos.py)
+- X_test_v2_columns.json        -> nombres de las columnas de X_test
+- y_test_real_v2.npy            -> objetivo REAL (conteo) del set de prueba
+(Si el registro está vacío, artefactos de antes del registro: se leen de artifacts/)
 
 Salidas generadas:
-- artifacts/metrics_summary.txt       -> append de métricas para comparar iteraciones
-- artifacts/validation_results.csv    -> y_real, y_pred, abs_error por fila
+- métricas en artifacts/registro.sqlite (tabla metricas, una fila por métrica de la corrida)
+- artifacts/metrics_summary.txt       -> append de métricas para comparar iteraciones (con el run_id)
+- validation_results.parquet          -> y_real, y_pred, abs_error por fila (carpeta "resultados" de la corrida)
+
+Uso:
+- python validate_model.py                  -> valida la última corrida
+- python validate_model.py --run-id ID      -> valida otra corrida (ver: python registro.py)
+- python validate_model.py --verificar      -> compara con el cálculo de antes, todo en memoria (sklearn)
+Una corrida ya validada no se vuelve a validar (sus artefactos no cambian): se muestran sus métricas (--forzar).
 """
 
+import argparse
+import time
+
 import pandas as pd
 import numpy as np
-import joblib
 
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 
+import artefactos
+import registro
+
 
 # =========================
 # 1) Cargar modelo y datos de test
 # =========================
-# - model: objeto scikit-learn ya entrenado (LinearRegression en este caso)
-# - X_test: matriz de features del set de prueba (mismas columnas usadas en entrenamiento)
-# - y_test: objetivo REAL (conteo). Importante: NO está en log.
-model = joblib.load("artifacts/linreg_trips_count_v2.joblib")
-X_test = pd.read_csv("artifacts/X_test_v2.csv")
-
-# `squeeze("columns")` convierte un DataFrame de una sola columna en una Serie (vector 1D).
-# `astype(float)` asegura el tipo numérico para métricas.
-y_test = pd.read_csv("artifacts/y_test_real_v2.csv").squeeze("columns").astype(float)
-
-print("Tamaño X_test:", X_test.shape)
-print("Tamaño y_test:", y_test.shape)
+def cargar_artefactos(carpetas: dict):
+    """
+    Carga el modelo y el set de test de las carpetas de una corrida (registro.carpetas).
+    Retorna (model, X_test, y_test):
+    - model: objeto scikit-learn ya entrenado (LinearRegression en este caso)
+    - X_test: matriz de features del set de prueba (mismas columnas usadas en entrenamiento)
+      Se guarda dispersa (CSR): el one-hot de PULocationID es casi todo ceros y así no se escriben.
+    - y_test: objetivo REAL (conteo, array de numpy). Importante: NO está en log.
+    Los dos son .npy que se abren sin copiarlos (mmap, ver artefactos.py).
+    Si solo existen los .npz / .csv (artefactos de antes), se leen esos.
+    """
+    if carpetas["test"] is None:
+        raise SystemExit(f"La corrida {carpetas['run_id']} no tiene set de test "
+                         f"({carpetas.get('nota') or 'ols_streaming.py --sin-test'}). Valida otra con --run-id")
+    model = artefactos.cargar_modelo(carpetas["modelo"])
+    X_test, columnas, y_test = artefactos.cargar_test(carpetas["test"])
+    # Las columnas deben ser las mismas (y en el mismo orden) que al entrenar
+    if columnas is not None and (X_test.shape[1] != len(columnas) or X_test.shape[1] != model.n_features_in_):
+        raise ValueError(f"X_test tiene {X_test.shape[1]} columnas; el modelo espera {model.n_features_in_}")
+    return model, X_test, y_test
 
 
 # =========================
 # 2) Predecir (en escala LOG) y devolver a escala REAL
 # =========================
-# El modelo fue entrenado para predecir:
-#   pred_log ≈ log(1 + trips_count)
-# Por eso su salida está en escala log.
-pred_log = model.predict(X_test)
+def predecir(model, X_test) -> np.ndarray:
+    # El modelo fue entrenado para predecir:
+    #   pred_log ≈ log(1 + trips_count)
+    # Por eso su salida está en escala log.
+    pred_log = model.predict(X_test)
 
-# Conversión a escala real:
-#   Si pred_log = log(1 + y), entonces y = exp(pred_log) - 1
-# np.expm1(x) calcula exp(x) - 1 (más estable numéricamente que np.exp(x) - 1).
-pred = np.expm1(pred_log)
+    # Conversión a escala real:
+    #   Si pred_log = log(1 + y), entonces y = exp(pred_log) - 1
+    # np.expm1(x) calcula exp(x) - 1 (más estable numéricamente que np.exp(x) - 1).
+    pred = np.expm1(pred_log)
 
-# Un conteo no debería ser negativo. Por ruido del modelo puede salir < 0.
-# np.clip(pred, 0, None) fuerza mínimo 0.
-pred = np.clip(pred, 0, None)
+    # Un conteo no debería ser negativo. Por ruido del modelo puede salir < 0.
+    # np.clip(pred, 0, None) fuerza mínimo 0.
+    return np.clip(pred, 0, None)
 
 
 # =========================
-# 3) Métricas principales (YA en escala real)
+# 2.5) Métricas en UNA pasada, por lotes (acumuladores que se pueden sumar)
 # =========================
-# MAE (Mean Absolute Error): promedio del error absoluto |y - y_hat|
-# RMSE: raíz del error cuadrático medio (penaliza más los errores grandes)
-# R²: qué tan bien explica la variación del objetivo (1.0 perfecto, 0 ~ baseline tipo media)
-mae = mean_absolute_error(y_test, pred)
-rmse = np.sqrt(mean_squared_error(y_test, pred))
-r2 = r2_score(y_test, pred)
+# Antes: mean_absolute_error, mean_squared_error y r2_score recorrían las predicciones una vez cada uno,
+# np.abs se calculaba dos veces, cada np.percentile ordenaba (parcialmente) todo el error y cada segmento
+# copiaba sus filas con una máscara. Y todas las predicciones tenían que estar en memoria.
+#
+# Ahora cada lote de predicciones se resume en sumas que NO crecen con las filas:
+# - por cada valor de y (trips_count es un conteo entero): filas, suma de |error| y suma de error²
+#   (np.bincount). De ahí salen MAE, RMSE, R², la mediana EXACTA del baseline y cualquier segmento de y.
+# - un "sketch" de cuantiles del error absoluto (CuantilesLog) para P50 / P90 / P95.
+# Dos acumuladores se suman (sumar): lotes, procesos en paralelo o meses distintos dan lo mismo que una pasada.
 
+# Error relativo máximo de los percentiles del error absoluto (1e-5: un P95 de 332.14 queda a +-0.003)
+ALFA_CUANTILES = 1e-5
 
-# =========================
-# 4) Baseline (modelo tonto) - predice mediana del test
-# =========================
-# Baseline usado:
-# - Predice la mediana del conjunto de prueba para TODAS las filas.
-# Motivo:
-# - En conteos muy sesgados, la mediana suele ser un baseline robusto.
-y_median = float(np.median(y_test))
-y_mean = float(np.mean(y_test))
+# Errores absolutos menores a esto cuentan como 0 en el sketch (así el rango de buckets queda acotado)
+MINIMO_CUANTIL = 1e-6
 
-baseline_pred = np.full(shape=len(y_test), fill_value=y_median)
-baseline_mae = mean_absolute_error(y_test, baseline_pred)
-baseline_rmse = np.sqrt(mean_squared_error(y_test, baseline_pred))
+# Filas por lote al predecir (X_test e y_test son .npy con mmap: solo el lote se lee a memoria)
+LOTE_FILAS = 1_000_000
 
-# Mejora porcentual vs baseline:
-# - Si mae < baseline_mae => mejora positiva
-# - Se protege contra división por 0
-improve_mae_pct = (baseline_mae - mae) / baseline_mae * 100 if baseline_mae != 0 else 0
-improve_rmse_pct = (baseline_rmse - rmse) / baseline_rmse * 100 if baseline_rmse != 0 else 0
 
+class CuantilesLog:
+    """
+    Sketch de cuantiles de valores >= 0 con buckets logarítmicos (la idea de DDSketch):
+    el bucket i cuenta los valores en (gamma^(i-1), gamma^i], con gamma = (1 + alfa) / (1 - alfa).
+    Cada valor se estima con 2 * gamma^i / (gamma + 1): error relativo <= alfa.
+    La memoria depende del RANGO de los valores (de 1e-6 a 1e5 con alfa=1e-5: ~1.3 millones de buckets, 10 MB),
+    no de cuántos son.
+    """
 
-# =========================
-# 5) Distribución de errores (picos)
-# =========================
-# Error absoluto por fila:
-abs_err = np.abs(y_test.values - pred)
+    def __init__(self, alfa=ALFA_CUANTILES):
+        self.alfa = alfa
+        self.log_gamma = np.log((1 + alfa) / (1 - alfa))
+        self.ceros = 0                                # valores <= MINIMO_CUANTIL
+        self.inicio = 0                               # número del bucket de conteos[0]
+        self.conteos = np.zeros(0, dtype=np.int64)
+
+    def _ampliar(self, desde: int, hasta: int):
+        """Agranda conteos para que entren los buckets desde..hasta (incluidos)."""
+        if self.conteos.size == 0:
+            self.inicio, self.conteos = desde, np.zeros(hasta - desde + 1, dtype=np.int64)
+            return
+        izquierda = max(0, self.inicio - desde)
+        derecha = max(0, hasta - (self.inicio + self.conteos.size - 1))
+        if izquierda or derecha:
+            self.conteos = np.pad(self.conteos, (izquierda, derecha))
+            self.inicio -= izquierda
+
+    def agregar(self, valores):
+        valores = np.asarray(valores, dtype=float)
+        positivos = valores[valores > MINIMO_CUANTIL]
+        self.ceros += valores.size - positivos.size
+        if positivos.size:
+            buckets = np.ceil(np.log(positivos) / self.log_gamma).astype(np.int64)
+            self._ampliar(int(buckets.min()), int(buckets.max()))
+            self.conteos += np.bincount(buckets - self.inicio, minlength=self.conteos.size)
+
+    def sumar(self, otro: "CuantilesLog"):
+        if otro.alfa != self.alfa:
+            raise ValueError(f"No se pueden sumar sketches con distinto alfa ({self.alfa} vs {otro.alfa})")
+        self.ceros += otro.ceros
+        if otro.conteos.size:
+            self._ampliar(otro.inicio, otro.inicio + otro.conteos.size - 1)
+            i = otro.inicio - self.inicio
+            self.conteos[i:i + otro.conteos.size] += otro.conteos
+
+    def percentil(self, q: float) -> float:
+        """Como np.percentile(valores, q): interpola entre los dos valores vecinos (cada uno con error <= alfa)."""
+        n = self.ceros + int(self.conteos.sum())
+        posicion = (n - 1) * q / 100
+        abajo, arriba = int(np.floor(posicion)), int(np.ceil(posicion))
+        acumulado = np.cumsum(self.conteos)
+
+        def valor(k):
+            # El k-ésimo valor (desde 0) de menor a mayor: 0 o el centro de su bucket
+            if k < self.ceros:
+                return 0.0
+            i = int(np.searchsorted(acumulado, k - self.ceros, side="right"))
+            return float(2 * np.exp((self.inicio + i) * self.log_gamma) / (np.exp(self.log_gamma) + 1))
+
+        return valor(abajo) + (posicion - abajo) * (valor(arriba) - valor(abajo))
+
+
+class MetricasAcumuladas:
+    """
+    Lo necesario para las métricas de un conjunto de predicciones, sumado por valor de y (conteo entero):
+    - filas[v]     : filas con y = v
+    - suma_abs[v]  : sum |y - pred| de esas filas
+    - suma_cuad[v] : sum (y - pred)^2 de esas filas
+    - cuantiles    : sketch del error absoluto (CuantilesLog)
+    agregar(y, pred) suma un lote, sumar(otro) suma otro acumulador, resultado() da las métricas
+    (secciones 3 a 5) y segmento(minimo, maximo) las de un rango de y (sección 7.5).
+    """
 
-# Percentiles típicos:
-# - P50: mediana del error absoluto (error "típico")
-# - P90/P95: qué pasa en la cola (casos difíciles / picos)
-p50 = float(np.percentile(abs_err, 50))
-p90 = float(np.percentile(abs_err, 90))
-p95 = float(np.percentile(abs_err, 95))
+    def __init__(self, alfa=ALFA_CUANTILES):
+        self.filas = np.zeros(0, dtype=np.int64)
+        self.suma_abs = np.zeros(0)
+        self.suma_cuad = np.zeros(0)
+        self.cuantiles = CuantilesLog(alfa)
+
+    def _ampliar(self, valores: int):
+        """Agranda los vectores por valor de y (si llega un conteo mayor a los vistos)."""
+        extra = valores - self.filas.size
+        if extra > 0:
+            self.filas = np.pad(self.filas, (0, extra))
+            self.suma_abs = np.pad(self.suma_abs, (0, extra))
+            self.suma_cuad = np.pad(self.suma_cuad, (0, extra))
+
+    def agregar(self, y, pred) -> np.ndarray:
+        """Suma un lote. Retorna |y - pred| del lote (para no volver a calcularlo al guardar los resultados)."""
+        y = np.asarray(y, dtype=float)
+        error = y - pred
+        abs_err = np.abs(error)
+        if y.size == 0:
+            return abs_err
+        y_entero = y.astype(np.int64)
+        if (y_entero != y).any() or y_entero.min() < 0:
+            raise ValueError("y_test debe ser un conteo (entero >= 0): las métricas se suman por valor de y")
+        self._ampliar(int(y_entero.max()) + 1)
+        n = self.filas.size
+        self.filas += np.bincount(y_entero, minlength=n)
+        self.suma_abs += np.bincount(y_entero, weights=abs_err, minlength=n)
+        self.suma_cuad += np.bincount(y_entero, weights=error * error, minlength=n)
+        self.cuantiles.agregar(abs_err)
+        return abs_err
+
+    def sumar(self, otro: "MetricasAcumuladas"):
+        self._ampliar(otro.filas.size)
+        n = otro.filas.size
+        self.filas[:n] += otro.filas
+        self.suma_abs[:n] += otro.suma_abs
+        self.suma_cuad[:n] += otro.suma_cuad
+        self.cuantiles.sumar(otro.cuantiles)
+
+    def _y_ordenado(self, k: int) -> float:
+        """El k-ésimo y (desde 0) de menor a mayor: sale exacto del conteo por valor."""
+        return float(np.searchsorted(np.cumsum(self.filas), k, side="right"))
+
+    def resultado(self) -> dict:
+        """Métricas, baseline y percentiles de error (mismas claves y valores que antes con sklearn / numpy)."""
+        n = int(self.filas.sum())
+        if n == 0:
+            raise ValueError("No hay predicciones para calcular métricas")
+        valores = np.arange(self.filas.size, dtype=float)
+
+        # =========================
+        # 3) Métricas principales (YA en escala real)
+        # =========================
+        # MAE (Mean Absolute Error): promedio del error absoluto |y - y_hat|
+        # RMSE: raíz del error cuadrático medio (penaliza más los errores grandes)
+        # R²: qué tan bien explica la variación del objetivo (1.0 perfecto, 0 ~ baseline tipo media)
+        #     R² = 1 - sum (y - pred)² / sum (y - media)²   (la segunda suma sale del conteo por valor de y)
+        mae = self.suma_abs.sum() / n
+        rmse = np.sqrt(self.suma_cuad.sum() / n)
+        y_mean = float((self.filas * valores).sum() / n)
+        sse = self.suma_cuad.sum()
+        sst = (self.filas * (valores - y_mean) ** 2).sum()
+        # (sin variación en y: 1 si todo está bien predicho, 0 si no; igual que r2_score de sklearn)
+        r2 = 1 - sse / sst if sst != 0 else (1.0 if sse == 0 else 0.0)
+
+        # =========================
+        # 4) Baseline (modelo tonto) - predice mediana del test
+        # =========================
+        # Baseline usado:
+        # - Predice la mediana del conjunto de prueba para TODAS las filas.
+        # Motivo:
+        # - En conteos muy sesgados, la mediana suele ser un baseline robusto.
+        # La mediana es EXACTA (como np.median: con n par, el promedio de los dos del medio) y su error
+        # se calcula por valor de y: no hace falta un vector de predicciones del baseline.
+        y_median = (self._y_ordenado((n - 1) // 2) + self._y_ordenado(n // 2)) / 2
+        baseline_mae = (self.filas * np.abs(valores - y_median)).sum() / n
+        baseline_rmse = np.sqrt((self.filas * (valores - y_median) ** 2).sum() / n)
+
+        # Mejora porcentual vs baseline:
+        # - Si mae < baseline_mae => mejora positiva
+        # - Se protege contra división por 0
+        improve_mae_pct = (baseline_mae - mae) / baseline_mae * 100 if baseline_mae != 0 else 0
+        improve_rmse_pct = (baseline_rmse - rmse) / baseline_rmse * 100 if baseline_rmse != 0 else 0
+
+        # =========================
+        # 5) Distribución de errores (picos)
+        # =========================
+        # Percentiles típicos del error absoluto (del sketch, error relativo <= ALFA_CUANTILES):
+        # - P50: mediana del error absoluto (error "típico")
+        # - P90/P95: qué pasa en la cola (casos difíciles / picos)
+        p50 = self.cuantiles.percentil(50)
+        p90 = self.cuantiles.percentil(90)
+        p95 = self.cuantiles.percentil(95)
+
+        return {
+            "mae": mae, "rmse": rmse, "r2": r2,
+            "y_mean": y_mean, "y_median": y_median,
+            "baseline_mae": baseline_mae, "baseline_rmse": baseline_rmse,
+            "improve_mae_pct": improve_mae_pct, "improve_rmse_pct": improve_rmse_pct,
+            "p50": p50, "p90": p90, "p95": p95,
+        }
+
+    def segmento(self, minimo, maximo):
+        """(n, MAE, RMSE, y_mean) de las filas con minimo < y <= maximo (nan si no tiene filas)."""
+        valores = np.arange(self.filas.size)
+        mask = mascara_segmento(valores, minimo, maximo)
+        n = int(self.filas[mask].sum())
+        if n == 0:
+            return 0, float("nan"), float("nan"), float("nan")
+        return (n, self.suma_abs[mask].sum() / n, np.sqrt(self.suma_cuad[mask].sum() / n),
+                float((self.filas[mask] * valores[mask]).sum() / n))
+
+
+def calcular_metricas(y_test, pred) -> dict:
+    """Métricas, baseline y percentiles de error (secciones 3 a 5). También las usan sweep_model.py y backtest_model.py."""
+    acumulado = MetricasAcumuladas()
+    acumulado.agregar(y_test, pred)
+    return acumulado.resultado()
+
+
+def calcular_metricas_exactas(y_test, pred) -> dict:
+    """
+    La versión anterior (sklearn + np.percentile, todas las predicciones en memoria).
+    Solo para --verificar: compara con MetricasAcumuladas.
+    """
+    y_test = np.asarray(y_test, dtype=float)
+    mae = mean_absolute_error(y_test, pred)
+    rmse = np.sqrt(mean_squared_error(y_test, pred))
+    y_median = float(np.median(y_test))
+    baseline_pred = np.full(shape=len(y_test), fill_value=y_median)
+    baseline_mae = mean_absolute_error(y_test, baseline_pred)
+    baseline_rmse = np.sqrt(mean_squared_error(y_test, baseline_pred))
+    abs_err = np.abs(y_test - pred)
+    return {
+        "mae": mae, "rmse": rmse, "r2": r2_score(y_test, pred),
+        "y_mean": float(np.mean(y_test)), "y_median": y_median,
+        "baseline_mae": baseline_mae, "baseline_rmse": baseline_rmse,
+        "improve_mae_pct": (baseline_mae - mae) / baseline_mae * 100 if baseline_mae != 0 else 0,
+        "improve_rmse_pct": (baseline_rmse - rmse) / baseline_rmse * 100 if baseline_rmse != 0 else 0,
+        **{f"p{q}": float(np.percentile(abs_err, q)) for q in [50, 90, 95]},
+    }
 
 
 # =========================
 # 6) Dictamen (basado en mejora vs baseline)
 # =========================
-# Criterio simple: el modelo debe mejorar el baseline.
-# Luego se usan umbrales prácticos (heurísticos) para clasificar la mejora.
-verdict = "🔴 Todavía NO (no mejora baseline)"
-reasons = []
-
-if improve_mae_pct <= 0:
-    reasons.append("No mejora el baseline (mediana).")
-else:
-    # Umbrales prácticos para clasificar el entrenamiento
-    # (son reglas de negocio/criterios internos, no una regla universal)
-    if improve_mae_pct >= 30 and improve_rmse_pct >= 35:
-        verdict = "✅ Bien entrenado (mejora fuerte vs baseline)"
-    elif improve_mae_pct >= 15 and improve_rmse_pct >= 20:
-        verdict = "🟡 Aceptable (mejora clara vs baseline)"
+def dictamen(m: dict):
+    """Retorna (verdict, reasons) a partir de las métricas de calcular_metricas."""
+    # Criterio simple: el modelo debe mejorar el baseline.
+    # Luego se usan umbrales prácticos (heurísticos) para clasificar la mejora.
+    verdict = "🔴 Todavía NO (no mejora baseline)"
+    reasons = []
+
+    if m["improve_mae_pct"] <= 0:
+        reasons.append("No mejora el baseline (mediana).")
     else:
-        verdict = "🔴 Todavía NO (mejora débil vs baseline)"
-        reasons.append("Mejora baja vs baseline.")
-
-# Señal adicional: si R² es muy bajo, indica poca capacidad explicativa global.
-if r2 < 0.2:
-    reasons.append("R2 bajo (poca explicación de variación).")
+        # Umbrales prácticos para clasificar el entrenamiento
+        # (son reglas de negocio/criterios internos, no una regla universal)
+        if m["improve_mae_pct"] >= 30 and m["improve_rmse_pct"] >= 35:
+            verdict = "✅ Bien entrenado (mejora fuerte vs baseline)"
+        elif m["improve_mae_pct"] >= 15 and m["improve_rmse_pct"] >= 20:
+            verdict = "🟡 Aceptable (mejora clara vs baseline)"
+        else:
+            verdict = "🔴 Todavía NO (mejora débil vs baseline)"
+            reasons.append("Mejora baja vs baseline.")
+
+    # Señal adicional: si R² es muy bajo, indica poca capacidad explicativa global.
+    if m["r2"] < 0.2:
+        reasons.append("R2 bajo (poca explicación de variación).")
+    return verdict, reasons
 
 
 # =========================
 # 7) Reporte (resumen en consola)
 # =========================
-print("\n=== Validación (LinearRegression + log1p) ===")
-print(f"MAE:  {mae:.4f}")
-print(f"RMSE: {rmse:.4f}")
-print(f"R2:   {r2:.4f}")
-
-print("\n=== Contexto del objetivo (trips_count REAL) ===")
-print(f"Media y_test:   {y_mean:.2f}")
-print(f"Mediana y_test: {y_median:.2f}")
-
-print("\n=== Baseline (predecir mediana) ===")
-print(f"Baseline MAE:  {baseline_mae:.4f}")
-print(f"Baseline RMSE: {baseline_rmse:.4f}")
-print(f"Mejora MAE vs baseline:  {improve_mae_pct:.2f}%")
-print(f"Mejora RMSE vs baseline: {improve_rmse_pct:.2f}%")
-
-print("\n=== Distribución de errores absolutos ===")
-print(f"P50 abs_error: {p50:.2f}")
-print(f"P90 abs_error: {p90:.2f}")
-print(f"P95 abs_error: {p95:.2f}")
-
-print("\n=== Dictamen ===")
-print(verdict)
-if reasons:
-    print("Razones/Señales:")
-    for r in reasons:
-        print("-", r)
+def imprimir_reporte(m: dict, verdict: str, reasons: list):
+    print("\n=== Validación (LinearRegression + log1p) ===")
+    print(f"MAE:  {m['mae']:.4f}")
+    print(f"RMSE: {m['rmse']:.4f}")
+    print(f"R2:   {m['r2']:.4f}")
+
+    print("\n=== Contexto del objetivo (trips_count REAL) ===")
+    print(f"Media y_test:   {m['y_mean']:.2f}")
+    print(f"Mediana y_test: {m['y_median']:.2f}")
+
+    print("\n=== Baseline (predecir mediana) ===")
+    print(f"Baseline MAE:  {m['baseline_mae']:.4f}")
+    print(f"Baseline RMSE: {m['baseline_rmse']:.4f}")
+    print(f"Mejora MAE vs baseline:  {m['improve_mae_pct']:.2f}%")
+    print(f"Mejora RMSE vs baseline: {m['improve_rmse_pct']:.2f}%")
+
+    print("\n=== Distribución de errores absolutos ===")
+    print(f"P50 abs_error: {m['p50']:.2f}")
+    print(f"P90 abs_error: {m['p90']:.2f}")
+    print(f"P95 abs_error: {m['p95']:.2f}")
+
+    print("\n=== Dictamen ===")
+    print(verdict)
+    if reasons:
+        print("Razones/Señales:")
+        for r in reasons:
+            print("-", r)
 
 
 # =========================
@@ -175,72 +397,206 @@ if reasons:
 # Objetivo:
 # - Entender cómo se comporta el error cuando los conteos son pequeños vs grandes.
 # - En conteos tipo "picos", el modelo suele fallar más; esto lo cuantifica.
-def eval_segment(name, mask):
+#
+# Segmentos basados en rangos de trips_count REAL: (nombre, mínimo excluido, máximo incluido)
+SEGMENTOS = [
+    ("BAJO (<=20)", None, 20),
+    ("MEDIO (20-200)", 20, 200),
+    ("ALTO (>200)", 200, None),
+    ("PICO (>500)", 500, None),
+]
+
+
+def mascara_segmento(y, minimo, maximo):
+    """True en las filas con minimo < y <= maximo (None = sin límite)."""
+    mask = np.ones(len(y), dtype=bool)
+    if minimo is not None:
+        mask &= y > minimo
+    if maximo is not None:
+        mask &= y <= maximo
+    return mask
+
+
+def imprimir_segmento(name, n, mae_s, rmse_s, y_mean_s):
     """
-    Calcula MAE y RMSE para un segmento definido por una máscara booleana.
-
-    Parámetros:
-    - name: etiqueta del segmento (string)
-    - mask: array booleano del mismo tamaño que y_test/pred
-            True indica filas que pertenecen al segmento.
+    Imprime MAE y RMSE de un segmento (los calcula MetricasAcumuladas.segmento en la misma pasada:
+    sin máscaras sobre las filas ni copias de cada segmento).
     """
-    y_s = y_test[mask]
-    p_s = pred[mask]
-
-    mae_s = mean_absolute_error(y_s, p_s)
-    rmse_s = np.sqrt(mean_squared_error(y_s, p_s))
+    if n == 0:
+        # Segmento vacío (ej: un rango de fechas sin picos)
+        print(f"{name}: n=0")
+        return
 
     print(
-        f"{name}: n={mask.sum()} | MAE={mae_s:.2f} | RMSE={rmse_s:.2f} | y_mean={y_s.mean():.2f}"
+        f"{name}: n={n} | MAE={mae_s:.2f} | RMSE={rmse_s:.2f} | y_mean={y_mean_s:.2f}"
     )
 
 
-# y = valores reales del objetivo (array)
-y = y_test.values
-
-# Segmentos basados en rangos de trips_count REAL
-eval_segment("BAJO (<=20)",    y <= 20)
-eval_segment("MEDIO (20-200)", (y > 20) & (y <= 200))
-eval_segment("ALTO (>200)",    y > 200)
-eval_segment("PICO (>500)",    y > 500)
-
-
 # =========================
 # 7.6) Guardar resumen de métricas (para comparar iteraciones)
 # =========================
-# Se escribe en modo append ("a") para conservar historial de ejecuciones.
-# Útil cuando entrenas varias versiones del modelo (v1, v2, v3...) y quieres comparar.
-with open("artifacts/metrics_summary.txt", "a", encoding="utf-8") as f:
-    f.write(
-        f"MAE={mae:.2f} RMSE={rmse:.2f} R2={r2:.3f} "
-        f"BaselineMAE={baseline_mae:.2f} BaselineRMSE={baseline_rmse:.2f} "
-        f"ImproveMAE%={improve_mae_pct:.2f} ImproveRMSE%={improve_rmse_pct:.2f} "
-        f"P50={p50:.2f} P90={p90:.2f} P95={p95:.2f}\n"
-    )
+def guardar_resumen(m: dict, run_id=None):
+    # Se escribe en modo append ("a") para conservar historial de ejecuciones.
+    # Útil cuando entrenas varias versiones del modelo (v1, v2, v3...) y quieres comparar.
+    # (Para comparar corridas es más cómodo el registro: python registro.py)
+    with open("artifacts/metrics_summary.txt", "a", encoding="utf-8") as f:
+        f.write(
+            (f"run={run_id} " if run_id else "") +
+            f"MAE={m['mae']:.2f} RMSE={m['rmse']:.2f} R2={m['r2']:.3f} "
+            f"BaselineMAE={m['baseline_mae']:.2f} BaselineRMSE={m['baseline_rmse']:.2f} "
+            f"ImproveMAE%={m['improve_mae_pct']:.2f} ImproveRMSE%={m['improve_rmse_pct']:.2f} "
+            f"P50={m['p50']:.2f} P90={m['p90']:.2f} P95={m['p95']:.2f}\n"
+        )
+
+    print("✅ Guardado: artifacts/metrics_summary.txt")
 
-print("✅ Guardado: artifacts/metrics_summary.txt")
+
+# =========================
+# 8) Una pasada por lotes: predecir, acumular métricas y exportar el resultado por fila
+# =========================
+def validar_por_lotes(model, X_test, y_test, carpeta, lote_filas=LOTE_FILAS):
+    """
+    Recorre X_test / y_test de a `lote_filas` filas: predice el lote, lo suma a las métricas
+    (MetricasAcumuladas) y lo escribe al parquet de resultados. En memoria queda un lote a la vez.
+    Retorna (MetricasAcumuladas, ejemplos: las primeras 5 filas).
+    """
+    acumulado = MetricasAcumuladas()
+    ejemplos = []
+
+    def lotes():
+        for inicio in range(0, len(y_test), lote_filas):
+            fin = inicio + lote_filas
+            # X_test es CSR (cortar filas es barato); si vino del CSV de antes, es un DataFrame
+            X_lote = X_test.iloc[inicio:fin] if isinstance(X_test, pd.DataFrame) else X_test[inicio:fin]
+            y = np.asarray(y_test[inicio:fin], dtype=float)
+            pred = predecir(model, X_lote)
+            abs_err = acumulado.agregar(y, pred)
+
+            # Ejemplos rápidos para inspección visual:
+            if not ejemplos:
+                ejemplos.append(pd.DataFrame({
+                    "y_real_trips": y[:5],
+                    "pred_trips": pred[:5],
+                    "abs_error": abs_err[:5]
+                }))
+
+            # Resultado completo por fila (útil para análisis posterior en Excel/Power BI)
+            yield pd.DataFrame({
+                "y_real": y,
+                "y_pred": pred,
+                "abs_error": abs_err
+            })
+
+    # Se guarda en parquet (binario, con tipos y comprimido), un lote a la vez: ver artefactos.py
+    artefactos.guardar_resultados(lotes(), carpeta)
+    return acumulado, ejemplos[0] if ejemplos else pd.DataFrame()
 
 
 # =========================
-# 8) Ejemplos (primeros 5) y export de resultados por fila
+# 9) --verificar: comparar con la versión anterior (todo en memoria)
 # =========================
-# Ejemplos rápidos para inspección visual:
-n = 5
-sample = pd.DataFrame({
-    "y_real_trips": y_test.values[:n],
-    "pred_trips": pred[:n],
-    "abs_error": abs_err[:n]
-})
+# Diferencia relativa aceptada en MAE / RMSE / R² / baseline (solo cambia el orden de las sumas)
+TOLERANCIA = 1e-9
+
+
+def verificar(model, X_test, y_test, acumulado: MetricasAcumuladas) -> bool:
+    """
+    Compara las métricas de la pasada por lotes con calcular_metricas_exactas (sklearn + np.percentile) y
+    con dos mitades acumuladas por separado y sumadas (como si las calculara otro proceso).
+    Los percentiles pueden diferir hasta ALFA_CUANTILES (relativo); el resto, hasta TOLERANCIA.
+    """
+    y = np.asarray(y_test, dtype=float)
+    pred = predecir(model, X_test)
+    exactas = calcular_metricas_exactas(y, pred)
+    por_lotes = acumulado.resultado()
+
+    mitad = len(y) // 2
+    primera, segunda = MetricasAcumuladas(), MetricasAcumuladas()
+    primera.agregar(y[:mitad], pred[:mitad])
+    segunda.agregar(y[mitad:], pred[mitad:])
+    segunda.sumar(primera)
+    sumadas = segunda.resultado()
+
+    filas = [(clave, valor, por_lotes[clave], sumadas[clave],
+              ALFA_CUANTILES if clave in ("p50", "p90", "p95") else TOLERANCIA) for clave, valor in exactas.items()]
+    for nombre, minimo, maximo in SEGMENTOS:
+        mask = mascara_segmento(y, minimo, maximo)
+        if mask.any():
+            filas.append((f"MAE {nombre}", float(np.abs(y[mask] - pred[mask]).mean()),
+                          acumulado.segmento(minimo, maximo)[1], segunda.segmento(minimo, maximo)[1], TOLERANCIA))
+
+    print("\n=== Verificación (pasada por lotes vs todo en memoria) ===")
+    print(f"{'métrica':<22} {'en memoria':>14} {'por lotes':>14} {'dif. relativa':>14} {'mitades sumadas':>16}")
+    ok = True
+    for clave, valor, lote, suma, tolerancia in filas:
+        dif = abs(lote - valor) / max(abs(valor), 1e-12)
+        dif_suma = abs(suma - valor) / max(abs(valor), 1e-12)
+        ok &= dif <= tolerancia and dif_suma <= tolerancia
+        print(f"{clave:<22} {valor:>14.6f} {lote:>14.6f} {dif:>14.2e} {dif_suma:>16.2e}")
+    print("-> " + ("OK" if ok else "DIFERENTE"))
+    return ok
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Valida el modelo de una corrida (métricas en escala real).")
+    parser.add_argument("--run-id", default=None, help="Corrida del registro (o el comienzo de su run_id; "
+                                                       "por defecto: la última)")
+    parser.add_argument("--forzar", action="store_true", help="Validar aunque la corrida ya esté validada")
+    parser.add_argument("--lote-filas", type=int, default=LOTE_FILAS, help="Filas por lote al predecir")
+    parser.add_argument("--verificar", action="store_true",
+                        help="Comparar con el cálculo en memoria (sklearn / np.percentile): necesita que quepa")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    corrida = registro.obtener_corrida(args.run_id)
+    if corrida and corrida["validada"] and not (args.forzar or args.verificar):
+        mt = corrida["metricas"]
+        print(f"Corrida {corrida['run_id']} ya validada ({corrida['validada']}): MAE={mt['mae']:.4f} "
+              f"RMSE={mt['rmse']:.4f} R2={mt['r2']:.4f} | Mejora MAE vs baseline: {mt['improve_mae_pct']:.2f}% "
+              f"(--forzar para validar de nuevo)")
+        return
+
+    t0 = time.perf_counter()
+    carpetas = registro.carpetas(args.run_id)
+    if carpetas["run_id"]:
+        print(f"Corrida: {carpetas['run_id']}")
+    model, X_test, y_test = cargar_artefactos(carpetas)
+    print("Tamaño X_test:", X_test.shape)
+    print("Tamaño y_test:", y_test.shape)
+
+    # Artefactos de antes del registro: el resultado queda en artifacts/, como siempre.
+    # Si no, en una carpeta temporal que después se guarda con la corrida (registro.registrar_validacion).
+    destino = carpetas["resultados"] if carpetas["run_id"] is None else registro.carpeta_temporal() / "resultados"
+    acumulado, ejemplos = validar_por_lotes(model, X_test, y_test, destino, args.lote_filas)
+
+    m = acumulado.resultado()
+    verdict, reasons = dictamen(m)
+    imprimir_reporte(m, verdict, reasons)
+
+    segmentos = {}
+    for nombre, minimo, maximo in SEGMENTOS:
+        n, mae_s, rmse_s, y_mean_s = acumulado.segmento(minimo, maximo)
+        imprimir_segmento(nombre, n, mae_s, rmse_s, y_mean_s)
+        clave = nombre.split()[0].lower()
+        segmentos.update({f"n_{clave}": n, f"mae_{clave}": mae_s, f"rmse_{clave}": rmse_s})
+
+    guardar_resumen(m, carpetas["run_id"])
+    if carpetas["run_id"] is None:
+        print(f"✅ Guardado: {(destino / artefactos.RESULTADOS).as_posix()}")
+    else:
+        resultados = registro.registrar_validacion(carpetas["run_id"], {**m, **segmentos}, destino,
+                                                   time.perf_counter() - t0)
+        print(f"✅ Guardado: {(resultados / artefactos.RESULTADOS).as_posix()}")
+        print(f"✅ Métricas en artifacts/registro.sqlite (corrida {carpetas['run_id']})")
+
+    print("\n=== Ejemplos (primeros 5) ===")
+    print(ejemplos)
 
-# Resultado completo por fila (útil para análisis posterior en Excel/Power BI)
-out = pd.DataFrame({
-    "y_real": y_test.values,
-    "y_pred": pred,
-    "abs_error": np.abs(y_test.values - pred)
-})
+    if args.verificar and not verificar(model, X_test, y_test, acumulado):
+        raise SystemExit(1)
 
-out.to_csv("artifacts/validation_results.csv", index=False)
-print("✅ Guardado: artifacts/validation_results.csv")
 
-print("\n=== Ejemplos (primeros 5) ===")
-print(sample)
+if __name__ == "__main__":
+    main()